@@ -12,12 +12,15 @@ load_dotenv()
 # Create Flask app
 app = Flask(__name__)
 
+# Let the front web server (Apache mod_xsendfile, lighttpd) send image files
+app.config['USE_X_SENDFILE'] = os.getenv('IMAGE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
 # Configure CORS
 allowed_origins = os.getenv('ALLOWED_ORIGINS', 'http://localhost:5173').split(',')
 CORS(app, origins=allowed_origins)
 
 # Import routes
-from routes import daily_logs, food_entries, barcode, images, ai_analysis, chat, nutrition, user_profile, weight_logs, exercises, supplements, workouts
+from routes import daily_logs, food_entries, barcode, images, ai_analysis, chat, nutrition, user_profile, weight_logs, exercises, supplements, workouts, metrics
 
 # Register blueprints
 app.register_blueprint(daily_logs.bp)
@@ -32,6 +35,15 @@ app.register_blueprint(weight_logs.bp)
 app.register_blueprint(exercises.bp)
 app.register_blueprint(supplements.bp)
 app.register_blueprint(workouts.bp)
+app.register_blueprint(metrics.bp)
+
+# Periodically clean unreferenced files out of the uploads directory
+from services.storage_gc import start_gc_scheduler
+start_gc_scheduler()
+
+# Queue uploads a previous worker left unprocessed (e.g. after a restart)
+from services.image_processing import start_requeue
+start_requeue()
 
 # Health check endpoint
 @app.route('/health', methods=['GET'])
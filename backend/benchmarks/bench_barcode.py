@@ -0,0 +1,106 @@
+"""
+Benchmark barcode lookups against a local stub of the OpenFoodFacts API
+
+Compares one bare requests.get per barcode (the old behaviour), sequential
+lookups over the pooled keep-alive session, and the batch lookup on the
+bounded thread pool, cold and then warm from the cache.
+
+Usage (from the backend directory):
+    python benchmarks/bench_barcode.py [--barcodes 50] [--delay-ms 30]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every product request after a fixed delay, with keep-alive"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    delay = 0.03
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections += 1
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        barcode = self.path.rsplit('/', 1)[-1].replace('.json', '')
+        body = json.dumps({
+            'status': 1,
+            'product': {
+                'product_name': f'Product {barcode}',
+                'brands': 'Stub',
+                'nutriments': {'energy-kcal_100g': 250, 'proteins_100g': 10}
+            }
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def timed(label, fn):
+    StubHandler.connections = 0
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:8.1f} ms  ({StubHandler.connections} TCP connections)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--barcodes', type=int, default=50)
+    parser.add_argument('--delay-ms', type=float, default=30)
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp_dir, 'bench.db')
+    os.environ['OPENFOODFACTS_BASE_URL'] = f'http://127.0.0.1:{server.server_port}'
+
+    import requests
+    from database import apply_schema
+    from services import barcode_service
+
+    conn = sqlite3.connect(os.environ['DATABASE_PATH'])
+    apply_schema(conn)
+    conn.close()
+
+    barcodes = [f'{i:013d}' for i in range(args.barcodes)]
+    print(f"{args.barcodes} barcodes, {args.delay_ms:.0f} ms stub latency\n")
+
+    def bare_requests():
+        for barcode in barcodes:
+            requests.get(barcode_service.OPENFOODFACTS_URL.format(barcode=barcode), timeout=10).json()
+
+    def pooled_sequential():
+        for barcode in barcodes:
+            barcode_service.fetch_remote(barcode)
+
+    def batch():
+        results, errors = barcode_service.lookup_products(barcodes)
+        assert len(results) == len(barcodes) and not errors
+
+    timed('bare requests.get, sequential', bare_requests)
+    timed('pooled session, sequential', pooled_sequential)
+    timed(f'batch, {barcode_service.BATCH_WORKERS} workers (cold cache)', batch)
+    timed('batch (warm cache)', batch)
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark exercise history/stats lookups on a synthetic 10-year training log
+
+Seeds ~4 sessions a week for 10 years without exercise keys, times the
+backfill migration, then compares the old LOWER(exercise_name) queries (a
+scan of every exercise joined to its session and daily log) with the
+exercise_key queries (a range scan of idx_workout_exercises_user_key_date).
+
+Usage (from the backend directory):
+    python benchmarks/bench_exercise_history.py [--years 10]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EXERCISES = [
+    'Bench Press', 'bench press', 'Squat', 'Back Squat', 'Deadlift', 'Overhead Press', 'OHP',
+    'Pull-Up', 'Pull ups', 'Barbell Row', 'Romanian Deadlift', 'Incline Bench Press',
+    'Dumbbell Curl', 'Tricep Pushdown', 'Lateral Raise', 'Leg Press', 'Lunge', 'Dip',
+    'Face Pull', 'Hip Thrust', 'Calf Raise', 'Chin-Up', 'Lat Pulldown', 'Cable Fly'
+]
+
+LEGACY_HISTORY = '''
+    SELECT we.exercise_name, we.created_at, ws.set_number, ws.reps, ws.weight_kg, ws.rpe, dl.date
+    FROM workout_sets ws
+    JOIN workout_exercises we ON ws.workout_exercise_id = we.id
+    JOIN workout_sessions wses ON we.workout_session_id = wses.id
+    JOIN daily_logs dl ON wses.daily_log_id = dl.id
+    WHERE LOWER(we.exercise_name) = LOWER(?) AND dl.user_id = ?
+    ORDER BY we.created_at DESC
+    LIMIT 100'''
+
+LEGACY_STATS = '''
+    SELECT MAX(ws.weight_kg), MAX(ws.reps), MAX(ws.weight_kg * ws.reps),
+           COUNT(DISTINCT we.id), SUM(ws.reps * ws.weight_kg)
+    FROM workout_sets ws
+    JOIN workout_exercises we ON ws.workout_exercise_id = we.id
+    JOIN workout_sessions wses ON we.workout_session_id = wses.id
+    JOIN daily_logs dl ON wses.daily_log_id = dl.id
+    WHERE LOWER(we.exercise_name) = LOWER(?) AND dl.user_id = ?'''
+
+# The old endpoint used an unqualified created_at, which daily_logs also has
+LEGACY_RECENT = '''
+    SELECT exercise_name, exercise_category, MAX(we.created_at) as last_used
+    FROM workout_exercises we
+    JOIN workout_sessions ws ON we.workout_session_id = ws.id
+    JOIN daily_logs dl ON ws.daily_log_id = dl.id
+    WHERE dl.user_id = ?
+    GROUP BY LOWER(exercise_name)
+    ORDER BY last_used DESC
+    LIMIT 15'''
+
+KEYED_HISTORY = '''
+    SELECT we.exercise_name, we.created_at, ws.set_number, ws.reps, ws.weight_kg, ws.rpe, we.log_date
+    FROM workout_exercises we
+    JOIN workout_sets ws ON ws.workout_exercise_id = we.id
+    WHERE we.user_id = ? AND we.exercise_key = ?
+    ORDER BY we.log_date DESC, we.created_at DESC
+    LIMIT 100'''
+
+KEYED_STATS = '''
+    SELECT MAX(ws.weight_kg), MAX(ws.reps), MAX(ws.weight_kg * ws.reps),
+           COUNT(DISTINCT we.id), SUM(ws.reps * ws.weight_kg)
+    FROM workout_exercises we
+    JOIN workout_sets ws ON ws.workout_exercise_id = we.id
+    WHERE we.user_id = ? AND we.exercise_key = ?'''
+
+KEYED_RECENT = '''
+    SELECT exercise_name, exercise_category, MAX(created_at) as last_used
+    FROM workout_exercises
+    WHERE user_id = ?
+    GROUP BY exercise_key
+    ORDER BY last_used DESC
+    LIMIT 15'''
+
+def seed(conn, years, user_id=1):
+    """Synthetic training log (~4 sessions a week), without exercise keys"""
+    rng = random.Random(42)
+    start = date.today() - timedelta(days=365 * years)
+    exercises = []
+    sets = []
+    exercise_id = 0
+
+    for day in range(365 * years):
+        log_date = start + timedelta(days=day)
+        log_id = conn.execute(
+            'INSERT INTO daily_logs (user_id, date) VALUES (?, ?)', [user_id, log_date.isoformat()]
+        ).lastrowid
+        if rng.random() > 4 / 7:
+            continue
+
+        session_id = conn.execute(
+            'INSERT INTO workout_sessions (daily_log_id, name, started_at) VALUES (?, ?, ?)',
+            [log_id, 'Workout', f'{log_date} 18:00:00']
+        ).lastrowid
+        for order, name in enumerate(rng.sample(EXERCISES, 6)):
+            exercise_id += 1
+            exercises.append((exercise_id, session_id, name, 'strength', order, f'{log_date} 18:00:00'))
+            for set_number in range(1, 5):
+                sets.append((exercise_id, set_number, rng.randint(3, 12), rng.randint(20, 180) / 1.0))
+
+    conn.executemany(
+        '''INSERT INTO workout_exercises
+           (id, workout_session_id, exercise_name, exercise_category, order_index, created_at)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        exercises
+    )
+    conn.executemany(
+        'INSERT INTO workout_sets (workout_exercise_id, set_number, reps, weight_kg) VALUES (?, ?, ?, ?)',
+        sets
+    )
+    conn.commit()
+    return len(exercises), len(sets)
+
+def timed(conn, label, sql, args, repeat=20):
+    conn.execute(sql, args).fetchall()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, args).fetchall()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+    plan = ' / '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', args))
+    print(f"{label:<18} {elapsed_ms:8.2f} ms   {plan}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=10)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp_dir, 'bench.db')
+    from database import apply_schema, migrate_exercise_keys
+
+    conn = sqlite3.connect(os.environ['DATABASE_PATH'])
+    apply_schema(conn)
+    exercise_count, set_count = seed(conn, args.years)
+    print(f"{args.years} years: {exercise_count} exercises, {set_count} sets\n")
+
+    start = time.perf_counter()
+    migrate_exercise_keys(conn)
+    print(f"Backfill migration: {(time.perf_counter() - start) * 1000:.0f} ms\n")
+    conn.execute('ANALYZE')
+
+    timed(conn, 'history (LOWER)', LEGACY_HISTORY, ['Bench Press', 1])
+    timed(conn, 'history (key)', KEYED_HISTORY, [1, 'bench press'])
+    timed(conn, 'stats (LOWER)', LEGACY_STATS, ['Bench Press', 1])
+    timed(conn, 'stats (key)', KEYED_STATS, [1, 'bench press'])
+    timed(conn, 'recent (LOWER)', LEGACY_RECENT, [1])
+    timed(conn, 'recent (key)', KEYED_RECENT, [1])
+
+    conn.close()
+
+if __name__ == '__main__':
+    main()
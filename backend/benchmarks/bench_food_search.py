@@ -0,0 +1,116 @@
+"""
+Benchmark /api/food-entries/search on a 100k-entry food history
+
+Seeds years of food entries (user_foods and the food_search index are filled
+by the insert triggers), then times typeahead queries through FTS5 against a
+LIKE scan of every entry, and checks the update/delete triggers keep
+user_foods in sync with a full rebuild from food_entries.
+
+Usage (from the backend directory):
+    python benchmarks/bench_food_search.py [--entries 100000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FOODS = [
+    'Chicken Breast', 'Grilled Chicken Salad', 'Chicken Tikka Masala', 'Chickpea Curry', 'Brown Rice',
+    'White Rice', 'Oatmeal with Berries', 'Greek Yogurt', 'Banana', 'Apple', 'Peanut Butter Toast',
+    'Scrambled Eggs', 'Avocado Toast', 'Salmon Fillet', 'Tuna Sandwich', 'Protein Shake', 'Almonds',
+    'Caesar Salad', 'Beef Burrito', 'Spaghetti Bolognese', 'Margherita Pizza', 'Crème Brûlée',
+    'Black Coffee', 'Orange Juice', 'Cheddar Cheese', 'Whole Wheat Bread', 'Sweet Potato Fries'
+]
+SERVINGS = ['1 serving', '100 g', '1 cup', '2 slices', '1 bowl', '250 ml']
+
+LIKE_SEARCH_SQL = '''
+    SELECT name, COUNT(*), MAX(created_at)
+    FROM food_entries
+    WHERE daily_log_id IN (SELECT id FROM daily_logs WHERE user_id = ?)
+      AND (name LIKE ? OR serving_size LIKE ?)
+    GROUP BY LOWER(name)'''
+
+def seed(conn, entries):
+    """A long single-user history with a long tail of one-off foods"""
+    rng = random.Random(5)
+    days = max(1, entries // 12)
+    start = date.today() - timedelta(days=days)
+    log_ids = [
+        conn.execute('INSERT INTO daily_logs (user_id, date) VALUES (1, ?)',
+                     [(start + timedelta(days=d)).isoformat()]).lastrowid
+        for d in range(days)
+    ]
+    rows = []
+    for i in range(entries):
+        name = rng.choice(FOODS) if rng.random() < 0.9 else f'{rng.choice(FOODS)} variant {rng.randint(1, 5000)}'
+        day = i * days // entries
+        created = f'{(start + timedelta(days=day)).isoformat()} 12:00:00'
+        rows.append((log_ids[day], name, rng.randint(50, 800), rng.choice(SERVINGS), created))
+    conn.executemany(
+        'INSERT INTO food_entries (daily_log_id, name, calories, serving_size, created_at) VALUES (?, ?, ?, ?, ?)',
+        rows
+    )
+    conn.commit()
+
+def timed(label, fn, repeat=20):
+    result = fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    print(f"{label:<32} {(time.perf_counter() - start) * 1000 / repeat:8.2f} ms  ({len(result)} foods)")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=100000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp_dir, 'bench.db')
+    from database import apply_schema, migrate_user_foods
+    from services.food_search import search_foods
+
+    conn = sqlite3.connect(os.environ['DATABASE_PATH'])
+    apply_schema(conn)
+
+    start = time.perf_counter()
+    seed(conn, args.entries)
+    print(f"Seeded {args.entries} entries (with index triggers) in {time.perf_counter() - start:.1f} s\n")
+    conn.execute('ANALYZE')
+
+    for query in ['c', 'ch', 'chick', 'chicken bre', 'creme', 'variant 42', '100 g']:
+        timed(f'fts   {query!r}', lambda: search_foods(conn, 1, query, 10))
+        timed(f'like  {query!r}', lambda: conn.execute(LIKE_SEARCH_SQL, [1, f'%{query}%', f'%{query}%']).fetchall())
+
+    # Triggers keep user_foods and the index in sync with edits and deletes
+    rng = random.Random(9)
+    ids = [row[0] for row in conn.execute('SELECT id FROM food_entries')]
+    for entry_id in rng.sample(ids, 300):
+        if rng.random() < 0.5:
+            conn.execute('UPDATE food_entries SET name = ?, serving_size = ?, calories = ? WHERE id = ?',
+                         [rng.choice(FOODS + ['Quinoa Bowl']), rng.choice(SERVINGS), rng.randint(50, 800), entry_id])
+        else:
+            conn.execute('DELETE FROM food_entries WHERE id = ?', [entry_id])
+    incremental = conn.execute(
+        'SELECT * FROM user_foods ORDER BY user_id, food_key'
+    ).fetchall()
+    conn.execute('DELETE FROM user_foods')
+    migrate_user_foods(conn)
+    rebuilt = conn.execute(
+        'SELECT * FROM user_foods ORDER BY user_id, food_key'
+    ).fetchall()
+    # Compare everything but the row id
+    assert [row[1:] for row in incremental] == [row[1:] for row in rebuilt], 'user_foods out of sync'
+    assert search_foods(conn, 1, 'quin')[0]['name'] == 'Quinoa Bowl'
+    conn.execute("INSERT INTO food_search (food_search) VALUES ('integrity-check')")
+    print('\nuser_foods and food_search in sync after 300 updates/deletes')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark full-resolution decode vs JPEG draft-mode decode for uploads
+
+Each measurement runs in a fresh subprocess so peak RSS is per image.
+Without a corpus directory, synthetic 12, 24 and 48 MP JPEGs are generated.
+
+Usage (from the backend directory):
+    python benchmarks/bench_image_decode.py [corpus_dir]
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from services.image_service import MAX_IMAGE_SIZE, open_for_resize
+
+SYNTHETIC_SIZES = {'12MP': (4000, 3000), '24MP': (6000, 4000), '48MP': (8000, 6000)}
+
+def resize_full_decode(path):
+    """The previous pipeline: decode at full resolution, then LANCZOS down"""
+    img = Image.open(path)
+    img.load()
+    img.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.Resampling.LANCZOS)
+    return img
+
+def resize_draft_decode(path):
+    """The current pipeline: DCT-scaled decode near the target, then LANCZOS"""
+    img = open_for_resize(path, MAX_IMAGE_SIZE)
+    img.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.Resampling.LANCZOS)
+    return img
+
+def peak_rss_mb():
+    """Peak RSS of this process (VmHWM resets on exec, unlike ru_maxrss)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_worker(path, mode):
+    """Process one image and report latency and this process's peak RSS"""
+    resize = resize_draft_decode if mode == 'draft' else resize_full_decode
+    start = time.perf_counter()
+    img = resize(path)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({'ms': elapsed_ms, 'peak_rss_mb': peak_rss_mb(), 'size': img.size}))
+
+def measure(path, mode, runs=3):
+    """Best latency and peak RSS over several fresh processes"""
+    results = [
+        json.loads(subprocess.check_output([sys.executable, os.path.abspath(__file__), '--worker', path, mode]))
+        for _ in range(runs)
+    ]
+    return {
+        'ms': min(r['ms'] for r in results),
+        'peak_rss_mb': min(r['peak_rss_mb'] for r in results)
+    }
+
+def make_synthetic_corpus():
+    corpus_dir = tempfile.mkdtemp()
+    for label, size in SYNTHETIC_SIZES.items():
+        # Noise compresses like a real photo far better than a flat colour
+        noise = Image.effect_noise(size, 64).convert('RGB')
+        noise.save(os.path.join(corpus_dir, f'{label}.jpg'), quality=90)
+    return corpus_dir
+
+def main():
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_corpus()
+    paths = sorted(
+        os.path.join(corpus_dir, name) for name in os.listdir(corpus_dir)
+        if name.lower().endswith(('.jpg', '.jpeg'))
+    )
+
+    print(f"{'image':<20} {'full ms':>9} {'draft ms':>9} {'full MB':>9} {'draft MB':>9}")
+    for path in paths:
+        full = measure(path, 'full')
+        draft = measure(path, 'draft')
+        print(f"{os.path.basename(path):<20} {full['ms']:>9.0f} {draft['ms']:>9.0f} "
+              f"{full['peak_rss_mb']:>9.0f} {draft['peak_rss_mb']:>9.0f}")
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--worker':
+        run_worker(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,83 @@
+"""
+Benchmark /api/food-entries/recent on a 100k-entry food history
+
+Compares the old query (GROUP BY LOWER(name) over every entry the user has
+logged) with reading the user_foods catalog through idx_user_foods_recent,
+and checks the catalog against each food's newest entry. (The old query can't
+be compared directly - its non-aggregated columns come from an arbitrary row.)
+
+Usage (from the backend directory):
+    python benchmarks/bench_recent_foods.py [--entries 100000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_food_search import seed
+
+LEGACY_RECENT_SQL = '''
+    SELECT name, calories, serving_size, MAX(created_at) as last_used
+    FROM food_entries
+    WHERE daily_log_id IN (
+        SELECT id FROM daily_logs WHERE user_id = ?
+    )
+    GROUP BY LOWER(name)
+    ORDER BY last_used DESC
+    LIMIT ?'''
+
+CATALOG_RECENT_SQL = '''
+    SELECT name, calories, serving_size, last_used
+    FROM user_foods
+    WHERE user_id = ?
+    ORDER BY last_used DESC, last_entry_id DESC
+    LIMIT ?'''
+
+NEWEST_ENTRIES_SQL = '''
+    SELECT TRIM(name), calories, serving_size, created_at
+    FROM food_entries
+    WHERE id IN (
+        SELECT MAX(fe.id) FROM food_entries fe
+        JOIN daily_logs dl ON dl.id = fe.daily_log_id
+        WHERE dl.user_id = ?
+        GROUP BY LOWER(TRIM(fe.name))
+    )
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?'''
+
+def timed(conn, label, sql, args, repeat=20):
+    rows = conn.execute(sql, args).fetchall()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, args).fetchall()
+    plan = ' / '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', args))
+    print(f"{label:<10} {(time.perf_counter() - start) * 1000 / repeat:8.2f} ms   {plan}")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=100000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp_dir, 'bench.db')
+    from database import apply_schema
+
+    conn = sqlite3.connect(os.environ['DATABASE_PATH'])
+    apply_schema(conn)
+    seed(conn, args.entries)
+    conn.execute('ANALYZE')
+    print(f"{args.entries} entries, {conn.execute('SELECT COUNT(*) FROM user_foods').fetchone()[0]} distinct foods\n")
+
+    timed(conn, 'GROUP BY', LEGACY_RECENT_SQL, [1, 20])
+    catalog = timed(conn, 'user_foods', CATALOG_RECENT_SQL, [1, 20])
+
+    assert catalog == conn.execute(NEWEST_ENTRIES_SQL, [1, 20]).fetchall(), 'recent foods differ'
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark /api/workouts/analytics on a large training history
+
+Seeds a user with 100k+ sets, then times compute_analytics over the whole
+history and over the last year. Exits non-zero if the full-history run
+exceeds ANALYTICS_LATENCY_BUDGET_MS.
+
+Usage (from the backend directory):
+    python benchmarks/bench_workout_analytics.py [--years 6] [--exercises 10] [--sets 6]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EXERCISES = [
+    ('bench press', 'chest'), ('incline bench press', 'chest'), ('squat', 'legs'), ('leg press', 'legs'),
+    ('deadlift', 'back'), ('barbell row', 'back'), ('pull up', 'back'), ('overhead press', 'shoulders'),
+    ('lateral raise', 'shoulders'), ('dumbbell curl', 'arms'), ('tricep pushdown', 'arms'), ('plank', '')
+]
+
+def seed(conn, years, exercises, sets):
+    """~6 sessions a week with progressive overload, inserted with executemany"""
+    rng = random.Random(11)
+    start = date.today() - timedelta(days=365 * years)
+    exercise_rows = []
+    set_rows = []
+    exercise_id = 0
+
+    for day in range(365 * years):
+        log_date = (start + timedelta(days=day)).isoformat()
+        log_id = conn.execute('INSERT INTO daily_logs (user_id, date) VALUES (1, ?)', [log_date]).lastrowid
+        if rng.random() < 1 / 7:
+            continue
+
+        session_id = conn.execute(
+            'INSERT INTO workout_sessions (daily_log_id, name) VALUES (?, ?)', [log_id, 'Workout']
+        ).lastrowid
+        for key, category in rng.sample(EXERCISES, exercises):
+            exercise_id += 1
+            exercise_rows.append((exercise_id, session_id, key.title(), category, key, 1, log_date))
+            base = 40 + day * 0.02
+            for n in range(sets):
+                weight = None if key in ('pull up', 'plank') else round(base * rng.uniform(0.8, 1.2), 1)
+                set_rows.append((exercise_id, n + 1, rng.randint(3, 12), weight, rng.choice([None, 7, 8, 9])))
+
+    conn.executemany(
+        '''INSERT INTO workout_exercises
+           (id, workout_session_id, exercise_name, exercise_category, exercise_key, user_id, log_date)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        exercise_rows
+    )
+    conn.executemany(
+        'INSERT INTO workout_sets (workout_exercise_id, set_number, reps, weight_kg, rpe) VALUES (?, ?, ?, ?, ?)',
+        set_rows
+    )
+    conn.commit()
+    return len(set_rows)
+
+def timed(label, fn, repeat=5):
+    result = fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    best = min(samples)
+    print(f"{label:<28} {best:8.1f} ms  ({result['set_count']} sets)")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=6)
+    parser.add_argument('--exercises', type=int, default=10)
+    parser.add_argument('--sets', type=int, default=6)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp_dir, 'bench.db')
+    from database import apply_schema
+    from services.workout_analytics import compute_analytics, ANALYTICS_LATENCY_BUDGET_MS
+
+    conn = sqlite3.connect(os.environ['DATABASE_PATH'])
+    apply_schema(conn)
+    set_count = seed(conn, args.years, args.exercises, args.sets)
+    conn.execute('ANALYZE')
+    print(f"{args.years} years, {set_count} sets (budget {ANALYTICS_LATENCY_BUDGET_MS} ms)\n")
+
+    full = timed('full history', lambda: compute_analytics(conn, 1, 365 * args.years))
+    timed('last year', lambda: compute_analytics(conn, 1, 365))
+    timed('full history, 2 exercises', lambda: compute_analytics(conn, 1, 365 * args.years, ['squat', 'deadlift']))
+    conn.close()
+
+    if full > ANALYTICS_LATENCY_BUDGET_MS:
+        print(f"\nFAIL: full history took {full:.1f} ms (budget {ANALYTICS_LATENCY_BUDGET_MS} ms)")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark (and guard the query count of) the nested workout session loader
+
+Seeds a day with several sessions, exercises and sets, then loads it through
+/api/workouts/by-date and /api/workouts/session-details the old way (one query
+per session and per exercise, each on its own connection) and with
+load_sessions. Exits non-zero if the endpoints issue more queries than
+expected, so it doubles as a regression check.
+
+Usage (from the backend directory):
+    python benchmarks/bench_workout_loader.py [--sessions 3] [--exercises 8] [--sets 4]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# by-date and session-details: sessions, exercises and sets - whatever the day holds
+EXPECTED_QUERIES = 3
+
+class QueryCounter:
+    """Counts connections and statements opened through sqlite3.connect"""
+
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+        self._connect = sqlite3.connect
+
+    def connect(self, *args, **kwargs):
+        conn = self._connect(*args, **kwargs)
+        self.connections += 1
+        conn.set_trace_callback(self.trace)
+        return conn
+
+    def trace(self, statement):
+        if statement.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE')):
+            self.queries += 1
+
+    def reset(self):
+        self.connections = 0
+        self.queries = 0
+
+def seed(sessions, exercises, sets):
+    """Create one day of workouts, returns (date, first session id)"""
+    from database import execute_db
+
+    date = '2025-01-15'
+    daily_log_id = execute_db('INSERT INTO daily_logs (user_id, date) VALUES (1, ?)', [date])
+    session_ids = []
+    for s in range(sessions):
+        session_id = execute_db(
+            'INSERT INTO workout_sessions (daily_log_id, name) VALUES (?, ?)',
+            [daily_log_id, f'Session {s + 1}']
+        )
+        session_ids.append(session_id)
+        for e in range(exercises):
+            exercise_id = execute_db(
+                '''INSERT INTO workout_exercises (workout_session_id, exercise_name, order_index)
+                   VALUES (?, ?, ?)''',
+                [session_id, f'Exercise {e + 1}', e]
+            )
+            for n in range(sets):
+                execute_db(
+                    '''INSERT INTO workout_sets (workout_exercise_id, set_number, reps, weight_kg)
+                       VALUES (?, ?, ?, ?)''',
+                    [exercise_id, n + 1, 8, 60 + n * 2.5]
+                )
+    return date, session_ids[0]
+
+def legacy_by_date(date, user_id=1):
+    """The previous /by-date implementation: a query per session and per exercise"""
+    from database import query_db
+
+    daily_log = query_db('SELECT id FROM daily_logs WHERE date = ? AND user_id = ?', [date, user_id], one=True)
+    sessions = query_db(
+        'SELECT * FROM workout_sessions WHERE daily_log_id = ? ORDER BY started_at DESC',
+        [daily_log['id']]
+    )
+    for session in sessions:
+        exercises = query_db(
+            'SELECT * FROM workout_exercises WHERE workout_session_id = ? ORDER BY order_index, created_at',
+            [session['id']]
+        )
+        for exercise in exercises:
+            exercise['sets'] = query_db(
+                'SELECT * FROM workout_sets WHERE workout_exercise_id = ? ORDER BY set_number',
+                [exercise['id']]
+            )
+        session['exercises'] = exercises
+    return sessions
+
+def measure(label, counter, fn, repeat=50):
+    counter.reset()
+    result = fn()
+    queries, connections = counter.queries, counter.connections
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    print(f"{label:<32} {elapsed_ms:7.2f} ms  {queries:4d} queries  {connections:3d} connections")
+    return result, queries
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, default=3)
+    parser.add_argument('--exercises', type=int, default=8)
+    parser.add_argument('--sets', type=int, default=4)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp_dir, 'bench.db')
+
+    from database import apply_schema
+    conn = sqlite3.connect(os.environ['DATABASE_PATH'])
+    apply_schema(conn)
+    conn.close()
+
+    date, session_id = seed(args.sessions, args.exercises, args.sets)
+
+    counter = QueryCounter()
+    sqlite3.connect = counter.connect
+
+    from app import app
+    client = app.test_client()
+
+    print(f"{args.sessions} sessions x {args.exercises} exercises x {args.sets} sets\n")
+
+    legacy, _ = measure('by-date (per-row queries)', counter, lambda: legacy_by_date(date))
+    response, by_date_queries = measure(
+        'by-date (load_sessions)', counter, lambda: client.get(f'/api/workouts/by-date/{date}').json
+    )
+    _, details_queries = measure(
+        'session-details (load_sessions)', counter,
+        lambda: client.get(f'/api/workouts/session-details/{session_id}').json
+    )
+
+    assert response == legacy, 'load_sessions returned a different structure'
+
+    failed = False
+    for name, queries in [('by-date', by_date_queries), ('session-details', details_queries)]:
+        if queries > EXPECTED_QUERIES:
+            print(f"\nFAIL: {name} issued {queries} queries (expected {EXPECTED_QUERIES})")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark the workout daily-summary query over a year of heavy training
+
+Seeds two sessions a day (10 exercises x 5 sets each) for a year, builds the
+per-session rollups with the backfill migration, then compares the old query
+(daily_logs LEFT JOIN sessions, exercises and sets with COUNT(DISTINCT) over
+the fan-out) with the rollup query used by /api/workouts/daily-summary, and
+checks they return the same rows.
+
+Usage (from the backend directory):
+    python benchmarks/bench_workout_summary.py [--days 365] [--sessions 2] [--exercises 10] [--sets 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LEGACY_SUMMARY_SQL = '''
+    SELECT
+        dl.date,
+        COUNT(DISTINCT ws.id) as workout_count,
+        COUNT(DISTINCT we.id) as total_exercises,
+        COUNT(ws_sets.id) as total_sets,
+        COALESCE(SUM(ws_sets.reps * ws_sets.weight_kg), 0) as total_volume,
+        GROUP_CONCAT(DISTINCT COALESCE(ws.name, 'Workout')) as workout_names
+    FROM daily_logs dl
+    LEFT JOIN workout_sessions ws ON dl.id = ws.daily_log_id
+    LEFT JOIN workout_exercises we ON ws.id = we.workout_session_id
+    LEFT JOIN workout_sets ws_sets ON we.id = ws_sets.workout_exercise_id
+    WHERE dl.user_id = ? AND dl.date BETWEEN ? AND ?
+    GROUP BY dl.date
+    HAVING workout_count > 0
+    ORDER BY dl.date'''
+
+def seed(conn, days, sessions, exercises, sets):
+    """A training log with rest days (~1 in 4) and the given daily volume"""
+    rng = random.Random(7)
+    start = date(2024, 1, 1)
+    set_rows = []
+
+    for day in range(days):
+        log_date = (start + timedelta(days=day)).isoformat()
+        log_id = conn.execute('INSERT INTO daily_logs (user_id, date) VALUES (1, ?)', [log_date]).lastrowid
+        if rng.random() < 0.25:
+            continue
+
+        for s in range(sessions):
+            session_id = conn.execute(
+                'INSERT INTO workout_sessions (daily_log_id, name) VALUES (?, ?)',
+                [log_id, rng.choice(['Push', 'Pull', 'Legs', None])]
+            ).lastrowid
+            for e in range(exercises):
+                exercise_id = conn.execute(
+                    'INSERT INTO workout_exercises (workout_session_id, exercise_name, order_index) VALUES (?, ?, ?)',
+                    [session_id, f'Exercise {e}', e]
+                ).lastrowid
+                for n in range(sets):
+                    set_rows.append((exercise_id, n + 1, rng.randint(3, 12), rng.choice([None, 40.0, 60.0, 80.0])))
+
+    conn.executemany(
+        'INSERT INTO workout_sets (workout_exercise_id, set_number, reps, weight_kg) VALUES (?, ?, ?, ?)',
+        set_rows
+    )
+    conn.commit()
+    return start.isoformat(), (start + timedelta(days=days - 1)).isoformat(), len(set_rows)
+
+def timed(conn, label, sql, args, repeat=10):
+    rows = conn.execute(sql, args).fetchall()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, args).fetchall()
+    print(f"{label:<24} {(time.perf_counter() - start) * 1000 / repeat:8.2f} ms  ({len(rows)} days)")
+    return rows
+
+def normalize(rows):
+    """Compare rows ignoring GROUP_CONCAT ordering and 0 vs 0.0"""
+    return [row[:4] + (float(row[4]), sorted(row[5].split(','))) for row in rows]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--sessions', type=int, default=2)
+    parser.add_argument('--exercises', type=int, default=10)
+    parser.add_argument('--sets', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(tmp_dir, 'bench.db')
+    from database import apply_schema, migrate_session_totals
+    from routes.workouts import DAILY_SUMMARY_SQL
+
+    conn = sqlite3.connect(os.environ['DATABASE_PATH'])
+    apply_schema(conn)
+    start_date, end_date, set_count = seed(conn, args.days, args.sessions, args.exercises, args.sets)
+    print(f"{args.days} days, {args.sessions} sessions/day x {args.exercises} exercises x {args.sets} sets "
+          f"({set_count} sets)\n")
+
+    start = time.perf_counter()
+    migrate_session_totals(conn)
+    print(f"Rollup backfill: {(time.perf_counter() - start) * 1000:.0f} ms\n")
+    conn.execute('ANALYZE')
+
+    query_args = [1, start_date, end_date]
+    legacy = timed(conn, 'fan-out join', LEGACY_SUMMARY_SQL, query_args)
+    rollup = timed(conn, 'session rollups', DAILY_SUMMARY_SQL, query_args)
+
+    assert normalize(legacy) == normalize(rollup), 'summaries differ'
+    conn.close()
+
+if __name__ == '__main__':
+    main()
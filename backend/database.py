@@ -21,16 +21,56 @@ def run_migrations():
 
 def migrate_db(conn):
     """Run database migrations"""
+    # Migration: One weight log per user and day
+    migrate_weight_logs(conn)
+
+    # Migration: Add workout tracking tables
+    migrate_workout_tables(conn)
+
+    # Migration: Add new columns to existing tables
+    migrate_new_columns(conn)
+
+    # Migration: Create new tables and indexes (schema.sql is idempotent)
+    apply_schema(conn)
+
+    # Migration: Fill in exercise keys for workouts logged before the catalog
+    migrate_exercise_keys(conn)
+
+    # Migration: Build personal records for sets logged before they were tracked
+    migrate_exercise_records(conn)
+
+    # Migration: Add totals for workout sessions logged before they were tracked
+    migrate_session_totals(conn)
+
+    # Migration: Index foods logged before food search existed
+    migrate_user_foods(conn)
+
+    # Migration: Compute the weight trend for weights logged before it was tracked
+    migrate_weight_trend(conn)
+
+def migrate_weight_logs(conn):
+    """
+    Make weight_logs one row per user and day
+
+    Days logged more than once keep their latest log; all of that day's logs
+    are copied to weight_readings first so nothing is lost. Runs before
+    apply_schema, which adds the unique (user_id, date) index.
+    """
     cursor = conn.cursor()
 
-    # Migration: Remove UNIQUE constraint from weight_logs
     try:
-        # Check if weight_logs table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='weight_logs'")
-        if cursor.fetchone():
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='weight_logs'")
+        table = cursor.fetchone()
+        if not table:
+            return
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_weight_logs_user_day'")
+        if cursor.fetchone() and 'UNIQUE' not in table[0].upper():
+            return
+
+        if 'UNIQUE' in table[0].upper():
             print("Migrating weight_logs table to remove UNIQUE constraint...")
 
-            # Recreate table without UNIQUE constraint
+            # Recreate table without the old table-level UNIQUE constraint
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS weight_logs_new (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,26 +82,63 @@ def migrate_db(conn):
                     FOREIGN KEY (user_id) REFERENCES users (id)
                 )
             ''')
-
-            # Copy data from old table
             cursor.execute('''
                 INSERT INTO weight_logs_new (id, user_id, date, weight_kg, notes, created_at)
                 SELECT id, user_id, date, weight_kg, notes, created_at FROM weight_logs
             ''')
-
-            # Drop old table and rename new one
             cursor.execute('DROP TABLE weight_logs')
             cursor.execute('ALTER TABLE weight_logs_new RENAME TO weight_logs')
 
-            print("Migration complete!")
-            conn.commit()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS weight_readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                date DATE NOT NULL,
+                weight_kg REAL NOT NULL,
+                notes TEXT,
+                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        cursor.execute('''
+            INSERT INTO weight_readings (user_id, date, weight_kg, notes, recorded_at)
+            SELECT user_id, date, weight_kg, notes, created_at FROM weight_logs
+            WHERE (user_id, date) IN (
+                SELECT user_id, date FROM weight_logs
+                GROUP BY user_id, date
+                HAVING COUNT(*) > 1
+            )
+        ''')
+        moved = cursor.rowcount
+
+        # Keep the latest log of each day
+        cursor.execute('''
+            DELETE FROM weight_logs
+            WHERE EXISTS (
+                SELECT 1 FROM weight_logs newer
+                WHERE newer.user_id = weight_logs.user_id
+                  AND newer.date = weight_logs.date
+                  AND (newer.created_at > weight_logs.created_at
+                       OR (newer.created_at = weight_logs.created_at AND newer.id > weight_logs.id))
+            )
+        ''')
+        removed = cursor.rowcount
+
+        # Day weights changed, so trends are recomputed by migrate_weight_trend
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='weight_trend'")
+        if removed and cursor.fetchone():
+            cursor.execute('DELETE FROM weight_trend')
+
+        cursor.execute('DROP INDEX IF EXISTS idx_weight_logs_user_date')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_weight_logs_user_day ON weight_logs(user_id, date)')
+
+        if removed:
+            print(f"Merged {removed} duplicate weight logs ({moved} kept as readings)")
+        conn.commit()
     except Exception as e:
-        print(f"Migration error (safe to ignore if first run): {e}")
+        print(f"Weight log migration error: {e}")
         conn.rollback()
 
-    # Migration: Add workout tracking tables
-    migrate_workout_tables(conn)
-
 def migrate_workout_tables(conn):
     """Add workout tracking tables"""
     cursor = conn.cursor()
@@ -83,6 +160,158 @@ def migrate_workout_tables(conn):
         print(f"Workout table migration error: {e}")
         conn.rollback()
 
+# Columns added after the original schema: (table, column, definition)
+NEW_COLUMNS = [
+    ('saved_images', 'processing_status', "TEXT DEFAULT 'ready'"),
+    ('saved_images', 'content_hash', 'TEXT'),
+    ('workout_exercises', 'exercise_key', 'TEXT'),
+    ('workout_exercises', 'user_id', 'INTEGER'),
+    ('workout_exercises', 'log_date', 'DATE'),
+    ('workout_exercises', 'client_id', 'TEXT'),
+]
+
+def migrate_new_columns(conn):
+    """Add columns from NEW_COLUMNS that existing tables are missing"""
+    try:
+        for table, column, definition in NEW_COLUMNS:
+            existing = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+            if existing and column not in existing:
+                print(f"Adding column {table}.{column}...")
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        conn.commit()
+    except Exception as e:
+        print(f"Column migration error: {e}")
+        conn.rollback()
+
+def apply_schema(conn):
+    """Create any tables, indexes and triggers from schema.sql that don't exist yet"""
+    try:
+        with open('schema.sql', 'r') as f:
+            conn.executescript(f.read())
+        conn.commit()
+    except Exception as e:
+        print(f"Schema migration error: {e}")
+        conn.rollback()
+
+def migrate_exercise_keys(conn):
+    """Backfill exercise_key, user_id and log_date on existing workout exercises"""
+    from services.workout_service import normalize_exercise_name
+
+    try:
+        conn.create_function('normalize_exercise_name', 1, normalize_exercise_name, deterministic=True)
+        cur = conn.execute('''
+            UPDATE workout_exercises SET
+                exercise_key = COALESCE(
+                    (SELECT exercise_key FROM exercise_aliases
+                     WHERE alias = normalize_exercise_name(workout_exercises.exercise_name)),
+                    normalize_exercise_name(exercise_name)
+                ),
+                user_id = (SELECT dl.user_id FROM workout_sessions ws
+                           JOIN daily_logs dl ON ws.daily_log_id = dl.id
+                           WHERE ws.id = workout_exercises.workout_session_id),
+                log_date = (SELECT dl.date FROM workout_sessions ws
+                            JOIN daily_logs dl ON ws.daily_log_id = dl.id
+                            WHERE ws.id = workout_exercises.workout_session_id)
+            WHERE exercise_key IS NULL
+        ''')
+        if cur.rowcount:
+            print(f"Added exercise keys to {cur.rowcount} workout exercises")
+            # Most recent spelling of each exercise becomes its catalog name
+            conn.execute('''
+                INSERT OR IGNORE INTO exercise_catalog (exercise_key, name, category)
+                SELECT exercise_key, exercise_name, exercise_category
+                FROM workout_exercises
+                WHERE id IN (SELECT MAX(id) FROM workout_exercises GROUP BY exercise_key)
+            ''')
+        conn.commit()
+    except Exception as e:
+        print(f"Exercise key migration error: {e}")
+        conn.rollback()
+
+def migrate_exercise_records(conn):
+    """Compute exercise_records from existing sets if the table is empty"""
+    from services.workout_service import recompute_records
+
+    try:
+        if conn.execute('SELECT 1 FROM exercise_records LIMIT 1').fetchone():
+            return
+
+        conn.row_factory = sqlite3.Row
+        owners = conn.execute('''
+            SELECT DISTINCT we.user_id, we.exercise_key
+            FROM workout_exercises we
+            JOIN workout_sets ws ON ws.workout_exercise_id = we.id
+            WHERE we.user_id IS NOT NULL AND we.exercise_key IS NOT NULL
+        ''').fetchall()
+        for owner in owners:
+            recompute_records(conn, owner['user_id'], owner['exercise_key'])
+        if owners:
+            print(f"Built personal records for {len(owners)} exercises")
+        conn.commit()
+    except Exception as e:
+        print(f"Exercise records migration error: {e}")
+        conn.rollback()
+    finally:
+        conn.row_factory = None
+
+def migrate_session_totals(conn):
+    """Compute workout_session_totals for sessions that don't have a row yet"""
+    from services.workout_service import SESSION_TOTALS_SQL
+
+    try:
+        cur = conn.execute(SESSION_TOTALS_SQL.format(
+            where='ws.id NOT IN (SELECT workout_session_id FROM workout_session_totals)'
+        ))
+        if cur.rowcount:
+            print(f"Added totals for {cur.rowcount} workout sessions")
+        conn.commit()
+    except Exception as e:
+        print(f"Session totals migration error: {e}")
+        conn.rollback()
+
+def migrate_user_foods(conn):
+    """Build the user_foods catalog (and through it the food_search index) from existing food entries"""
+    try:
+        if conn.execute('SELECT 1 FROM user_foods LIMIT 1').fetchone():
+            return
+
+        # With a single MAX(), SQLite takes the bare columns from the newest entry
+        cur = conn.execute('''
+            INSERT INTO user_foods
+                (user_id, food_key, name, serving_size, calories, protein_g, carbs_g, fat_g, fiber_g, sugar_g,
+                 uses, last_used, last_entry_id)
+            SELECT dl.user_id, LOWER(TRIM(fe.name)), TRIM(fe.name), fe.serving_size,
+                   fe.calories, fe.protein_g, fe.carbs_g, fe.fat_g, fe.fiber_g, fe.sugar_g,
+                   COUNT(*), fe.created_at, MAX(fe.id)
+            FROM food_entries fe
+            JOIN daily_logs dl ON dl.id = fe.daily_log_id
+            GROUP BY dl.user_id, LOWER(TRIM(fe.name))
+        ''')
+        if cur.rowcount:
+            print(f"Added {cur.rowcount} foods to the food catalog")
+        conn.commit()
+    except Exception as e:
+        print(f"User foods migration error: {e}")
+        conn.rollback()
+
+def migrate_weight_trend(conn):
+    """Compute weight_trend for users with weight logs but no trend yet"""
+    from services.weight_trend import refresh_trend
+
+    try:
+        users = [row[0] for row in conn.execute('''
+            SELECT DISTINCT user_id FROM weight_logs
+            WHERE user_id NOT IN (SELECT user_id FROM weight_trend)
+        ''')]
+        for user_id in users:
+            refresh_trend(conn, user_id, '0000-01-01')
+        if users:
+            print(f"Computed weight trends for {len(users)} users")
+        conn.commit()
+    except Exception as e:
+        print(f"Weight trend migration error: {e}")
+        conn.rollback()
+
 @contextmanager
 def get_db():
     """Context manager for database connections"""
@@ -1,4 +1,6 @@
 from flask import Blueprint, request, jsonify
+import hashlib
+import json
 import os
 from database import query_db, execute_db
 from services.ai_service import analyze_food_image
@@ -7,6 +9,16 @@ bp = Blueprint('ai_analysis', __name__, url_prefix='/api/ai')
 
 UPLOAD_DIR = os.getenv('UPLOAD_DIR', './uploads')
 
+def analysis_cache_key(images, custom_notes):
+    """
+    Cache key for an analysis: the content hashes of the analyzed images plus
+    the user's notes. None if any image isn't content-addressed yet.
+    """
+    hashes = [img.get('content_hash') for img in images]
+    if not all(hashes):
+        return None
+    return hashlib.sha256('|'.join(hashes + [custom_notes or '']).encode()).hexdigest()
+
 @bp.route('/analyze-image', methods=['POST'])
 def analyze_image():
     """Analyze food image(s) using AI - automatically uses all images in group"""
@@ -28,7 +40,6 @@ def analyze_image():
 
     # Check if we have a previous analysis (only if not forced)
     if image['analysis_result'] and not force_reanalyze:
-        import json
         try:
             previous_result = json.loads(image['analysis_result'])
             previous_result['is_cached'] = True
@@ -36,6 +47,9 @@ def analyze_image():
         except:
             pass  # If parsing fails, continue with new analysis
 
+    if image.get('processing_status') == 'pending':
+        return jsonify({'error': 'Image is still processing, please try again shortly'}), 409
+
     # Get full image path for primary image
     image_path = os.path.join(UPLOAD_DIR, image['image_path'])
 
@@ -44,6 +58,7 @@ def analyze_image():
 
     # Get all additional images in the group
     additional_image_paths = []
+    analyzed_images = [image]
     if group_id:
         group_images = query_db(
             '''SELECT * FROM saved_images
@@ -52,10 +67,28 @@ def analyze_image():
             [group_id, image_id]
         )
 
+        if any(img.get('processing_status') == 'pending' for img in group_images):
+            return jsonify({'error': 'Images are still processing, please try again shortly'}), 409
+
         for img in group_images:
             img_path = os.path.join(UPLOAD_DIR, img['image_path'])
             if os.path.exists(img_path):
                 additional_image_paths.append(img_path)
+                analyzed_images.append(img)
+
+    # Identical photos (same content hash) analyzed before don't need another AI call
+    cache_key = analysis_cache_key(analyzed_images, custom_notes)
+    if cache_key and not force_reanalyze:
+        cached = query_db('SELECT result FROM ai_analysis_cache WHERE cache_key = ?', [cache_key], one=True)
+        if cached:
+            execute_db(
+                'UPDATE saved_images SET analyzed = 1, analysis_result = ? WHERE id = ?',
+                [cached['result'], image_id]
+            )
+            result = json.loads(cached['result'])
+            result['is_cached'] = True
+            result['images_analyzed'] = len(analyzed_images)
+            return jsonify(result)
 
     try:
         # Analyze image(s) - pass additional images if they exist
@@ -66,7 +99,6 @@ def analyze_image():
         )
 
         # Save analysis result to primary image
-        import json
         result_json = json.dumps(result)
         execute_db(
             'UPDATE saved_images SET analyzed = 1, analysis_result = ? WHERE id = ?',
@@ -80,6 +112,13 @@ def analyze_image():
                 [group_id]
             )
 
+        # Don't cache failed parses - a retry may succeed
+        if cache_key and not result.get('error'):
+            execute_db(
+                'INSERT OR REPLACE INTO ai_analysis_cache (cache_key, result) VALUES (?, ?)',
+                [cache_key, result_json]
+            )
+
         result['is_cached'] = False
         result['images_analyzed'] = 1 + len(additional_image_paths)
         return jsonify(result)
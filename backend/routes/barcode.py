@@ -1,47 +1,46 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, request, jsonify
 import requests
+from services.barcode_service import lookup_product, lookup_products, get_cache_stats, MAX_BATCH_SIZE
 
 bp = Blueprint('barcode', __name__, url_prefix='/api/barcode')
 
+@bp.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Get barcode cache hit ratio and upstream latency"""
+    return jsonify(get_cache_stats())
+
+@bp.route('/batch', methods=['POST'])
+def lookup_barcode_batch():
+    """Lookup many barcodes at once (e.g. a whole grocery haul)"""
+    data = request.json or {}
+    barcodes = [str(b).strip() for b in data.get('barcodes', []) if str(b).strip()]
+
+    if not barcodes:
+        return jsonify({'error': 'barcodes is required'}), 400
+
+    if len(barcodes) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} barcodes per batch'}), 400
+
+    try:
+        results, errors = lookup_products(barcodes)
+        return jsonify({
+            'results': results,
+            'not_found': [b for b, result in results.items() if result is None],
+            'errors': errors
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'Error processing barcodes: {str(e)}'}), 500
+
 @bp.route('/<barcode>', methods=['GET'])
 def lookup_barcode(barcode):
-    """Lookup product information by barcode using OpenFoodFacts API"""
+    """Lookup product information by barcode (local mirror, cache, then OpenFoodFacts API)"""
     try:
-        url = f'https://world.openfoodfacts.org/api/v0/product/{barcode}.json'
-        response = requests.get(url, timeout=10)
-        data = response.json()
+        result = lookup_product(barcode)
 
-        if data['status'] == 0:
+        if not result:
             return jsonify({'error': 'Product not found'}), 404
 
-        product = data['product']
-
-        # Extract nutritional information
-        nutriments = product.get('nutriments', {})
-
-        result = {
-            'name': product.get('product_name', 'Unknown Product'),
-            'brand': product.get('brands', ''),
-            'barcode': barcode,
-            'serving_size': product.get('serving_size', '100g'),
-            'calories': nutriments.get('energy-kcal_100g', 0),
-            'protein_g': nutriments.get('proteins_100g', 0),
-            'carbs_g': nutriments.get('carbohydrates_100g', 0),
-            'fat_g': nutriments.get('fat_100g', 0),
-            'fiber_g': nutriments.get('fiber_100g', 0),
-            'sugar_g': nutriments.get('sugars_100g', 0),
-            'sodium_mg': nutriments.get('sodium_100g', 0) * 1000 if nutriments.get('sodium_100g') else 0,
-            'image_url': product.get('image_url', ''),
-            'micronutrients': {
-                'vitamin_a_mcg': nutriments.get('vitamin-a_100g', 0) * 1000000 if nutriments.get('vitamin-a_100g') else 0,
-                'vitamin_c_mg': nutriments.get('vitamin-c_100g', 0) * 1000 if nutriments.get('vitamin-c_100g') else 0,
-                'vitamin_d_mcg': nutriments.get('vitamin-d_100g', 0) * 1000000 if nutriments.get('vitamin-d_100g') else 0,
-                'calcium_mg': nutriments.get('calcium_100g', 0) * 1000 if nutriments.get('calcium_100g') else 0,
-                'iron_mg': nutriments.get('iron_100g', 0) * 1000 if nutriments.get('iron_100g') else 0,
-                'potassium_mg': nutriments.get('potassium_100g', 0) * 1000 if nutriments.get('potassium_100g') else 0,
-            }
-        }
-
         return jsonify(result)
 
     except requests.RequestException as e:
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
-from database import query_db, execute_db
+from database import query_db, execute_db, get_db
 from routes.daily_logs import recalculate_daily_totals
 from services.ai_service import estimate_micronutrients
+from services import metrics
+from services.food_search import search_foods
 
 bp = Blueprint('food_entries', __name__, url_prefix='/api/food-entries')
 
@@ -19,71 +21,72 @@ def create_entry():
     """Create a new food entry"""
     data = request.json
 
-    entry_id = execute_db(
-        '''INSERT INTO food_entries
-           (daily_log_id, name, calories, protein_g, carbs_g, fat_g, fiber_g, sugar_g,
-            meal_type, image_path, barcode, serving_size)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        [
-            data['daily_log_id'],
-            data['name'],
-            data['calories'],
-            data.get('protein_g', 0),
-            data.get('carbs_g', 0),
-            data.get('fat_g', 0),
-            data.get('fiber_g', 0),
-            data.get('sugar_g', 0),
-            data.get('meal_type'),
-            data.get('image_path'),
-            data.get('barcode'),
-            data.get('serving_size', '1 serving')
-        ]
-    )
-
-    # Get or estimate micronutrients
-    if 'micronutrients' in data and data['micronutrients']:
-        micro = data['micronutrients']
-    else:
-        # Estimate micronutrients using AI
-        micro = estimate_micronutrients(
-            data['name'],
-            data['calories'],
-            data.get('protein_g', 0),
-            data.get('carbs_g', 0),
-            data.get('fat_g', 0)
+    with metrics.timer('food_entries.create.latency_ms'):
+        entry_id = execute_db(
+            '''INSERT INTO food_entries
+               (daily_log_id, name, calories, protein_g, carbs_g, fat_g, fiber_g, sugar_g,
+                meal_type, image_path, barcode, serving_size)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            [
+                data['daily_log_id'],
+                data['name'],
+                data['calories'],
+                data.get('protein_g', 0),
+                data.get('carbs_g', 0),
+                data.get('fat_g', 0),
+                data.get('fiber_g', 0),
+                data.get('sugar_g', 0),
+                data.get('meal_type'),
+                data.get('image_path'),
+                data.get('barcode'),
+                data.get('serving_size', '1 serving')
+            ]
         )
 
-    # Insert micronutrients
-    execute_db(
-        '''INSERT INTO micronutrients
-           (food_entry_id, vitamin_a_mcg, vitamin_c_mg, vitamin_d_mcg, vitamin_e_mg,
-            vitamin_k_mcg, vitamin_b6_mg, vitamin_b12_mcg, folate_mcg, calcium_mg,
-            iron_mg, magnesium_mg, potassium_mg, zinc_mg, sodium_mg)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        [
-            entry_id,
-            micro.get('vitamin_a_mcg', 0),
-            micro.get('vitamin_c_mg', 0),
-            micro.get('vitamin_d_mcg', 0),
-            micro.get('vitamin_e_mg', 0),
-            micro.get('vitamin_k_mcg', 0),
-            micro.get('vitamin_b6_mg', 0),
-            micro.get('vitamin_b12_mcg', 0),
-            micro.get('folate_mcg', 0),
-            micro.get('calcium_mg', 0),
-            micro.get('iron_mg', 0),
-            micro.get('magnesium_mg', 0),
-            micro.get('potassium_mg', 0),
-            micro.get('zinc_mg', 0),
-            micro.get('sodium_mg', 0)
-        ]
-    )
+        # Get or estimate micronutrients
+        if 'micronutrients' in data and data['micronutrients']:
+            micro = data['micronutrients']
+        else:
+            # Estimate micronutrients using AI
+            micro = estimate_micronutrients(
+                data['name'],
+                data['calories'],
+                data.get('protein_g', 0),
+                data.get('carbs_g', 0),
+                data.get('fat_g', 0)
+            )
+
+        # Insert micronutrients
+        execute_db(
+            '''INSERT INTO micronutrients
+               (food_entry_id, vitamin_a_mcg, vitamin_c_mg, vitamin_d_mcg, vitamin_e_mg,
+                vitamin_k_mcg, vitamin_b6_mg, vitamin_b12_mcg, folate_mcg, calcium_mg,
+                iron_mg, magnesium_mg, potassium_mg, zinc_mg, sodium_mg)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            [
+                entry_id,
+                micro.get('vitamin_a_mcg', 0),
+                micro.get('vitamin_c_mg', 0),
+                micro.get('vitamin_d_mcg', 0),
+                micro.get('vitamin_e_mg', 0),
+                micro.get('vitamin_k_mcg', 0),
+                micro.get('vitamin_b6_mg', 0),
+                micro.get('vitamin_b12_mcg', 0),
+                micro.get('folate_mcg', 0),
+                micro.get('calcium_mg', 0),
+                micro.get('iron_mg', 0),
+                micro.get('magnesium_mg', 0),
+                micro.get('potassium_mg', 0),
+                micro.get('zinc_mg', 0),
+                micro.get('sodium_mg', 0)
+            ]
+        )
 
-    # Recalculate daily totals
-    recalculate_daily_totals(data['daily_log_id'])
+        # Recalculate daily totals
+        recalculate_daily_totals(data['daily_log_id'])
 
-    entry = query_db('SELECT * FROM food_entries WHERE id = ?', [entry_id], one=True)
-    return jsonify(entry), 201
+        entry = query_db('SELECT * FROM food_entries WHERE id = ?', [entry_id], one=True)
+        return jsonify(entry), 201
 
 @bp.route('/<int:entry_id>', methods=['PUT'])
 def update_entry(entry_id):
@@ -135,13 +138,23 @@ def delete_entry(entry_id):
 
 @bp.route('/recent', methods=['GET'])
 def get_recent_foods():
-    """Get recently used unique foods"""
+    """
+    Get distinct foods from the user's food catalog
+
+    Query params:
+        limit: Maximum foods (default 20)
+        sort: 'recent' (default) or 'frequent'
+    """
     user_id = request.args.get('user_id', 1)
     limit = int(request.args.get('limit', 20))
+    if request.args.get('sort') == 'frequent':
+        order = 'uses DESC, last_used DESC'
+    else:
+        order = 'last_used DESC, last_entry_id DESC'
 
-    # Get distinct foods ordered by most recent use
+    # user_foods is maintained by triggers on food_entries - one row per food
     foods = query_db(
-        '''SELECT
+        f'''SELECT
                name,
                calories,
                protein_g,
@@ -150,15 +163,31 @@ def get_recent_foods():
                fiber_g,
                sugar_g,
                serving_size,
-               MAX(created_at) as last_used
-           FROM food_entries
-           WHERE daily_log_id IN (
-               SELECT id FROM daily_logs WHERE user_id = ?
-           )
-           GROUP BY LOWER(name)
-           ORDER BY last_used DESC
+               uses,
+               last_used
+           FROM user_foods
+           WHERE user_id = ?
+           ORDER BY {order}
            LIMIT ?''',
         [user_id, limit]
     )
 
     return jsonify(foods)
+
+@bp.route('/search', methods=['GET'])
+def search_food_history():
+    """
+    Search every food the user has logged (prefix matching for typeahead)
+
+    Query params:
+        q: Search text
+        limit: Maximum results (default 10)
+    """
+    user_id = request.args.get('user_id', 1)
+    limit = max(1, min(int(request.args.get('limit', 10)), 50))
+
+    with metrics.timer('food_entries.search.latency_ms'):
+        with get_db() as conn:
+            foods = search_foods(conn, user_id, request.args.get('q', ''), limit)
+
+    return jsonify(foods)
@@ -1,15 +1,56 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, Response
 from werkzeug.utils import secure_filename
+import base64
+import mimetypes
 import os
+import re
 import uuid
 from datetime import datetime
-from database import query_db, execute_db
-from services.image_service import save_uploaded_image, delete_image_file
+from database import query_db, execute_db, get_db
+from services.image_service import store_upload, get_rendition_path, find_content_file, RENDITION_SIZES
+from services.image_processing import submit_image, release_images, delete_files
 
 bp = Blueprint('images', __name__, url_prefix='/api/images')
 
 UPLOAD_DIR = os.getenv('UPLOAD_DIR', './uploads')
 
+# Behind nginx, set this to an internal location aliased to UPLOAD_DIR
+# (e.g. /protected-uploads/) and nginx streams the file instead of Python
+ACCEL_REDIRECT_PREFIX = os.getenv('IMAGE_ACCEL_REDIRECT_PREFIX', '')
+
+# Content-addressed URLs never change what they point to
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+CONTENT_HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+def image_etag(content_hash, size):
+    """Strong ETag for a content-addressed image rendition"""
+    return f'{content_hash}-{size}'
+
+def serve_image_file(path, etag, cache_control):
+    """
+    Send an image file with caching headers, via X-Accel-Redirect when
+    configured (X-Sendfile is handled by send_file when USE_X_SENDFILE is on)
+
+    Args:
+        path: Absolute path of the file
+        etag: ETag string, or True to derive one from the file's mtime and size
+        cache_control: Cache-Control header value
+    """
+    if ACCEL_REDIRECT_PREFIX:
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        relative_path = os.path.relpath(path, UPLOAD_DIR).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + relative_path
+        if isinstance(etag, str):
+            response.set_etag(etag)
+        response.make_conditional(request)
+    else:
+        # conditional=True answers If-None-Match with 304 and Range with 206
+        response = send_file(path, etag=etag, conditional=True)
+
+    response.headers['Cache-Control'] = cache_control
+    return response
+
 @bp.route('/upload', methods=['POST'])
 def upload_image():
     """Upload one or more images as a group"""
@@ -30,25 +71,28 @@ def upload_image():
     try:
         # Generate a group ID for these images
         group_id = str(uuid.uuid4())
-        uploaded_images = []
 
-        for idx, file in enumerate(files):
-            # Save the image file
-            image_path = save_uploaded_image(file, UPLOAD_DIR)
+        # Stream the raw files to disk - resizing happens off-request
+        raw_filenames = [store_upload(file, UPLOAD_DIR) for file in files]
 
-            # First image is primary
-            is_primary = (idx == 0)
-
-            # Save to database
-            image_id = execute_db(
-                '''INSERT INTO saved_images
-                   (user_id, image_path, description, image_group_id, is_primary)
-                   VALUES (?, ?, ?, ?, ?)''',
-                [user_id, image_path, description if is_primary else '', group_id, is_primary]
-            )
-
-            image = query_db('SELECT * FROM saved_images WHERE id = ?', [image_id], one=True)
-            uploaded_images.append(image)
+        uploaded_images = []
+        with get_db() as conn:
+            for idx, raw_filename in enumerate(raw_filenames):
+                # First image is primary
+                is_primary = (idx == 0)
+
+                cur = conn.execute(
+                    '''INSERT INTO saved_images
+                       (user_id, image_path, description, image_group_id, is_primary, processing_status)
+                       VALUES (?, ?, ?, ?, ?, 'pending')''',
+                    [user_id, raw_filename, description if is_primary else '', group_id, is_primary]
+                )
+                image = conn.execute('SELECT * FROM saved_images WHERE id = ?', [cur.lastrowid]).fetchone()
+                uploaded_images.append(dict(image))
+
+        # Resize and optimize all images concurrently on the process pool
+        for image in uploaded_images:
+            submit_image(image['id'], image['image_path'], UPLOAD_DIR)
 
         # Return the primary image with group info
         return jsonify({
@@ -58,40 +102,91 @@ def upload_image():
             'all_images': uploaded_images
         }), 201
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Failed to upload images: {str(e)}'}), 500
 
+# Columns returned by the gallery in compact mode (everything but analysis_result)
+COMPACT_COLUMNS = '''id, user_id, image_path, description, analyzed, image_group_id, is_primary,
+                     processing_status, content_hash, created_at,
+                     analysis_result IS NOT NULL AS has_analysis'''
+
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(image):
+    """Opaque keyset cursor pointing just after an image (created_at, id)"""
+    return base64.urlsafe_b64encode(f"{image['created_at']}|{image['id']}".encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor into (created_at, id)"""
+    created_at, image_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+    return created_at, int(image_id)
+
 @bp.route('', methods=['GET'])
 def get_images():
-    """Get all saved images grouped together"""
+    """
+    Get saved images grouped together, newest first
+
+    Query params:
+        limit: page size - when given, returns {images, next_cursor} instead of a list
+        cursor: next_cursor from the previous page
+        compact: 1 to omit the analysis_result JSON (has_analysis is returned instead)
+    """
     user_id = request.args.get('user_id', 1)
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    compact = request.args.get('compact', '0').lower() in ('1', 'true', 'yes')
+    columns = COMPACT_COLUMNS if compact else '*'
+
+    query = f'''SELECT {columns} FROM saved_images
+                WHERE user_id = ? AND is_primary = 1'''
+    args = [user_id]
+
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query += ' AND (created_at < ? OR (created_at = ? AND id < ?))'
+        args += [cursor_created_at, cursor_created_at, cursor_id]
+
+    query += ' ORDER BY created_at DESC, id DESC'
+    if limit:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        # One extra row tells us whether there's another page
+        query += ' LIMIT ?'
+        args.append(limit + 1)
+
+    with get_db() as conn:
+        primary_images = [dict(row) for row in conn.execute(query, args)]
+
+        next_cursor = None
+        if limit and len(primary_images) > limit:
+            primary_images = primary_images[:limit]
+            next_cursor = encode_cursor(primary_images[-1])
+
+        # Fetch the members of every group on this page in one query
+        group_ids = [img['image_group_id'] for img in primary_images if img['image_group_id']]
+        group_images = {}
+        if group_ids:
+            placeholders = ','.join('?' * len(group_ids))
+            rows = conn.execute(
+                f'''SELECT {columns} FROM saved_images
+                    WHERE image_group_id IN ({placeholders})
+                    ORDER BY is_primary DESC, created_at, id''',
+                group_ids
+            )
+            for row in rows:
+                group_images.setdefault(row['image_group_id'], []).append(dict(row))
 
-    # Get all primary images
-    primary_images = query_db(
-        '''SELECT * FROM saved_images
-           WHERE user_id = ? AND is_primary = 1
-           ORDER BY created_at DESC''',
-        [user_id]
-    )
-
-    # For each primary image, get its group members
     result = []
-    for primary in primary_images:
-        # Convert sqlite Row to dict
-        primary_dict = dict(primary)
+    for primary_dict in primary_images:
         group_id = primary_dict.get('image_group_id')
 
         if group_id:
-            # Get all images in this group
-            group_images = query_db(
-                '''SELECT * FROM saved_images
-                   WHERE image_group_id = ?
-                   ORDER BY is_primary DESC, created_at''',
-                [group_id]
-            )
-            # Convert to list of dicts
-            primary_dict['group_images'] = [dict(img) for img in group_images]
-            primary_dict['image_count'] = len(group_images)
+            primary_dict['group_images'] = group_images.get(group_id, [])
+            primary_dict['image_count'] = len(primary_dict['group_images'])
         else:
             # Single image
             primary_dict['group_images'] = [primary_dict.copy()]
@@ -99,53 +194,87 @@ def get_images():
 
         result.append(primary_dict)
 
+    if limit:
+        return jsonify({'images': result, 'next_cursor': next_cursor})
+
     return jsonify(result)
 
 @bp.route('/<int:image_id>', methods=['GET'])
 def get_image(image_id):
-    """Get a specific image file"""
+    """Get a specific image file (?size=thumb|medium|full, default full)"""
+    size = request.args.get('size', 'full')
+    if size != 'full' and size not in RENDITION_SIZES:
+        return jsonify({'error': 'size must be thumb, medium or full'}), 400
+
     image = query_db('SELECT * FROM saved_images WHERE id = ?', [image_id], one=True)
 
     if not image:
         return jsonify({'error': 'Image not found'}), 404
 
-    image_path = os.path.join(UPLOAD_DIR, image['image_path'])
-    if not os.path.exists(image_path):
+    image_path = get_rendition_path(image['image_path'], UPLOAD_DIR, size)
+    if not image_path:
         return jsonify({'error': 'Image file not found'}), 404
 
-    return send_file(image_path)
+    # The file behind an id changes once processing finishes, so always revalidate
+    etag = image_etag(image['content_hash'], size) if image.get('content_hash') else True
+    return serve_image_file(image_path, etag, 'no-cache')
+
+@bp.route('/content/<content_hash>', methods=['GET'])
+def get_image_content(content_hash):
+    """Get an image by content hash (?size=thumb|medium|full) - cacheable forever, no DB lookup"""
+    size = request.args.get('size', 'full')
+    if size != 'full' and size not in RENDITION_SIZES:
+        return jsonify({'error': 'size must be thumb, medium or full'}), 400
+
+    if not CONTENT_HASH_PATTERN.fullmatch(content_hash):
+        return jsonify({'error': 'Image not found'}), 404
+
+    # Content never changes, so a matching ETag is answered without touching disk
+    etag = image_etag(content_hash, size)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    filename = find_content_file(content_hash, UPLOAD_DIR)
+    image_path = get_rendition_path(filename, UPLOAD_DIR, size) if filename else None
+    if not image_path:
+        return jsonify({'error': 'Image not found'}), 404
+
+    return serve_image_file(image_path, etag, IMMUTABLE_CACHE_CONTROL)
 
 @bp.route('/<int:image_id>', methods=['DELETE'])
 def delete_image(image_id):
     """Delete an image (and all images in its group if it's primary)"""
-    image = query_db('SELECT * FROM saved_images WHERE id = ?', [image_id], one=True)
-
-    if not image:
-        return jsonify({'error': 'Image not found'}), 404
+    with get_db() as conn:
+        image = conn.execute('SELECT * FROM saved_images WHERE id = ?', [image_id]).fetchone()
 
-    group_id = image['image_group_id']
+        if not image:
+            return jsonify({'error': 'Image not found'}), 404
 
-    # If this is a primary image with a group, delete all images in the group
-    if group_id and image['is_primary']:
-        group_images = query_db(
-            'SELECT * FROM saved_images WHERE image_group_id = ?',
-            [group_id]
-        )
+        group_id = image['image_group_id']
 
-        # Delete all files
-        for img in group_images:
-            delete_image_file(img['image_path'], UPLOAD_DIR)
+        # If this is a primary image with a group, delete all images in the group
+        if group_id and image['is_primary']:
+            images = [dict(img) for img in conn.execute(
+                'SELECT * FROM saved_images WHERE image_group_id = ?',
+                [group_id]
+            )]
+            conn.execute('DELETE FROM saved_images WHERE image_group_id = ?', [group_id])
+            message = f'Deleted {len(images)} image(s)'
+        else:
+            # Just delete this single image
+            images = [dict(image)]
+            conn.execute('DELETE FROM saved_images WHERE id = ?', [image_id])
+            message = 'Image deleted successfully'
 
-        # Delete all from database
-        execute_db('DELETE FROM saved_images WHERE image_group_id = ?', [group_id])
+        unreferenced_files = release_images(conn, images)
 
-        return jsonify({'message': f'Deleted {len(group_images)} image(s)'}), 200
-    else:
-        # Just delete this single image
-        delete_image_file(image['image_path'], UPLOAD_DIR)
-        execute_db('DELETE FROM saved_images WHERE id = ?', [image_id])
+    # Only remove files once the rows are gone for good (shared files stay until unreferenced)
+    delete_files(unreferenced_files, UPLOAD_DIR)
 
-        return jsonify({'message': 'Image deleted successfully'}), 200
+    return jsonify({'message': message}), 200
 
 @bp.route('/<int:image_id>/analyzed', methods=['PUT'])
 def mark_analyzed(image_id):
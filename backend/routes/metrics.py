@@ -0,0 +1,19 @@
+from flask import Blueprint, request, jsonify
+from services import metrics
+from services.ai_service import get_routing_stats
+
+bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
+
+@bp.route('', methods=['GET'])
+def get_metrics():
+    """Get in-process counters, gauges and latency percentiles"""
+    prefix = request.args.get('prefix')
+    return jsonify(metrics.snapshot(prefix))
+
+@bp.route('/ai', methods=['GET'])
+def get_ai_metrics():
+    """Get per-task AI model routing stats (latency, tokens, escalation rate)"""
+    return jsonify({
+        'tasks': get_routing_stats(),
+        'food_entry_create': metrics.snapshot('food_entries.create')['timings'].get('food_entries.create.latency_ms')
+    })
@@ -1,9 +1,29 @@
+import math
+from datetime import date, timedelta
 from flask import Blueprint, request, jsonify
-from database import query_db, execute_db
-from services.calculations import calculate_bmr, calculate_tdee, calculate_calorie_goal, calculate_macro_targets, calculate_water_target, get_rda_targets
+from database import query_db, get_db
+from services.weight_trend import record_weight
+from services.calculations import calculate_bmr, calculate_tdee, calculate_calorie_goal, calculate_macro_targets, calculate_water_target, get_vitamin_target_rows
+from services.calculations import ACTIVITY_MULTIPLIERS, calculate_bmr_array, calculate_tdee_array, calculate_calorie_goal_array, calculate_macro_targets_array, project_weight
+
+# Projections default to the average intake logged over this many days
+PROJECTION_INTAKE_DAYS = 28
+MAX_PROJECTION_DAYS = 365
+MAX_PROJECTION_SCENARIOS = 20
 
 bp = Blueprint('user_profile', __name__, url_prefix='/api/profile')
 
+def save_vitamin_targets(conn, user_id, age, gender):
+    """Set a user's vitamin targets to the RDAs for their age and gender in one statement"""
+    conn.executemany(
+        '''INSERT INTO vitamin_targets (user_id, nutrient_name, target_amount, unit)
+           VALUES (?, ?, ?, ?)
+           ON CONFLICT (user_id, nutrient_name) DO UPDATE SET
+               target_amount = excluded.target_amount,
+               unit = excluded.unit''',
+        [(user_id, name, amount, unit) for name, amount, unit in get_vitamin_target_rows(age, gender)]
+    )
+
 @bp.route('', methods=['GET'])
 def get_profile():
     """Get user profile"""
@@ -43,52 +63,43 @@ def create_profile():
     # Calculate water target
     water_target = calculate_water_target(data['weight_kg'], data['activity_level'])
 
-    profile_id = execute_db(
-        '''INSERT INTO user_profile
-           (user_id, age, weight_kg, height_cm, gender, activity_level, goal, bmr, tdee,
-            protein_target_g, carbs_target_g, fat_target_g, water_target_ml,
-            use_custom_targets, custom_calorie_goal, custom_protein_target_g,
-            custom_carbs_target_g, custom_fat_target_g, custom_water_target_ml)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-        [
-            user_id,
-            data['age'],
-            data['weight_kg'],
-            data['height_cm'],
-            data['gender'],
-            data['activity_level'],
-            data['goal'],
-            bmr,
-            tdee,
-            macros['protein_g'],
-            macros['carbs_g'],
-            macros['fat_g'],
-            water_target,
-            data.get('use_custom_targets', False),
-            data.get('custom_calorie_goal'),
-            data.get('custom_protein_target_g'),
-            data.get('custom_carbs_target_g'),
-            data.get('custom_fat_target_g'),
-            data.get('custom_water_target_ml')
-        ]
-    )
+    # Profile and vitamin targets are saved in one transaction
+    with get_db() as conn:
+        profile_id = conn.execute(
+            '''INSERT INTO user_profile
+               (user_id, age, weight_kg, height_cm, gender, activity_level, goal, bmr, tdee,
+                protein_target_g, carbs_target_g, fat_target_g, water_target_ml,
+                use_custom_targets, custom_calorie_goal, custom_protein_target_g,
+                custom_carbs_target_g, custom_fat_target_g, custom_water_target_ml)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            [
+                user_id,
+                data['age'],
+                data['weight_kg'],
+                data['height_cm'],
+                data['gender'],
+                data['activity_level'],
+                data['goal'],
+                bmr,
+                tdee,
+                macros['protein_g'],
+                macros['carbs_g'],
+                macros['fat_g'],
+                water_target,
+                data.get('use_custom_targets', False),
+                data.get('custom_calorie_goal'),
+                data.get('custom_protein_target_g'),
+                data.get('custom_carbs_target_g'),
+                data.get('custom_fat_target_g'),
+                data.get('custom_water_target_ml')
+            ]
+        ).lastrowid
+
+        # Populate vitamin targets with RDA values
+        save_vitamin_targets(conn, user_id, data['age'], data['gender'])
+
+        profile = dict(conn.execute('SELECT * FROM user_profile WHERE id = ?', [profile_id]).fetchone())
 
-    # Populate vitamin targets with RDA values
-    rdas = get_rda_targets(data['age'], data['gender'])
-    for nutrient, amount in rdas.items():
-        # Convert underscore names to display names
-        nutrient_display = nutrient.replace('_', ' ').title()
-        unit = 'mcg' if '_mcg' in nutrient else 'mg'
-
-        # Insert or replace target
-        execute_db(
-            '''INSERT OR REPLACE INTO vitamin_targets
-               (user_id, nutrient_name, target_amount, unit)
-               VALUES (?, ?, ?, ?)''',
-            [user_id, nutrient_display, amount, unit]
-        )
-
-    profile = query_db('SELECT * FROM user_profile WHERE id = ?', [profile_id], one=True)
     return jsonify(profile), 201
 
 @bp.route('', methods=['PUT'])
@@ -121,88 +132,101 @@ def update_profile():
     # Calculate water target
     water_target = calculate_water_target(data['weight_kg'], data['activity_level'])
 
-    execute_db(
-        '''UPDATE user_profile
-           SET age = ?, weight_kg = ?, height_cm = ?, gender = ?,
-               activity_level = ?, goal = ?, bmr = ?, tdee = ?,
-               protein_target_g = ?, carbs_target_g = ?, fat_target_g = ?,
-               water_target_ml = ?,
-               use_custom_targets = ?,
-               custom_calorie_goal = ?, custom_protein_target_g = ?,
-               custom_carbs_target_g = ?, custom_fat_target_g = ?,
-               custom_water_target_ml = ?,
-               updated_at = CURRENT_TIMESTAMP
-           WHERE user_id = ?''',
-        [
-            data['age'],
-            data['weight_kg'],
-            data['height_cm'],
-            data['gender'],
-            data['activity_level'],
-            data['goal'],
-            bmr,
-            tdee,
-            macros['protein_g'],
-            macros['carbs_g'],
-            macros['fat_g'],
-            water_target,
-            data.get('use_custom_targets', False),
-            data.get('custom_calorie_goal'),
-            data.get('custom_protein_target_g'),
-            data.get('custom_carbs_target_g'),
-            data.get('custom_fat_target_g'),
-            data.get('custom_water_target_ml'),
-            user_id
-        ]
-    )
-
-    # Update today's daily log with new targets
-    from datetime import date
     today = date.today().isoformat()
-    execute_db(
-        '''UPDATE daily_logs
-           SET calorie_goal = ?,
-               protein_target_g = ?,
-               carbs_target_g = ?,
-               fat_target_g = ?
-           WHERE user_id = ? AND date = ?''',
-        [calorie_goal, macros['protein_g'], macros['carbs_g'], macros['fat_g'], user_id, today]
-    )
 
-    # Create a new weight log entry for every profile save
-    new_weight = data['weight_kg']
-    try:
-        execute_db(
-            '''INSERT INTO weight_logs (user_id, date, weight_kg, notes)
-               VALUES (?, ?, ?, ?)''',
-            [user_id, today, new_weight, 'Updated from profile']
+    # All of a profile save is written in one transaction
+    with get_db() as conn:
+        conn.execute(
+            '''UPDATE user_profile
+               SET age = ?, weight_kg = ?, height_cm = ?, gender = ?,
+                   activity_level = ?, goal = ?, bmr = ?, tdee = ?,
+                   protein_target_g = ?, carbs_target_g = ?, fat_target_g = ?,
+                   water_target_ml = ?,
+                   use_custom_targets = ?,
+                   custom_calorie_goal = ?, custom_protein_target_g = ?,
+                   custom_carbs_target_g = ?, custom_fat_target_g = ?,
+                   custom_water_target_ml = ?,
+                   updated_at = CURRENT_TIMESTAMP
+               WHERE user_id = ?''',
+            [
+                data['age'],
+                data['weight_kg'],
+                data['height_cm'],
+                data['gender'],
+                data['activity_level'],
+                data['goal'],
+                bmr,
+                tdee,
+                macros['protein_g'],
+                macros['carbs_g'],
+                macros['fat_g'],
+                water_target,
+                data.get('use_custom_targets', False),
+                data.get('custom_calorie_goal'),
+                data.get('custom_protein_target_g'),
+                data.get('custom_carbs_target_g'),
+                data.get('custom_fat_target_g'),
+                data.get('custom_water_target_ml'),
+                user_id
+            ]
         )
-    except Exception as e:
-        # If UNIQUE constraint exists (migration not run yet), use INSERT OR REPLACE as fallback
-        print(f"Weight log insert failed (using fallback): {e}")
-        execute_db(
-            '''INSERT OR REPLACE INTO weight_logs (user_id, date, weight_kg, notes)
-               VALUES (?, ?, ?, ?)''',
-            [user_id, today, new_weight, 'Updated from profile']
+
+        # Update today's daily log with new targets
+        conn.execute(
+            '''UPDATE daily_logs
+               SET calorie_goal = ?,
+                   protein_target_g = ?,
+                   carbs_target_g = ?,
+                   fat_target_g = ?
+               WHERE user_id = ? AND date = ?''',
+            [calorie_goal, macros['protein_g'], macros['carbs_g'], macros['fat_g'], user_id, today]
         )
 
-    # Update vitamin targets if age or gender changed
-    if not current_profile or current_profile['age'] != data['age'] or current_profile['gender'] != data['gender']:
-        rdas = get_rda_targets(data['age'], data['gender'])
-        for nutrient, amount in rdas.items():
-            nutrient_display = nutrient.replace('_', ' ').title()
-            unit = 'mcg' if '_mcg' in nutrient else 'mg'
+        # Log the weight as today's weight only if it was changed - the form is
+        # pre-filled from the profile, which may be older than today's log
+        if not current_profile or current_profile['weight_kg'] != data['weight_kg']:
+            logged_today = conn.execute(
+                'SELECT 1 FROM weight_logs WHERE user_id = ? AND date = ?', [user_id, today]
+            ).fetchone()
+            # Keep the notes of a weight already logged today
+            notes = None if logged_today else 'Updated from profile'
+            record_weight(conn, user_id, today, data['weight_kg'], notes)
 
-            execute_db(
-                '''INSERT OR REPLACE INTO vitamin_targets
-                   (user_id, nutrient_name, target_amount, unit)
-                   VALUES (?, ?, ?, ?)''',
-                [user_id, nutrient_display, amount, unit]
-            )
+        # Update vitamin targets if age or gender changed
+        if not current_profile or current_profile['age'] != data['age'] or current_profile['gender'] != data['gender']:
+            save_vitamin_targets(conn, user_id, data['age'], data['gender'])
+
+        profile = conn.execute('SELECT * FROM user_profile WHERE user_id = ?', [user_id]).fetchone()
+        profile = dict(profile) if profile else None
 
-    profile = query_db('SELECT * FROM user_profile WHERE user_id = ?', [user_id], one=True)
     return jsonify(profile)
 
+def apply_profile_targets(conn, profile, start_date, end_date):
+    """
+    Set the targets of every daily log between two dates from a profile
+
+    One UPDATE for the whole range; rows that already have these targets
+    are left alone.
+
+    Returns:
+        Number of daily logs changed
+    """
+    calorie_goal = calculate_calorie_goal(profile['tdee'], profile['goal'])
+    targets = [calorie_goal, profile['protein_target_g'], profile['carbs_target_g'], profile['fat_target_g']]
+
+    cur = conn.execute(
+        '''UPDATE daily_logs
+           SET calorie_goal = ?,
+               protein_target_g = ?,
+               carbs_target_g = ?,
+               fat_target_g = ?
+           WHERE user_id = ? AND date BETWEEN ? AND ?
+             AND (calorie_goal IS NOT ? OR protein_target_g IS NOT ?
+                  OR carbs_target_g IS NOT ? OR fat_target_g IS NOT ?)''',
+        targets + [profile['user_id'], start_date, end_date] + targets
+    )
+    return cur.rowcount
+
 @bp.route('/update-day-targets/<date>', methods=['POST'])
 def update_day_targets(date):
     """Update a specific day's targets from current profile"""
@@ -218,29 +242,37 @@ def update_day_targets(date):
     if not profile:
         return jsonify({'error': 'Profile not found'}), 404
 
-    # Calculate calorie goal
-    calorie_goal = calculate_calorie_goal(profile['tdee'], profile['goal'])
-
-    # Update the daily log for this date
-    execute_db(
-        '''UPDATE daily_logs
-           SET calorie_goal = ?,
-               protein_target_g = ?,
-               carbs_target_g = ?,
-               fat_target_g = ?
-           WHERE user_id = ? AND date = ?''',
-        [
-            calorie_goal,
-            profile['protein_target_g'],
-            profile['carbs_target_g'],
-            profile['fat_target_g'],
-            user_id,
-            date
-        ]
-    )
+    with get_db() as conn:
+        apply_profile_targets(conn, profile, date, date)
 
     return jsonify({'message': 'Targets updated successfully', 'date': date})
 
+@bp.route('/apply-targets', methods=['POST'])
+def apply_targets():
+    """
+    Update the targets of every day in a range from current profile
+
+    Query params:
+        start, end: Dates of the range (inclusive)
+
+    Returns:
+        Number of daily logs whose targets changed
+    """
+    user_id = request.args.get('user_id', 1)
+    start_date = request.args.get('start')
+    end_date = request.args.get('end')
+
+    if not start_date or not end_date:
+        return jsonify({'error': 'start and end required'}), 400
+
+    with get_db() as conn:
+        profile = conn.execute('SELECT * FROM user_profile WHERE user_id = ?', [user_id]).fetchone()
+        if not profile:
+            return jsonify({'error': 'Profile not found'}), 404
+        updated = apply_profile_targets(conn, profile, start_date, end_date)
+
+    return jsonify({'updated': updated, 'start': start_date, 'end': end_date})
+
 @bp.route('/calculations', methods=['GET'])
 def get_calculations():
     """Get BMR, TDEE, and calorie goal calculations"""
@@ -264,3 +296,96 @@ def get_calculations():
         'goal': profile['goal'],
         'activity_level': profile['activity_level']
     })
+
+@bp.route('/projection', methods=['GET'])
+def get_projection():
+    """
+    Project weight day by day from a daily intake
+
+    TDEE is recomputed from each day's projected weight, so losses slow down
+    as weight drops.
+
+    Query params:
+        days: Days to project (default 182, max 365)
+        intake: Daily calories, or several comma separated to compare
+            scenarios (default: average logged over the last 28 days)
+        activity_level: Optional override of the profile's activity level
+
+    Returns:
+        dates, plus per scenario the intake, daily weight_kg and tdee, and
+        the targets a profile at the final weight would get
+    """
+    user_id = request.args.get('user_id', 1)
+    try:
+        days = max(1, min(int(request.args.get('days', 182)), MAX_PROJECTION_DAYS))
+    except ValueError:
+        return jsonify({'error': 'days must be an integer'}), 400
+
+    profile = query_db('SELECT * FROM user_profile WHERE user_id = ?', [user_id], one=True)
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+    activity_level = request.args.get('activity_level', profile['activity_level'])
+    if activity_level not in ACTIVITY_MULTIPLIERS:
+        return jsonify({'error': f"activity_level must be one of {', '.join(ACTIVITY_MULTIPLIERS)}"}), 400
+
+    today = date.today()
+    # Start from the smoothed trend where there is one - a single day's weight is noisy
+    trend = query_db(
+        'SELECT trend_kg FROM weight_trend WHERE user_id = ? ORDER BY date DESC LIMIT 1',
+        [user_id],
+        one=True
+    )
+    start_weight = trend['trend_kg'] if trend else profile['weight_kg']
+
+    logged = query_db(
+        '''SELECT AVG(total_calories) AS intake, COUNT(*) AS days FROM daily_logs
+           WHERE user_id = ? AND date BETWEEN ? AND ? AND total_calories > 0''',
+        [user_id, (today - timedelta(days=PROJECTION_INTAKE_DAYS)).isoformat(), today.isoformat()],
+        one=True
+    )
+
+    if request.args.get('intake'):
+        try:
+            intakes = [float(value) for value in request.args['intake'].split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'error': 'intake must be numbers'}), 400
+        if not intakes or not all(math.isfinite(intake) for intake in intakes):
+            return jsonify({'error': 'intake must be finite numbers'}), 400
+        intakes = intakes[:MAX_PROJECTION_SCENARIOS]
+    elif logged['intake']:
+        intakes = [logged['intake']]
+    else:
+        return jsonify({'error': 'No intake logged recently - pass intake'}), 400
+
+    weights = project_weight(
+        start_weight, intakes, days,
+        profile['height_cm'], profile['age'], profile['gender'], activity_level
+    )
+    tdee = calculate_tdee_array(
+        calculate_bmr_array(weights, profile['height_cm'], profile['age'], profile['gender']),
+        activity_level
+    )
+    final_goal = calculate_calorie_goal_array(tdee[:, -1], profile['goal'])
+    final_macros = calculate_macro_targets_array(final_goal, weights[:, -1], profile['goal'])
+
+    scenarios = []
+    for i, intake in enumerate(intakes):
+        scenarios.append({
+            'intake': round(intake),
+            'weight_kg': weights[i].round(2).tolist(),
+            'tdee': tdee[i].round().tolist(),
+            'final_targets': {
+                'calorie_goal': round(float(final_goal[i])),
+                'protein_g': float(final_macros['protein_g'][i]),
+                'carbs_g': float(final_macros['carbs_g'][i]),
+                'fat_g': float(final_macros['fat_g'][i])
+            }
+        })
+
+    return jsonify({
+        'start_weight_kg': round(start_weight, 2),
+        'logged_intake': round(logged['intake']) if logged['intake'] else None,
+        'logged_days': logged['days'],
+        'dates': [(today + timedelta(days=day)).isoformat() for day in range(days + 1)],
+        'scenarios': scenarios
+    })
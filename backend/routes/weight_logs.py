@@ -1,61 +1,118 @@
 from flask import Blueprint, request, jsonify
-from database import query_db, execute_db
+from database import query_db, get_db
 from datetime import datetime
+from services.weight_trend import record_weight, refresh_trend, get_trend, DEFAULT_CHART_POINTS, MAX_CHART_POINTS
 
 bp = Blueprint('weight_logs', __name__, url_prefix='/api/weight-logs')
 
 @bp.route('', methods=['GET'])
 def get_weight_logs():
-    """Get all weight logs for a user"""
+    """
+    Get weight logs for a user, oldest first
+
+    Query params:
+        start_date, end_date: Optional range
+        limit: Only the most recent logs (charts should use /trend instead
+            of loading the whole history)
+    """
     user_id = request.args.get('user_id', 1)
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    try:
+        limit = int(request.args['limit']) if request.args.get('limit') else -1
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
 
     if start_date and end_date:
         logs = query_db(
             '''SELECT * FROM weight_logs
                WHERE user_id = ? AND date BETWEEN ? AND ?
-               ORDER BY date ASC''',
-            [user_id, start_date, end_date]
+               ORDER BY date DESC
+               LIMIT ?''',
+            [user_id, start_date, end_date, limit]
         )
     else:
         logs = query_db(
-            'SELECT * FROM weight_logs WHERE user_id = ? ORDER BY date ASC',
-            [user_id]
+            'SELECT * FROM weight_logs WHERE user_id = ? ORDER BY date DESC LIMIT ?',
+            [user_id, limit]
         )
 
+    # Newest first picks the most recent logs for limit - return them oldest first
+    logs.reverse()
     return jsonify(logs)
 
 @bp.route('', methods=['POST'])
 def create_weight_log():
-    """Create or update a weight log entry"""
+    """
+    Create or update the weight log for a day
+
+    Optional recorded_at (timestamp) also keeps this weigh-in in the day's
+    readings, for days weighed more than once.
+    """
     data = request.json
     user_id = data.get('user_id', 1)
     date = data.get('date', datetime.now().strftime('%Y-%m-%d'))
     weight_kg = data['weight_kg']
-    notes = data.get('notes', '')
+    notes = data.get('notes')
 
-    # Use INSERT OR REPLACE to handle updates
-    execute_db(
-        '''INSERT OR REPLACE INTO weight_logs (user_id, date, weight_kg, notes)
-           VALUES (?, ?, ?, ?)''',
-        [user_id, date, weight_kg, notes]
-    )
-
-    log = query_db(
-        'SELECT * FROM weight_logs WHERE user_id = ? AND date = ?',
-        [user_id, date],
-        one=True
-    )
+    with get_db() as conn:
+        log = record_weight(conn, user_id, date, weight_kg, notes, data.get('recorded_at'))
+        log = dict(log)
 
     return jsonify(log), 201
 
 @bp.route('/<int:log_id>', methods=['DELETE'])
 def delete_weight_log(log_id):
-    """Delete a weight log entry"""
-    execute_db('DELETE FROM weight_logs WHERE id = ?', [log_id])
+    """Delete a weight log entry, with that day's readings"""
+    with get_db() as conn:
+        log = conn.execute('SELECT user_id, date FROM weight_logs WHERE id = ?', [log_id]).fetchone()
+        conn.execute('DELETE FROM weight_logs WHERE id = ?', [log_id])
+        if log:
+            conn.execute(
+                'DELETE FROM weight_readings WHERE user_id = ? AND date = ?',
+                [log['user_id'], log['date']]
+            )
+            refresh_trend(conn, log['user_id'], log['date'])
     return jsonify({'message': 'Weight log deleted'}), 200
 
+@bp.route('/readings', methods=['GET'])
+def get_weight_readings():
+    """Get the individual weigh-ins recorded on a day"""
+    user_id = request.args.get('user_id', 1)
+    date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+
+    readings = query_db(
+        '''SELECT * FROM weight_readings
+           WHERE user_id = ? AND date = ?
+           ORDER BY recorded_at''',
+        [user_id, date]
+    )
+
+    return jsonify(readings)
+
+@bp.route('/trend', methods=['GET'])
+def get_weight_trend():
+    """
+    Smoothed weight trend for charts, one point per logged day
+
+    Query params:
+        start_date, end_date: Optional range
+        points: Maximum points returned (default 200) - longer ranges are
+            downsampled with LTTB
+    """
+    user_id = request.args.get('user_id', 1)
+    try:
+        max_points = max(3, min(int(request.args.get('points') or DEFAULT_CHART_POINTS), MAX_CHART_POINTS))
+    except ValueError:
+        return jsonify({'error': 'points must be an integer'}), 400
+
+    with get_db() as conn:
+        trend = get_trend(
+            conn, user_id, request.args.get('start_date'), request.args.get('end_date'), max_points
+        )
+
+    return jsonify(trend)
+
 @bp.route('/latest', methods=['GET'])
 def get_latest_weight():
     """Get the most recent weight entry"""
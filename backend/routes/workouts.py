@@ -1,5 +1,13 @@
 from flask import Blueprint, request, jsonify
-from database import query_db, execute_db
+import time
+from database import query_db, execute_db, get_db
+from services import metrics, exercise_suggest
+from services.workout_analytics import compute_analytics, ANALYTICS_LATENCY_BUDGET_MS
+from services.workout_service import (
+    load_sessions, add_exercise, resolve_exercise_key, get_exercise_owner, replace_exercise_sets,
+    save_session_document, get_session_owners, add_set_to_records, remove_set_from_records, recompute_records,
+    refresh_session_totals, refresh_exercise_session_totals
+)
 
 bp = Blueprint('workouts', __name__, url_prefix='/api/workouts')
 
@@ -46,30 +54,84 @@ def update_session(session_id):
 
 @bp.route('/sessions/<int:session_id>', methods=['DELETE'])
 def delete_session(session_id):
-    """Delete a workout session (cascades to exercises and sets)"""
-    execute_db('DELETE FROM workout_sessions WHERE id = ?', [session_id])
+    """Delete a workout session with its exercises and sets"""
+    with get_db() as conn:
+        owners = conn.execute(
+            '''SELECT DISTINCT user_id, exercise_key FROM workout_exercises
+               WHERE workout_session_id = ? AND user_id IS NOT NULL AND exercise_key IS NOT NULL''',
+            [session_id]
+        ).fetchall()
+
+        # Foreign keys aren't enforced, so delete children explicitly
+        conn.execute(
+            '''DELETE FROM workout_sets WHERE workout_exercise_id IN
+               (SELECT id FROM workout_exercises WHERE workout_session_id = ?)''',
+            [session_id]
+        )
+        conn.execute('DELETE FROM workout_exercises WHERE workout_session_id = ?', [session_id])
+        conn.execute('DELETE FROM workout_session_totals WHERE workout_session_id = ?', [session_id])
+        conn.execute('DELETE FROM workout_sessions WHERE id = ?', [session_id])
+
+        for owner in owners:
+            recompute_records(conn, owner['user_id'], owner['exercise_key'])
+
+    exercise_suggest.invalidate({owner['user_id'] for owner in owners})
     return jsonify({'message': 'Session deleted successfully'}), 200
 
+@bp.route('/sessions/<int:session_id>/document', methods=['PUT'])
+def save_session(session_id):
+    """
+    Save a whole session (exercises and their sets) in one request
+
+    Safe to retry - new exercises should carry a client_id so a repeated
+    request updates them instead of adding them again.
+    """
+    data = request.json
+
+    try:
+        with get_db() as conn:
+            if not conn.execute('SELECT 1 FROM workout_sessions WHERE id = ?', [session_id]).fetchone():
+                return jsonify({'error': 'Session not found'}), 404
+            users = {user_id for user_id, _ in get_session_owners(conn, session_id)}
+            save_session_document(conn, session_id, data)
+            users |= {user_id for user_id, _ in get_session_owners(conn, session_id)}
+            session = load_sessions(conn, 'id = ?', [session_id])[0]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    exercise_suggest.invalidate(users)
+
+    return jsonify(session)
+
+@bp.route('/sessions/<int:session_id>/order', methods=['PUT'])
+def reorder_exercises(session_id):
+    """Set the order of a session's exercises from a list of exercise ids"""
+    exercise_ids = request.json.get('exercise_ids', [])
+
+    with get_db() as conn:
+        conn.executemany(
+            'UPDATE workout_exercises SET order_index = ? WHERE id = ? AND workout_session_id = ?',
+            [(order_index, exercise_id, session_id) for order_index, exercise_id in enumerate(exercise_ids)]
+        )
+        sessions = load_sessions(conn, 'id = ?', [session_id])
+
+    if not sessions:
+        return jsonify({'error': 'Session not found'}), 404
+
+    return jsonify(sessions[0])
+
 # Workout Exercises
 @bp.route('/exercises', methods=['POST'])
 def create_exercise():
     """Add an exercise to a workout session"""
     data = request.json
 
-    exercise_id = execute_db(
-        '''INSERT INTO workout_exercises
-           (workout_session_id, exercise_name, exercise_category, order_index, notes)
-           VALUES (?, ?, ?, ?, ?)''',
-        [
-            data['workout_session_id'],
-            data['exercise_name'],
-            data.get('exercise_category', ''),
-            data.get('order_index', 0),
-            data.get('notes', '')
-        ]
-    )
+    with get_db() as conn:
+        exercise_id = add_exercise(conn, data['workout_session_id'], data)
+        refresh_session_totals(conn, data['workout_session_id'])
 
     exercise = query_db('SELECT * FROM workout_exercises WHERE id = ?', [exercise_id], one=True)
+    exercise_suggest.note_exercise(exercise)
     return jsonify(exercise), 201
 
 @bp.route('/exercises/<int:session_id>', methods=['GET'])
@@ -85,34 +147,80 @@ def get_exercises(session_id):
 
 @bp.route('/exercises/<int:exercise_id>', methods=['DELETE'])
 def delete_exercise(exercise_id):
-    """Delete an exercise (cascades to sets)"""
-    execute_db('DELETE FROM workout_exercises WHERE id = ?', [exercise_id])
+    """Delete an exercise and its sets"""
+    with get_db() as conn:
+        owner = get_exercise_owner(conn, exercise_id)
+        session = conn.execute(
+            'SELECT workout_session_id FROM workout_exercises WHERE id = ?', [exercise_id]
+        ).fetchone()
+
+        conn.execute('DELETE FROM workout_sets WHERE workout_exercise_id = ?', [exercise_id])
+        conn.execute('DELETE FROM workout_exercises WHERE id = ?', [exercise_id])
+        if owner:
+            recompute_records(conn, *owner)
+        if session:
+            refresh_session_totals(conn, session['workout_session_id'])
+
+    if owner:
+        exercise_suggest.invalidate([owner[0]])
     return jsonify({'message': 'Exercise deleted successfully'}), 200
 
 # Workout Sets
 @bp.route('/sets', methods=['POST'])
 def create_set():
-    """Log a set for an exercise"""
+    """Log a set for an exercise (numbered after the exercise's last set)"""
     data = request.json
 
-    set_id = execute_db(
-        '''INSERT INTO workout_sets
-           (workout_exercise_id, set_number, reps, weight_kg, rpe, completed, notes)
-           VALUES (?, ?, ?, ?, ?, ?, ?)''',
-        [
-            data['workout_exercise_id'],
-            data['set_number'],
-            data['reps'],
-            data.get('weight_kg'),
-            data.get('rpe'),
-            data.get('completed', True),
-            data.get('notes', '')
-        ]
-    )
+    with get_db() as conn:
+        set_id = conn.execute(
+            '''INSERT INTO workout_sets
+               (workout_exercise_id, set_number, reps, weight_kg, rpe, completed, notes)
+               VALUES (?, (SELECT COALESCE(MAX(set_number), 0) + 1 FROM workout_sets
+                           WHERE workout_exercise_id = ?), ?, ?, ?, ?, ?)''',
+            [
+                data['workout_exercise_id'],
+                data['workout_exercise_id'],
+                data['reps'],
+                data.get('weight_kg'),
+                data.get('rpe'),
+                data.get('completed', True),
+                data.get('notes', '')
+            ]
+        ).lastrowid
+        add_set_to_records(conn, data['workout_exercise_id'], data.get('weight_kg'), data['reps'])
+        refresh_exercise_session_totals(conn, data['workout_exercise_id'])
 
     set_data = query_db('SELECT * FROM workout_sets WHERE id = ?', [set_id], one=True)
     return jsonify(set_data), 201
 
+@bp.route('/exercises/<int:exercise_id>/sets', methods=['PUT'])
+def save_exercise_sets(exercise_id):
+    """
+    Replace all sets of an exercise in one request (matched by id, then by
+    set_number, so it's safe to retry)
+    """
+    sets = request.json.get('sets', [])
+
+    try:
+        with get_db() as conn:
+            if not conn.execute('SELECT 1 FROM workout_exercises WHERE id = ?', [exercise_id]).fetchone():
+                return jsonify({'error': 'Exercise not found'}), 404
+
+            replace_exercise_sets(conn, exercise_id, sets)
+            owner = get_exercise_owner(conn, exercise_id)
+            if owner:
+                recompute_records(conn, *owner)
+            refresh_exercise_session_totals(conn, exercise_id)
+
+            saved = [dict(row) for row in conn.execute(
+                'SELECT * FROM workout_sets WHERE workout_exercise_id = ? ORDER BY set_number',
+                [exercise_id]
+            )]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(saved)
+
 @bp.route('/sets/<int:exercise_id>', methods=['GET'])
 def get_sets(exercise_id):
     """Get all sets for an exercise"""
@@ -129,19 +237,30 @@ def update_set(set_id):
     """Update a set (edit reps/weight/completion)"""
     data = request.json
 
-    execute_db(
-        '''UPDATE workout_sets
-           SET reps = ?, weight_kg = ?, rpe = ?, completed = ?, notes = ?
-           WHERE id = ?''',
-        [
-            data['reps'],
-            data.get('weight_kg'),
-            data.get('rpe'),
-            data.get('completed', True),
-            data.get('notes', ''),
-            set_id
-        ]
-    )
+    with get_db() as conn:
+        old = conn.execute('SELECT * FROM workout_sets WHERE id = ?', [set_id]).fetchone()
+
+        conn.execute(
+            '''UPDATE workout_sets
+               SET reps = ?, weight_kg = ?, rpe = ?, completed = ?, notes = ?
+               WHERE id = ?''',
+            [
+                data['reps'],
+                data.get('weight_kg'),
+                data.get('rpe'),
+                data.get('completed', True),
+                data.get('notes', ''),
+                set_id
+            ]
+        )
+
+        if old and not remove_set_from_records(
+                conn, old['workout_exercise_id'], old['weight_kg'], old['reps'], deleted=False):
+            add_set_to_records(
+                conn, old['workout_exercise_id'], data.get('weight_kg'), data['reps'], new_set=False
+            )
+        if old:
+            refresh_exercise_session_totals(conn, old['workout_exercise_id'])
 
     set_data = query_db('SELECT * FROM workout_sets WHERE id = ?', [set_id], one=True)
     return jsonify(set_data)
@@ -149,7 +268,13 @@ def update_set(set_id):
 @bp.route('/sets/<int:set_id>', methods=['DELETE'])
 def delete_set(set_id):
     """Delete a set"""
-    execute_db('DELETE FROM workout_sets WHERE id = ?', [set_id])
+    with get_db() as conn:
+        old = conn.execute('SELECT * FROM workout_sets WHERE id = ?', [set_id]).fetchone()
+        conn.execute('DELETE FROM workout_sets WHERE id = ?', [set_id])
+        if old:
+            remove_set_from_records(conn, old['workout_exercise_id'], old['weight_kg'], old['reps'])
+            refresh_exercise_session_totals(conn, old['workout_exercise_id'])
+
     return jsonify({'message': 'Set deleted successfully'}), 200
 
 # History & Analytics
@@ -159,24 +284,24 @@ def get_exercise_history(exercise_name):
     user_id = request.args.get('user_id', 1)
     limit = int(request.args.get('limit', 10))
 
-    history = query_db(
-        '''SELECT
-               we.exercise_name,
-               we.created_at,
-               ws.set_number,
-               ws.reps,
-               ws.weight_kg,
-               ws.rpe,
-               dl.date
-           FROM workout_sets ws
-           JOIN workout_exercises we ON ws.workout_exercise_id = we.id
-           JOIN workout_sessions wses ON we.workout_session_id = wses.id
-           JOIN daily_logs dl ON wses.daily_log_id = dl.id
-           WHERE LOWER(we.exercise_name) = LOWER(?) AND dl.user_id = ?
-           ORDER BY we.created_at DESC
-           LIMIT ?''',
-        [exercise_name, user_id, limit * 10]
-    )
+    with get_db() as conn:
+        exercise_key = resolve_exercise_key(conn, exercise_name)
+        history = [dict(row) for row in conn.execute(
+            '''SELECT
+                   we.exercise_name,
+                   we.created_at,
+                   ws.set_number,
+                   ws.reps,
+                   ws.weight_kg,
+                   ws.rpe,
+                   we.log_date as date
+               FROM workout_exercises we
+               JOIN workout_sets ws ON ws.workout_exercise_id = we.id
+               WHERE we.user_id = ? AND we.exercise_key = ?
+               ORDER BY we.log_date DESC, we.created_at DESC
+               LIMIT ?''',
+            [user_id, exercise_key, limit * 10]
+        )]
 
     return jsonify(history)
 
@@ -185,23 +310,41 @@ def get_exercise_stats(exercise_name):
     """Get PRs and stats for an exercise"""
     user_id = request.args.get('user_id', 1)
 
-    stats = query_db(
-        '''SELECT
-               MAX(ws.weight_kg) as max_weight,
-               MAX(ws.reps) as max_reps,
-               MAX(ws.weight_kg * ws.reps) as max_volume,
-               COUNT(DISTINCT we.id) as total_sessions,
-               SUM(ws.reps * ws.weight_kg) as total_volume
-           FROM workout_sets ws
-           JOIN workout_exercises we ON ws.workout_exercise_id = we.id
-           JOIN workout_sessions wses ON we.workout_session_id = wses.id
-           JOIN daily_logs dl ON wses.daily_log_id = dl.id
-           WHERE LOWER(we.exercise_name) = LOWER(?) AND dl.user_id = ?''',
-        [exercise_name, user_id],
-        one=True
-    )
-
-    return jsonify(stats)
+    with get_db() as conn:
+        exercise_key = resolve_exercise_key(conn, exercise_name)
+        record = conn.execute(
+            'SELECT * FROM exercise_records WHERE user_id = ? AND exercise_key = ?',
+            [user_id, exercise_key]
+        ).fetchone()
+        rep_records = conn.execute(
+            '''SELECT weight_kg, best_reps AS reps FROM exercise_rep_records
+               WHERE user_id = ? AND exercise_key = ?
+               ORDER BY weight_kg''',
+            [user_id, exercise_key]
+        ).fetchall()
+
+    if not record:
+        return jsonify({
+            'max_weight': None,
+            'max_reps': None,
+            'max_volume': None,
+            'estimated_1rm': None,
+            'total_sessions': 0,
+            'total_sets': 0,
+            'total_volume': None,
+            'rep_records': []
+        })
+
+    return jsonify({
+        'max_weight': record['best_weight_kg'],
+        'max_reps': record['best_reps'],
+        'max_volume': record['best_volume'],
+        'estimated_1rm': round(record['best_e1rm_kg'], 1) if record['best_e1rm_kg'] else None,
+        'total_sessions': record['total_sessions'],
+        'total_sets': record['total_sets'],
+        'total_volume': record['total_volume'],
+        'rep_records': [dict(row) for row in rep_records]
+    })
 
 @bp.route('/recent-exercises', methods=['GET'])
 def get_recent_exercises():
@@ -214,11 +357,9 @@ def get_recent_exercises():
                exercise_name,
                exercise_category,
                MAX(created_at) as last_used
-           FROM workout_exercises we
-           JOIN workout_sessions ws ON we.workout_session_id = ws.id
-           JOIN daily_logs dl ON ws.daily_log_id = dl.id
-           WHERE dl.user_id = ?
-           GROUP BY LOWER(exercise_name)
+           FROM workout_exercises
+           WHERE user_id = ?
+           GROUP BY exercise_key
            ORDER BY last_used DESC
            LIMIT ?''',
         [user_id, limit]
@@ -226,32 +367,80 @@ def get_recent_exercises():
 
     return jsonify(exercises)
 
+@bp.route('/exercise-suggest', methods=['GET'])
+def get_exercise_suggestions():
+    """
+    Autocomplete exercise names from the user's history, most used and most
+    recent first (served from memory after the first request)
+
+    Query params:
+        q: What the user has typed so far (empty returns their top exercises)
+        limit: Maximum suggestions (default 10)
+    """
+    try:
+        user_id = int(request.args.get('user_id', 1))
+        limit = max(1, min(int(request.args.get('limit', 10)), 50))
+    except ValueError:
+        return jsonify({'error': 'user_id and limit must be integers'}), 400
+
+    with metrics.timer('workouts.suggest.latency_ms'):
+        suggestions = exercise_suggest.suggest(user_id, request.args.get('q', ''), limit)
+
+    return jsonify(suggestions)
+
+@bp.route('/analytics', methods=['GET'])
+def get_analytics():
+    """
+    Training-load analytics: weekly volume per category, intensity,
+    acute:chronic workload ratio and e1RM progression
+
+    Query params:
+        days: Window length in days (default 365)
+        exercises: Comma-separated exercise names for e1RM curves (default: most trained)
+    """
+    user_id = request.args.get('user_id', 1)
+    days = max(7, min(int(request.args.get('days', 365)), 3650))
+    names = [name for name in request.args.get('exercises', '').split(',') if name.strip()]
+
+    start = time.perf_counter()
+    with get_db() as conn:
+        exercise_keys = [resolve_exercise_key(conn, name) for name in names]
+        analytics = compute_analytics(conn, user_id, days, exercise_keys)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    metrics.observe('workouts.analytics.latency_ms', elapsed_ms)
+    if elapsed_ms > ANALYTICS_LATENCY_BUDGET_MS:
+        print(f"Workout analytics took {elapsed_ms:.0f} ms for {analytics['set_count']} sets")
+
+    return jsonify(analytics)
+
 @bp.route('/session-details/<int:session_id>', methods=['GET'])
 def get_session_details(session_id):
     """Get complete session with all exercises and sets"""
-    session = query_db('SELECT * FROM workout_sessions WHERE id = ?', [session_id], one=True)
+    with get_db() as conn:
+        sessions = load_sessions(conn, 'id = ?', [session_id])
 
-    if not session:
+    if not sessions:
         return jsonify({'error': 'Session not found'}), 404
 
-    exercises = query_db(
-        '''SELECT * FROM workout_exercises
-           WHERE workout_session_id = ?
-           ORDER BY order_index, created_at''',
-        [session_id]
-    )
-
-    # Get sets for each exercise
-    for exercise in exercises:
-        exercise['sets'] = query_db(
-            '''SELECT * FROM workout_sets
-               WHERE workout_exercise_id = ?
-               ORDER BY set_number''',
-            [exercise['id']]
-        )
-
-    session['exercises'] = exercises
-    return jsonify(session)
+    return jsonify(sessions[0])
+
+# Per-session totals come from workout_session_totals (kept up to date on
+# every write), so days aren't joined against every exercise and set
+DAILY_SUMMARY_SQL = '''
+    SELECT
+        dl.date,
+        COUNT(*) as workout_count,
+        COALESCE(SUM(t.exercise_count), 0) as total_exercises,
+        COALESCE(SUM(t.set_count), 0) as total_sets,
+        COALESCE(SUM(t.volume), 0) as total_volume,
+        GROUP_CONCAT(DISTINCT COALESCE(ws.name, 'Workout')) as workout_names
+    FROM daily_logs dl
+    JOIN workout_sessions ws ON ws.daily_log_id = dl.id
+    LEFT JOIN workout_session_totals t ON t.workout_session_id = ws.id
+    WHERE dl.user_id = ? AND dl.date BETWEEN ? AND ?
+    GROUP BY dl.date
+    ORDER BY dl.date'''
 
 @bp.route('/daily-summary', methods=['GET'])
 def get_daily_summary():
@@ -263,24 +452,7 @@ def get_daily_summary():
     if not start_date or not end_date:
         return jsonify({'error': 'start_date and end_date required'}), 400
 
-    summaries = query_db(
-        '''SELECT
-               dl.date,
-               COUNT(DISTINCT ws.id) as workout_count,
-               COUNT(DISTINCT we.id) as total_exercises,
-               COUNT(ws_sets.id) as total_sets,
-               COALESCE(SUM(ws_sets.reps * ws_sets.weight_kg), 0) as total_volume,
-               GROUP_CONCAT(DISTINCT COALESCE(ws.name, 'Workout')) as workout_names
-           FROM daily_logs dl
-           LEFT JOIN workout_sessions ws ON dl.id = ws.daily_log_id
-           LEFT JOIN workout_exercises we ON ws.id = we.workout_session_id
-           LEFT JOIN workout_sets ws_sets ON we.id = ws_sets.workout_exercise_id
-           WHERE dl.user_id = ? AND dl.date BETWEEN ? AND ?
-           GROUP BY dl.date
-           HAVING workout_count > 0
-           ORDER BY dl.date''',
-        [user_id, start_date, end_date]
-    )
+    summaries = query_db(DAILY_SUMMARY_SQL, [user_id, start_date, end_date])
 
     return jsonify(summaries)
 
@@ -289,41 +461,11 @@ def get_workouts_by_date(date):
     """Get all workouts for a specific date with full details"""
     user_id = request.args.get('user_id', 1)
 
-    # Get daily log for this date
-    daily_log = query_db(
-        'SELECT id FROM daily_logs WHERE date = ? AND user_id = ?',
-        [date, user_id],
-        one=True
-    )
-
-    if not daily_log:
-        return jsonify([])
-
-    # Get all sessions for this date
-    sessions = query_db(
-        '''SELECT * FROM workout_sessions
-           WHERE daily_log_id = ?
-           ORDER BY started_at DESC''',
-        [daily_log['id']]
-    )
-
-    # Get full details for each session
-    for session in sessions:
-        exercises = query_db(
-            '''SELECT * FROM workout_exercises
-               WHERE workout_session_id = ?
-               ORDER BY order_index, created_at''',
-            [session['id']]
+    with get_db() as conn:
+        sessions = load_sessions(
+            conn,
+            'daily_log_id IN (SELECT id FROM daily_logs WHERE date = ? AND user_id = ?)',
+            [date, user_id]
         )
 
-        for exercise in exercises:
-            exercise['sets'] = query_db(
-                '''SELECT * FROM workout_sets
-                   WHERE workout_exercise_id = ?
-                   ORDER BY set_number''',
-                [exercise['id']]
-            )
-
-        session['exercises'] = exercises
-
     return jsonify(sessions)
@@ -41,6 +41,149 @@ CREATE TABLE IF NOT EXISTS food_entries (
     FOREIGN KEY (daily_log_id) REFERENCES daily_logs (id) ON DELETE CASCADE
 );
 
+-- Distinct foods each user has logged (food_key = lowercased name) with the
+-- nutrition they were last logged with, kept up to date from food_entries by
+-- the triggers below
+CREATE TABLE IF NOT EXISTS user_foods (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    food_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    serving_size TEXT,
+    calories REAL,
+    protein_g REAL,
+    carbs_g REAL,
+    fat_g REAL,
+    fiber_g REAL,
+    sugar_g REAL,
+    uses INTEGER NOT NULL DEFAULT 0,
+    last_used TIMESTAMP,
+    last_entry_id INTEGER,
+    UNIQUE(user_id, food_key)
+);
+
+-- Full-text index over food names and serving sizes (contents stay in user_foods)
+CREATE VIRTUAL TABLE IF NOT EXISTS food_search USING fts5(
+    name,
+    serving_size,
+    content='user_foods',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS user_foods_search_insert AFTER INSERT ON user_foods BEGIN
+    INSERT INTO food_search (rowid, name, serving_size) VALUES (new.id, new.name, new.serving_size);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_foods_search_delete AFTER DELETE ON user_foods BEGIN
+    INSERT INTO food_search (food_search, rowid, name, serving_size)
+    VALUES ('delete', old.id, old.name, old.serving_size);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_foods_search_update AFTER UPDATE OF name, serving_size ON user_foods BEGIN
+    INSERT INTO food_search (food_search, rowid, name, serving_size)
+    VALUES ('delete', old.id, old.name, old.serving_size);
+    INSERT INTO food_search (rowid, name, serving_size) VALUES (new.id, new.name, new.serving_size);
+END;
+
+-- Count a logged food. The newest entry (highest id) supplies the name,
+-- serving size, nutrition and last_used; when it's removed the next newest
+-- takes over. To change a trigger's body, drop it in a migration in
+-- database.py so this file recreates it.
+CREATE TRIGGER IF NOT EXISTS food_entries_foods_insert AFTER INSERT ON food_entries
+WHEN EXISTS (SELECT 1 FROM daily_logs WHERE id = new.daily_log_id) BEGIN
+    INSERT INTO user_foods
+        (user_id, food_key, name, serving_size, calories, protein_g, carbs_g, fat_g, fiber_g, sugar_g, uses, last_used, last_entry_id)
+    VALUES (
+        (SELECT user_id FROM daily_logs WHERE id = new.daily_log_id),
+        LOWER(TRIM(new.name)), TRIM(new.name), new.serving_size,
+        new.calories, new.protein_g, new.carbs_g, new.fat_g, new.fiber_g, new.sugar_g,
+        1, new.created_at, new.id
+    )
+    ON CONFLICT (user_id, food_key) DO UPDATE SET
+        uses = uses + 1,
+        name = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.name ELSE name END,
+        serving_size = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.serving_size ELSE serving_size END,
+        calories = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.calories ELSE calories END,
+        protein_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.protein_g ELSE protein_g END,
+        carbs_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.carbs_g ELSE carbs_g END,
+        fat_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.fat_g ELSE fat_g END,
+        fiber_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.fiber_g ELSE fiber_g END,
+        sugar_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.sugar_g ELSE sugar_g END,
+        last_used = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.last_used ELSE last_used END,
+        last_entry_id = MAX(last_entry_id, excluded.last_entry_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS food_entries_foods_delete AFTER DELETE ON food_entries BEGIN
+    UPDATE user_foods SET uses = uses - 1
+    WHERE user_id = (SELECT user_id FROM daily_logs WHERE id = old.daily_log_id)
+      AND food_key = LOWER(TRIM(old.name));
+
+    DELETE FROM user_foods
+    WHERE user_id = (SELECT user_id FROM daily_logs WHERE id = old.daily_log_id)
+      AND food_key = LOWER(TRIM(old.name))
+      AND uses <= 0;
+
+    UPDATE user_foods SET (last_entry_id, name, serving_size, calories, protein_g, carbs_g, fat_g, fiber_g, sugar_g, last_used) = (
+        SELECT fe.id, TRIM(fe.name), fe.serving_size, fe.calories, fe.protein_g, fe.carbs_g, fe.fat_g, fe.fiber_g, fe.sugar_g, fe.created_at
+        FROM food_entries fe
+        JOIN daily_logs dl ON dl.id = fe.daily_log_id
+        WHERE LOWER(TRIM(fe.name)) = user_foods.food_key AND dl.user_id = user_foods.user_id
+        ORDER BY fe.id DESC
+        LIMIT 1
+    )
+    WHERE user_id = (SELECT user_id FROM daily_logs WHERE id = old.daily_log_id)
+      AND food_key = LOWER(TRIM(old.name))
+      AND last_entry_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS food_entries_foods_update
+AFTER UPDATE OF name, serving_size, calories, protein_g, carbs_g, fat_g, fiber_g, sugar_g ON food_entries
+WHEN EXISTS (SELECT 1 FROM daily_logs WHERE id = new.daily_log_id) BEGIN
+    UPDATE user_foods SET uses = uses - 1
+    WHERE user_id = (SELECT user_id FROM daily_logs WHERE id = old.daily_log_id)
+      AND food_key = LOWER(TRIM(old.name));
+
+    DELETE FROM user_foods
+    WHERE user_id = (SELECT user_id FROM daily_logs WHERE id = old.daily_log_id)
+      AND food_key = LOWER(TRIM(old.name))
+      AND uses <= 0;
+
+    UPDATE user_foods SET (last_entry_id, name, serving_size, calories, protein_g, carbs_g, fat_g, fiber_g, sugar_g, last_used) = (
+        SELECT fe.id, TRIM(fe.name), fe.serving_size, fe.calories, fe.protein_g, fe.carbs_g, fe.fat_g, fe.fiber_g, fe.sugar_g, fe.created_at
+        FROM food_entries fe
+        JOIN daily_logs dl ON dl.id = fe.daily_log_id
+        WHERE LOWER(TRIM(fe.name)) = user_foods.food_key AND dl.user_id = user_foods.user_id
+        ORDER BY fe.id DESC
+        LIMIT 1
+    )
+    WHERE user_id = (SELECT user_id FROM daily_logs WHERE id = old.daily_log_id)
+      AND food_key = LOWER(TRIM(old.name))
+      AND last_entry_id = old.id;
+
+    INSERT INTO user_foods
+        (user_id, food_key, name, serving_size, calories, protein_g, carbs_g, fat_g, fiber_g, sugar_g, uses, last_used, last_entry_id)
+    VALUES (
+        (SELECT user_id FROM daily_logs WHERE id = new.daily_log_id),
+        LOWER(TRIM(new.name)), TRIM(new.name), new.serving_size,
+        new.calories, new.protein_g, new.carbs_g, new.fat_g, new.fiber_g, new.sugar_g,
+        1, new.created_at, new.id
+    )
+    ON CONFLICT (user_id, food_key) DO UPDATE SET
+        uses = uses + 1,
+        name = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.name ELSE name END,
+        serving_size = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.serving_size ELSE serving_size END,
+        calories = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.calories ELSE calories END,
+        protein_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.protein_g ELSE protein_g END,
+        carbs_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.carbs_g ELSE carbs_g END,
+        fat_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.fat_g ELSE fat_g END,
+        fiber_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.fiber_g ELSE fiber_g END,
+        sugar_g = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.sugar_g ELSE sugar_g END,
+        last_used = CASE WHEN excluded.last_entry_id > last_entry_id THEN excluded.last_used ELSE last_used END,
+        last_entry_id = MAX(last_entry_id, excluded.last_entry_id);
+END;
+
 -- Micronutrients table
 CREATE TABLE IF NOT EXISTS micronutrients (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -83,10 +226,28 @@ CREATE TABLE IF NOT EXISTS saved_images (
     image_group_id TEXT,
     is_primary BOOLEAN DEFAULT 1,
     analysis_result TEXT,
+    processing_status TEXT DEFAULT 'ready' CHECK(processing_status IN ('pending', 'ready', 'failed')),
+    content_hash TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users (id)
 );
 
+-- Content-addressed image files, shared by saved images with identical content
+CREATE TABLE IF NOT EXISTS image_blobs (
+    content_hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- AI analysis results keyed by the content hashes of the analyzed images
+CREATE TABLE IF NOT EXISTS ai_analysis_cache (
+    cache_key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- User profile table
 CREATE TABLE IF NOT EXISTS user_profile (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -147,6 +308,28 @@ CREATE TABLE IF NOT EXISTS weight_logs (
     FOREIGN KEY (user_id) REFERENCES users (id)
 );
 
+-- Individual weigh-ins, for days weighed more than once (weight_logs keeps
+-- one row per day)
+CREATE TABLE IF NOT EXISTS weight_readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    weight_kg REAL NOT NULL,
+    notes TEXT,
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+
+-- Smoothed weight per logged day (EWMA of the daily weights), kept up to
+-- date by services/weight_trend.py as weight logs change
+CREATE TABLE IF NOT EXISTS weight_trend (
+    user_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    weight_kg REAL NOT NULL,
+    trend_kg REAL NOT NULL,
+    PRIMARY KEY (user_id, date)
+) WITHOUT ROWID;
+
 -- Exercises table
 CREATE TABLE IF NOT EXISTS exercises (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -178,6 +361,10 @@ CREATE TABLE IF NOT EXISTS workout_exercises (
     order_index INTEGER DEFAULT 0,
     notes TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    exercise_key TEXT,  -- Canonical name (see exercise_catalog)
+    user_id INTEGER,  -- Copied from the session's daily log for indexed history lookups
+    log_date DATE,
+    client_id TEXT,  -- Client-generated key that makes bulk saves safe to retry
     FOREIGN KEY (workout_session_id) REFERENCES workout_sessions (id) ON DELETE CASCADE
 );
 
@@ -195,15 +382,154 @@ CREATE TABLE IF NOT EXISTS workout_sets (
     FOREIGN KEY (workout_exercise_id) REFERENCES workout_exercises (id) ON DELETE CASCADE
 );
 
+-- Exercise/set counts and volume per session, refreshed whenever the session's exercises or sets change
+CREATE TABLE IF NOT EXISTS workout_session_totals (
+    workout_session_id INTEGER PRIMARY KEY,
+    exercise_count INTEGER DEFAULT 0,
+    set_count INTEGER DEFAULT 0,
+    volume REAL DEFAULT 0,
+    FOREIGN KEY (workout_session_id) REFERENCES workout_sessions (id) ON DELETE CASCADE
+);
+
+-- Personal records and running totals per exercise, kept up to date as sets are logged
+CREATE TABLE IF NOT EXISTS exercise_records (
+    user_id INTEGER NOT NULL,
+    exercise_key TEXT NOT NULL,
+    best_weight_kg REAL,
+    best_reps INTEGER,
+    best_volume REAL,  -- Heaviest single set (weight x reps)
+    best_e1rm_kg REAL,  -- Best estimated one-rep max
+    total_volume REAL DEFAULT 0,
+    total_sets INTEGER DEFAULT 0,
+    total_sessions INTEGER DEFAULT 0,  -- Logged exercises with at least one set
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, exercise_key)
+) WITHOUT ROWID;
+
+-- Most reps done at each weight (weight_kg 0 = bodyweight)
+CREATE TABLE IF NOT EXISTS exercise_rep_records (
+    user_id INTEGER NOT NULL,
+    exercise_key TEXT NOT NULL,
+    weight_kg REAL NOT NULL,
+    best_reps INTEGER NOT NULL,
+    PRIMARY KEY (user_id, exercise_key, weight_kg)
+) WITHOUT ROWID;
+
+-- Bumped whenever a user's logged exercises change, so each worker's
+-- in-memory exercise autocomplete can tell its index is out of date
+CREATE TABLE IF NOT EXISTS exercise_versions (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS workout_exercises_version_insert AFTER INSERT ON workout_exercises
+WHEN new.user_id IS NOT NULL BEGIN
+    INSERT INTO exercise_versions (user_id, version) VALUES (new.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS workout_exercises_version_delete AFTER DELETE ON workout_exercises
+WHEN old.user_id IS NOT NULL BEGIN
+    INSERT INTO exercise_versions (user_id, version) VALUES (old.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS workout_exercises_version_update
+AFTER UPDATE OF exercise_name, exercise_category, exercise_key, user_id, log_date ON workout_exercises
+WHEN old.exercise_name IS NOT new.exercise_name OR old.exercise_category IS NOT new.exercise_category
+  OR old.exercise_key IS NOT new.exercise_key OR old.user_id IS NOT new.user_id
+  OR old.log_date IS NOT new.log_date BEGIN
+    INSERT INTO exercise_versions (user_id, version)
+    SELECT user_id, 1 FROM (SELECT old.user_id AS user_id UNION SELECT new.user_id) WHERE user_id IS NOT NULL
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+-- Canonical exercises, keyed by normalized name ("Pull-Up" -> "pull up")
+CREATE TABLE IF NOT EXISTS exercise_catalog (
+    exercise_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT
+) WITHOUT ROWID;
+
+-- Other names for catalog exercises (normalized alias -> exercise_key)
+CREATE TABLE IF NOT EXISTS exercise_aliases (
+    alias TEXT PRIMARY KEY,
+    exercise_key TEXT NOT NULL
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO exercise_aliases (alias, exercise_key) VALUES
+    ('bench', 'bench press'),
+    ('barbell bench press', 'bench press'),
+    ('bb bench press', 'bench press'),
+    ('flat bench press', 'bench press'),
+    ('squats', 'squat'),
+    ('back squat', 'squat'),
+    ('barbell squat', 'squat'),
+    ('deadlifts', 'deadlift'),
+    ('conventional deadlift', 'deadlift'),
+    ('rdl', 'romanian deadlift'),
+    ('ohp', 'overhead press'),
+    ('military press', 'overhead press'),
+    ('pullup', 'pull up'),
+    ('pullups', 'pull up'),
+    ('pull ups', 'pull up'),
+    ('chinup', 'chin up'),
+    ('chinups', 'chin up'),
+    ('chin ups', 'chin up'),
+    ('bent over row', 'barbell row'),
+    ('bb row', 'barbell row');
+
+-- Local OpenFoodFacts mirror (per 100g values, filled by services/off_import.py)
+CREATE TABLE IF NOT EXISTS off_products (
+    barcode TEXT PRIMARY KEY,
+    name TEXT,
+    brand TEXT,
+    serving_size TEXT,
+    image_url TEXT,
+    calories REAL DEFAULT 0,
+    protein_g REAL DEFAULT 0,
+    carbs_g REAL DEFAULT 0,
+    fat_g REAL DEFAULT 0,
+    fiber_g REAL DEFAULT 0,
+    sugar_g REAL DEFAULT 0,
+    sodium_mg REAL DEFAULT 0,
+    vitamin_a_mcg REAL DEFAULT 0,
+    vitamin_c_mg REAL DEFAULT 0,
+    vitamin_d_mcg REAL DEFAULT 0,
+    calcium_mg REAL DEFAULT 0,
+    iron_mg REAL DEFAULT 0,
+    potassium_mg REAL DEFAULT 0,
+    imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+-- Cached OpenFoodFacts API responses (found = 0 caches "Product not found")
+CREATE TABLE IF NOT EXISTS barcode_cache (
+    barcode TEXT PRIMARY KEY,
+    found BOOLEAN NOT NULL,
+    payload TEXT,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
 -- Create indexes for better query performance
 CREATE INDEX IF NOT EXISTS idx_daily_logs_date ON daily_logs(date);
 CREATE INDEX IF NOT EXISTS idx_daily_logs_user_id ON daily_logs(user_id);
 CREATE INDEX IF NOT EXISTS idx_food_entries_daily_log_id ON food_entries(daily_log_id);
+CREATE INDEX IF NOT EXISTS idx_food_entries_food_key ON food_entries(LOWER(TRIM(name)));
+CREATE INDEX IF NOT EXISTS idx_user_foods_recent ON user_foods(user_id, last_used, last_entry_id);
+CREATE INDEX IF NOT EXISTS idx_user_foods_frequent ON user_foods(user_id, uses);
 CREATE INDEX IF NOT EXISTS idx_saved_images_user_id ON saved_images(user_id);
+CREATE INDEX IF NOT EXISTS idx_saved_images_content_hash ON saved_images(content_hash);
+CREATE INDEX IF NOT EXISTS idx_saved_images_group_id ON saved_images(image_group_id);
+CREATE INDEX IF NOT EXISTS idx_saved_images_gallery ON saved_images(user_id, is_primary, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_supplements_daily_log_id ON supplements(daily_log_id);
-CREATE INDEX IF NOT EXISTS idx_weight_logs_user_date ON weight_logs(user_id, date);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_weight_logs_user_day ON weight_logs(user_id, date);
+CREATE INDEX IF NOT EXISTS idx_weight_readings_user_date ON weight_readings(user_id, date, recorded_at);
 CREATE INDEX IF NOT EXISTS idx_exercises_daily_log_id ON exercises(daily_log_id);
 CREATE INDEX IF NOT EXISTS idx_workout_sessions_daily_log_id ON workout_sessions(daily_log_id);
 CREATE INDEX IF NOT EXISTS idx_workout_exercises_session_id ON workout_exercises(workout_session_id);
 CREATE INDEX IF NOT EXISTS idx_workout_exercises_name ON workout_exercises(exercise_name);
+CREATE INDEX IF NOT EXISTS idx_workout_exercises_user_key_date ON workout_exercises(user_id, exercise_key, log_date, created_at);
+CREATE INDEX IF NOT EXISTS idx_workout_exercises_user_date ON workout_exercises(user_id, log_date);
 CREATE INDEX IF NOT EXISTS idx_workout_sets_exercise_id ON workout_sets(workout_exercise_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_workout_exercises_client_id ON workout_exercises(workout_session_id, client_id) WHERE client_id IS NOT NULL;
@@ -2,9 +2,122 @@ import anthropic
 import os
 import base64
 import json
+import time
+from services import metrics
 
 client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
 
+# Model tiers - the fast tier handles simple lookups, the large tier handles
+# vision, conversation and anything the fast tier couldn't answer confidently
+MODEL_TIERS = {
+    'fast': os.getenv('AI_MODEL_FAST', 'claude-haiku-4-5-20251001'),
+    'large': os.getenv('AI_MODEL_LARGE', 'claude-sonnet-4-5-20250929')
+}
+
+# Tier each task starts on (override with AI_TIER_<TASK>=fast|large)
+TASK_TIERS = {
+    'image_analysis': os.getenv('AI_TIER_IMAGE_ANALYSIS', 'large'),
+    'food_chat': os.getenv('AI_TIER_FOOD_CHAT', 'large'),
+    'micronutrients': os.getenv('AI_TIER_MICRONUTRIENTS', 'fast'),
+    'supplement_micronutrients': os.getenv('AI_TIER_SUPPLEMENT_MICRONUTRIENTS', 'fast')
+}
+
+def extract_json(response_text):
+    """Parse JSON from a model response (handles markdown code blocks)"""
+    if '```json' in response_text:
+        json_start = response_text.find('```json') + 7
+        json_end = response_text.find('```', json_start)
+        json_str = response_text[json_start:json_end].strip()
+    elif '```' in response_text:
+        json_start = response_text.find('```') + 3
+        json_end = response_text.find('```', json_start)
+        json_str = response_text[json_start:json_end].strip()
+    else:
+        json_str = response_text.strip()
+
+    return json.loads(json_str)
+
+def is_confident(result):
+    """Accept a parsed response unless the model reported low confidence"""
+    return isinstance(result, dict) and result.get('confidence') != 'low'
+
+def create_message(task, tier, **kwargs):
+    """Call the model for a tier and record latency and token usage"""
+    model = MODEL_TIERS.get(tier, MODEL_TIERS['large'])
+
+    start = time.perf_counter()
+    message = client.messages.create(model=model, **kwargs)
+    metrics.observe(f'ai.{task}.{tier}.latency_ms', (time.perf_counter() - start) * 1000)
+
+    metrics.increment(f'ai.{task}.{tier}.calls')
+    usage = getattr(message, 'usage', None)
+    if usage:
+        metrics.increment(f'ai.{task}.{tier}.input_tokens', usage.input_tokens)
+        metrics.increment(f'ai.{task}.{tier}.output_tokens', usage.output_tokens)
+
+    return message
+
+def routed_request(task, accept=is_confident, **kwargs):
+    """
+    Send a request to the tier configured for the task, escalating to the
+    large tier when the response is unparseable or fails the accept check
+
+    Returns:
+        Tuple of (raw response text, parsed JSON or None if it couldn't be parsed)
+    """
+    tier = TASK_TIERS.get(task, 'large')
+    if tier not in MODEL_TIERS:
+        tier = 'large'
+
+    metrics.increment(f'ai.{task}.requests')
+    with metrics.timer(f'ai.{task}.latency_ms'):
+        while True:
+            message = create_message(task, tier, **kwargs)
+            response_text = message.content[0].text
+
+            try:
+                result = extract_json(response_text)
+            except json.JSONDecodeError:
+                result = None
+
+            if tier == 'large' or (result is not None and accept(result)):
+                return response_text, result
+
+            print(f"Escalating {task} from {tier} to large model (unparseable or low confidence)")
+            metrics.increment(f'ai.{task}.escalations')
+            tier = 'large'
+
+def get_routing_stats():
+    """Per-task latency, token usage and escalation rate"""
+    snapshot = metrics.snapshot(prefix='ai.')
+    counters = snapshot['counters']
+    timings = snapshot['timings']
+
+    stats = {}
+    for task, start_tier in TASK_TIERS.items():
+        requests_count = counters.get(f'ai.{task}.requests', 0)
+        escalations = counters.get(f'ai.{task}.escalations', 0)
+
+        stats[task] = {
+            'start_tier': start_tier,
+            'requests': requests_count,
+            'escalations': escalations,
+            'escalation_rate': round(escalations / requests_count, 4) if requests_count else 0,
+            'latency': timings.get(f'ai.{task}.latency_ms'),
+            'tiers': {
+                tier: {
+                    'model': model,
+                    'calls': counters.get(f'ai.{task}.{tier}.calls', 0),
+                    'input_tokens': counters.get(f'ai.{task}.{tier}.input_tokens', 0),
+                    'output_tokens': counters.get(f'ai.{task}.{tier}.output_tokens', 0),
+                    'latency': timings.get(f'ai.{task}.{tier}.latency_ms')
+                }
+                for tier, model in MODEL_TIERS.items()
+            }
+        }
+
+    return stats
+
 def analyze_food_image(image_path, custom_notes='', additional_images=None):
     """Analyze a food image (or multiple images) and extract nutritional information"""
     try:
@@ -118,9 +231,9 @@ Replace the 0 values with your estimates. Be as accurate as possible."""
             "text": prompt
         })
 
-        # Call Claude API (using Sonnet 4.5)
-        message = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
+        # Call Claude API (large tier by default - vision needs the bigger model)
+        response_text, result = routed_request(
+            'image_analysis',
             max_tokens=2048,
             messages=[
                 {
@@ -130,33 +243,12 @@ Replace the 0 values with your estimates. Be as accurate as possible."""
             ]
         )
 
-        # Parse response
-        response_text = message.content[0].text
-
         # Debug: Log the raw response
         print(f"Claude Response: {response_text[:500]}...")  # First 500 chars
 
-        # Extract JSON from response (handle potential markdown code blocks)
-        json_str = None
-        if '```json' in response_text:
-            json_start = response_text.find('```json') + 7
-            json_end = response_text.find('```', json_start)
-            json_str = response_text[json_start:json_end].strip()
-        elif '```' in response_text:
-            json_start = response_text.find('```') + 3
-            json_end = response_text.find('```', json_start)
-            json_str = response_text[json_start:json_end].strip()
-        else:
-            json_str = response_text.strip()
-
-        # Try to parse JSON
-        try:
-            result = json.loads(json_str)
-            return result
-        except json.JSONDecodeError as json_err:
+        if result is None:
             # If JSON parsing fails, create a fallback response
-            print(f"JSON Parse Error: {json_err}")
-            print(f"Attempted to parse: {json_str[:200]}...")
+            print(f"JSON Parse Error - attempted to parse: {response_text[:200]}...")
 
             # Return a structured error response
             return {
@@ -166,8 +258,8 @@ Replace the 0 values with your estimates. Be as accurate as possible."""
                 "error": "json_parse_failed"
             }
 
-    except json.JSONDecodeError as e:
-        raise Exception(f"Failed to parse JSON response: {str(e)}")
+        return result
+
     except Exception as e:
         raise Exception(f"Failed to analyze image: {str(e)}")
 
@@ -316,41 +408,23 @@ Remember: ONLY JSON, no explanations. Extract supplements/vitamins/medications a
             "content": full_message
         })
 
-        # Call Claude (using Sonnet 4.5 for better instruction following)
-        message = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
+        # Call Claude (large tier by default for better instruction following)
+        response_text, result = routed_request(
+            'food_chat',
+            accept=lambda r: isinstance(r, dict) and 'items' in r,
             max_tokens=2048,
             temperature=0,  # More deterministic for JSON output
             messages=messages
         )
 
-        response_text = message.content[0].text
-
         # Debug: Log the raw response
         print(f"=== AI CHAT RAW RESPONSE ===")
         print(response_text)
         print(f"=== END RAW RESPONSE ===")
 
-        # Try to extract JSON
-        try:
-            if '```json' in response_text:
-                json_start = response_text.find('```json') + 7
-                json_end = response_text.find('```', json_start)
-                json_str = response_text[json_start:json_end].strip()
-            elif '```' in response_text:
-                json_start = response_text.find('```') + 3
-                json_end = response_text.find('```', json_start)
-                json_str = response_text[json_start:json_end].strip()
-            else:
-                # Try to parse the whole response
-                json_str = response_text.strip()
-
-            result = json.loads(json_str)
-        except json.JSONDecodeError as e:
+        if result is None:
             # If JSON parsing fails, return a helpful message
-            print(f"Chat JSON Parse Error: {e}")
-            print(f"Attempted to parse: {json_str[:200] if json_str else 'None'}...")
-            print(f"Full response: {response_text}")
+            print(f"Chat JSON Parse Error - full response: {response_text}")
 
             # Try to be helpful even when parsing fails
             result = {
@@ -392,31 +466,23 @@ Provide realistic micronutrient estimates in this exact JSON format:
     "magnesium_mg": 0,
     "potassium_mg": 0,
     "zinc_mg": 0,
-    "sodium_mg": 0
+    "sodium_mg": 0,
+    "confidence": "high|medium|low"
 }}
 
-Use your knowledge of typical micronutrient content for this food. If the food typically has none of a nutrient, use 0."""
+Use your knowledge of typical micronutrient content for this food. If the food typically has none of a nutrient, use 0.
+Set "confidence" to "low" if you don't recognise the food or are guessing."""
 
-        message = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
+        # Simple lookup - starts on the fast tier and escalates if unsure
+        response_text, result = routed_request(
+            'micronutrients',
             max_tokens=512,
             messages=[{"role": "user", "content": prompt}]
         )
 
-        response_text = message.content[0].text
+        if result is None:
+            raise ValueError(f"Unparseable response: {response_text[:200]}")
 
-        # Extract JSON
-        json_str = response_text.strip()
-        if '```json' in response_text:
-            json_start = response_text.find('```json') + 7
-            json_end = response_text.find('```', json_start)
-            json_str = response_text[json_start:json_end].strip()
-        elif '```' in response_text:
-            json_start = response_text.find('```') + 3
-            json_end = response_text.find('```', json_start)
-            json_str = response_text[json_start:json_end].strip()
-
-        result = json.loads(json_str)
         return result
 
     except Exception as e:
@@ -469,31 +535,23 @@ Provide the micronutrient amounts in this exact JSON format:
     "magnesium_mg": 0,
     "potassium_mg": 0,
     "zinc_mg": 0,
-    "sodium_mg": 0
+    "sodium_mg": 0,
+    "confidence": "high|medium|low"
 }}
 
-Only include amounts for nutrients this supplement actually provides. Use 0 for nutrients it doesn't provide."""
+Only include amounts for nutrients this supplement actually provides. Use 0 for nutrients it doesn't provide.
+Set "confidence" to "low" if you don't recognise the supplement or the dosage is unclear."""
 
-        message = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
+        # Simple lookup - starts on the fast tier and escalates if unsure
+        response_text, result = routed_request(
+            'supplement_micronutrients',
             max_tokens=512,
             messages=[{"role": "user", "content": prompt}]
         )
 
-        response_text = message.content[0].text
+        if result is None:
+            raise ValueError(f"Unparseable response: {response_text[:200]}")
 
-        # Extract JSON
-        json_str = response_text.strip()
-        if '```json' in response_text:
-            json_start = response_text.find('```json') + 7
-            json_end = response_text.find('```', json_start)
-            json_str = response_text[json_start:json_end].strip()
-        elif '```' in response_text:
-            json_start = response_text.find('```') + 3
-            json_end = response_text.find('```', json_start)
-            json_str = response_text[json_start:json_end].strip()
-
-        result = json.loads(json_str)
         return result
 
     except Exception as e:
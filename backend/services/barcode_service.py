@@ -0,0 +1,393 @@
+"""
+Barcode product lookups - local OpenFoodFacts mirror first, then a persistent
+cache of API responses, and the live API only on a miss
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from database import query_db, execute_db
+from services import metrics
+
+OPENFOODFACTS_BASE_URL = os.getenv('OPENFOODFACTS_BASE_URL', 'https://world.openfoodfacts.org')
+OPENFOODFACTS_URL = OPENFOODFACTS_BASE_URL + '/api/v0/product/{barcode}.json'
+
+# Keep-alive connections to OpenFoodFacts and threads used for batch lookups
+HTTP_POOL_SIZE = int(os.getenv('BARCODE_HTTP_POOL_SIZE', 10))
+BATCH_WORKERS = int(os.getenv('BARCODE_BATCH_WORKERS', 8))
+# Threads revalidating stale cache entries in the background
+REFRESH_WORKERS = int(os.getenv('BARCODE_REFRESH_WORKERS', 2))
+MAX_BATCH_SIZE = 100
+
+# Cache lifetimes - found products rarely change, "not found" may be added later
+CACHE_TTL_SECONDS = float(os.getenv('BARCODE_CACHE_TTL_HOURS', 24 * 7)) * 3600
+NEGATIVE_CACHE_TTL_SECONDS = float(os.getenv('BARCODE_NEGATIVE_CACHE_TTL_HOURS', 24)) * 3600
+# How long past expiry a cached answer may still be served while it's refreshed
+STALE_WINDOW_SECONDS = float(os.getenv('BARCODE_CACHE_STALE_HOURS', 24 * 30)) * 3600
+
+# Upstream fetches currently running, keyed by barcode (shared by all threads)
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+_batch_executor = None
+_refresh_executor = None
+_batch_executor_lock = threading.Lock()
+
+def create_http_session():
+    """Create a requests session that reuses connections to OpenFoodFacts"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'SkinnyLegend/1.0 (calorie tracker)'
+    return session
+
+# Shared by all threads - avoids a new TCP+TLS handshake on every scan
+http_session = create_http_session()
+
+def get_batch_executor():
+    """Get the bounded thread pool used to resolve batch lookups"""
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            _batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='barcode')
+        return _batch_executor
+
+def get_refresh_executor():
+    """Get the small thread pool that refreshes stale cache entries"""
+    global _refresh_executor
+    with _batch_executor_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='barcode-refresh')
+        return _refresh_executor
+
+# Nutrient columns stored for each product (per 100g), mapped to the
+# OpenFoodFacts nutriment key and the multiplier from grams
+NUTRIENT_FIELDS = {
+    'calories': ('energy-kcal_100g', 1),
+    'protein_g': ('proteins_100g', 1),
+    'carbs_g': ('carbohydrates_100g', 1),
+    'fat_g': ('fat_100g', 1),
+    'fiber_g': ('fiber_100g', 1),
+    'sugar_g': ('sugars_100g', 1),
+    'sodium_mg': ('sodium_100g', 1000),
+    'vitamin_a_mcg': ('vitamin-a_100g', 1000000),
+    'vitamin_c_mg': ('vitamin-c_100g', 1000),
+    'vitamin_d_mcg': ('vitamin-d_100g', 1000000),
+    'calcium_mg': ('calcium_100g', 1000),
+    'iron_mg': ('iron_100g', 1000),
+    'potassium_mg': ('potassium_100g', 1000)
+}
+
+MICRONUTRIENT_FIELDS = ['vitamin_a_mcg', 'vitamin_c_mg', 'vitamin_d_mcg', 'calcium_mg', 'iron_mg', 'potassium_mg']
+
+def to_float(value):
+    """Convert an OpenFoodFacts value (number, numeric string or empty) to a float"""
+    if value is None or value == '':
+        return 0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+def extract_product_fields(product):
+    """Flatten an OpenFoodFacts product into the columns we store"""
+    nutriments = product.get('nutriments') or {}
+
+    fields = {
+        'name': product.get('product_name') or 'Unknown Product',
+        'brand': product.get('brands') or '',
+        'serving_size': product.get('serving_size') or '100g',
+        'image_url': product.get('image_url') or ''
+    }
+    for field, (key, multiplier) in NUTRIENT_FIELDS.items():
+        fields[field] = to_float(nutriments.get(key)) * multiplier
+
+    return fields
+
+def format_result(barcode, fields, source):
+    """Build the barcode API response from stored product fields"""
+    result = {
+        'name': fields['name'],
+        'brand': fields['brand'],
+        'barcode': barcode,
+        'serving_size': fields['serving_size'],
+        'image_url': fields['image_url'],
+        'micronutrients': {field: fields[field] for field in MICRONUTRIENT_FIELDS},
+        'source': source
+    }
+    for field in ['calories', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g', 'sugar_g', 'sodium_mg']:
+        result[field] = fields[field]
+
+    return result
+
+def candidate_codes(barcode):
+    """Barcode variants to try - 12 digit UPC-A codes are stored as 13 digit EAN"""
+    codes = [barcode]
+    if barcode.isdigit() and len(barcode) == 12:
+        codes.append('0' + barcode)
+    elif barcode.isdigit() and len(barcode) == 13 and barcode.startswith('0'):
+        codes.append(barcode[1:])
+    return codes
+
+def lookup_local(barcode):
+    """Look up a product in the local OpenFoodFacts mirror"""
+    return lookup_local_many([barcode]).get(barcode)
+
+def lookup_local_many(barcodes):
+    """Look up several products in the local mirror with one query"""
+    code_to_barcode = {}
+    for barcode in barcodes:
+        for code in candidate_codes(barcode):
+            code_to_barcode.setdefault(code, barcode)
+
+    if not code_to_barcode:
+        return {}
+
+    placeholders = ','.join('?' * len(code_to_barcode))
+    rows = query_db(
+        f'SELECT * FROM off_products WHERE barcode IN ({placeholders})',
+        list(code_to_barcode.keys())
+    )
+
+    results = {}
+    for row in rows:
+        barcode = code_to_barcode[row['barcode']]
+        results.setdefault(barcode, format_result(barcode, row, 'local'))
+    return results
+
+def fetch_remote(barcode):
+    """
+    Fetch a product from the OpenFoodFacts API
+
+    Returns:
+        Product result, or None if OpenFoodFacts doesn't know the barcode
+    """
+    response = http_session.get(OPENFOODFACTS_URL.format(barcode=barcode), timeout=10)
+    data = response.json()
+
+    if data.get('status') == 0:
+        return None
+
+    return format_result(barcode, extract_product_fields(data['product']), 'openfoodfacts')
+
+def get_cached(barcode):
+    """Get a cached API response for a barcode (including stale ones)"""
+    return query_db('SELECT * FROM barcode_cache WHERE barcode = ?', [barcode], one=True)
+
+def get_cached_many(barcodes):
+    """Get cached API responses for several barcodes with one query"""
+    if not barcodes:
+        return {}
+
+    placeholders = ','.join('?' * len(barcodes))
+    rows = query_db(
+        f'SELECT * FROM barcode_cache WHERE barcode IN ({placeholders})',
+        list(barcodes)
+    )
+    return {row['barcode']: row for row in rows}
+
+def store_cached(barcode, result):
+    """Cache an API response (result is None when the product wasn't found)"""
+    ttl = CACHE_TTL_SECONDS if result else NEGATIVE_CACHE_TTL_SECONDS
+    now = time.time()
+    execute_db(
+        '''INSERT OR REPLACE INTO barcode_cache (barcode, found, payload, fetched_at, expires_at)
+           VALUES (?, ?, ?, ?, ?)''',
+        [barcode, 1 if result else 0, json.dumps(result) if result else None, now, now + ttl]
+    )
+
+def fetch_and_cache(barcode):
+    """Fetch a barcode from the API and cache the answer"""
+    metrics.increment('barcode.upstream.requests')
+    try:
+        with metrics.timer('barcode.upstream.latency_ms'):
+            result = fetch_remote(barcode)
+    except Exception:
+        metrics.increment('barcode.upstream.errors')
+        raise
+
+    store_cached(barcode, result)
+    return result
+
+def start_call(barcode):
+    """Register an upstream fetch for a barcode (call with _inflight_lock held)"""
+    call = {'done': threading.Event(), 'result': None, 'error': None}
+    _inflight[barcode] = call
+    return call
+
+def run_call(barcode, call):
+    """Make a registered upstream fetch and hand its answer to everyone waiting on it"""
+    try:
+        call['result'] = fetch_and_cache(barcode)
+        return call['result']
+    except Exception as e:
+        call['error'] = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(barcode, None)
+        call['done'].set()
+
+def fetch_coalesced(barcode):
+    """
+    Fetch a barcode from the API, sharing one upstream call between all
+    threads that ask for the same barcode at the same time
+    """
+    with _inflight_lock:
+        call = _inflight.get(barcode)
+        is_leader = call is None
+        if is_leader:
+            call = start_call(barcode)
+
+    if not is_leader:
+        metrics.increment('barcode.upstream.coalesced')
+        call['done'].wait()
+        if call['error']:
+            raise call['error']
+        return call['result']
+
+    return run_call(barcode, call)
+
+def refresh_in_background(barcode):
+    """
+    Revalidate a stale cache entry without blocking the request
+
+    Refreshes run on a small pool, and a barcode that's already being fetched
+    or queued for a refresh isn't queued again - the fetch is registered in
+    _inflight as soon as it's queued, so lookups coalesce onto it too.
+    """
+    with _inflight_lock:
+        if barcode in _inflight:
+            metrics.increment('barcode.refresh.skipped')
+            return
+        call = start_call(barcode)
+
+    def refresh():
+        try:
+            run_call(barcode, call)
+        except Exception as e:
+            print(f"Background barcode refresh failed for {barcode}: {e}")
+
+    get_refresh_executor().submit(refresh)
+
+def cached_result(entry):
+    """Turn a cache row back into a lookup result (None for cached "not found")"""
+    if not entry['found']:
+        return None
+    result = json.loads(entry['payload'])
+    result['source'] = 'cache'
+    return result
+
+def answer_from_cache(barcode, entry):
+    """
+    Try to answer a lookup from a cache entry, refreshing it in the
+    background if it's stale
+
+    Returns:
+        Tuple of (answered, result)
+    """
+    now = time.time()
+
+    if entry and now < entry['expires_at']:
+        metrics.increment('barcode.cache.hits')
+        if not entry['found']:
+            metrics.increment('barcode.cache.negative_hits')
+        return True, cached_result(entry)
+
+    if entry and now < entry['expires_at'] + STALE_WINDOW_SECONDS:
+        # Serve the stale answer now and refresh it for next time
+        metrics.increment('barcode.cache.stale_hits')
+        refresh_in_background(barcode)
+        return True, cached_result(entry)
+
+    metrics.increment('barcode.cache.misses')
+    return False, None
+
+def lookup_product(barcode):
+    """
+    Look up a barcode: local mirror, then cache, then the OpenFoodFacts API
+
+    Returns:
+        Product result, or None if the product isn't known
+    """
+    result = lookup_local(barcode)
+    if result:
+        metrics.increment('barcode.local_hits')
+        return result
+
+    answered, result = answer_from_cache(barcode, get_cached(barcode))
+    if answered:
+        return result
+
+    return fetch_coalesced(barcode)
+
+def lookup_products(barcodes):
+    """
+    Look up many barcodes at once - local mirror and cache are checked with
+    one query each, and the remaining barcodes are fetched concurrently on
+    the bounded batch thread pool
+
+    Returns:
+        Tuple of (results, errors) - results maps barcode to product (or None
+        if not found), errors maps barcode to an error message
+    """
+    barcodes = list(dict.fromkeys(barcodes))
+
+    results = lookup_local_many(barcodes)
+    metrics.increment('barcode.local_hits', len(results))
+
+    to_fetch = []
+    cached = get_cached_many([b for b in barcodes if b not in results])
+    for barcode in barcodes:
+        if barcode in results:
+            continue
+        answered, result = answer_from_cache(barcode, cached.get(barcode))
+        if answered:
+            results[barcode] = result
+        else:
+            to_fetch.append(barcode)
+
+    executor = get_batch_executor()
+    futures = {barcode: executor.submit(fetch_coalesced, barcode) for barcode in to_fetch}
+
+    errors = {}
+    for barcode, future in futures.items():
+        try:
+            results[barcode] = future.result()
+        except Exception as e:
+            errors[barcode] = str(e)
+
+    return {barcode: results[barcode] for barcode in barcodes if barcode in results}, errors
+
+def get_cache_stats():
+    """Cache hit ratio, upstream latency and cache size"""
+    counters = metrics.snapshot('barcode.')['counters']
+    hits = counters.get('barcode.cache.hits', 0) + counters.get('barcode.cache.stale_hits', 0)
+    misses = counters.get('barcode.cache.misses', 0)
+
+    size = query_db(
+        '''SELECT COUNT(*) as entries,
+                  COALESCE(SUM(found), 0) as found,
+                  COALESCE(SUM(expires_at < ?), 0) as expired
+           FROM barcode_cache''',
+        [time.time()],
+        one=True
+    )
+
+    return {
+        'local_hits': counters.get('barcode.local_hits', 0),
+        'hits': hits,
+        'negative_hits': counters.get('barcode.cache.negative_hits', 0),
+        'stale_hits': counters.get('barcode.cache.stale_hits', 0),
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0,
+        'upstream_requests': counters.get('barcode.upstream.requests', 0),
+        'upstream_errors': counters.get('barcode.upstream.errors', 0),
+        'coalesced_requests': counters.get('barcode.upstream.coalesced', 0),
+        'upstream_latency': metrics.snapshot('barcode.upstream.latency_ms')['timings'].get('barcode.upstream.latency_ms'),
+        'entries': size
+    }
@@ -1,6 +1,46 @@
 """
 Nutritional calculations including BMR, TDEE, and calorie goals
+
+The *_array functions are NumPy versions of the scalar ones: every argument
+can be a scalar or an array (string arguments too), and results broadcast,
+so projections over many days or scenarios need no Python loops.
 """
+import numpy as np
+
+ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.2,           # Little or no exercise
+    'lightly_active': 1.375,    # Light exercise 1-3 days/week
+    'moderately_active': 1.55,  # Moderate exercise 3-5 days/week
+    'very_active': 1.725,       # Hard exercise 6-7 days/week
+    'extra_active': 1.9         # Very hard exercise & physical job
+}
+
+# 500 calorie deficit/surplus for ~1 lb per week loss/gain
+GOAL_CALORIE_OFFSETS = {'lose': -500, 'maintain': 0, 'gain': 500}
+
+# Protein targets based on weight and goal (in g per kg body weight)
+PROTEIN_MULTIPLIERS = {
+    'lose': 2.0,      # Higher protein to preserve muscle during deficit
+    'maintain': 1.6,  # Moderate protein for maintenance
+    'gain': 1.8       # High protein for muscle building
+}
+
+# Mifflin-St Jeor constant per gender ('other' uses the average)
+BMR_GENDER_OFFSETS = {'male': 5, 'female': -161}
+BMR_OTHER_OFFSET = (5 - 161) / 2
+
+# Fat: 25-30% of total calories (using 27.5% average); carbs fill the rest
+# but never go below MIN_CARBS_G
+FAT_CALORIE_SHARE = 0.275
+MIN_CARBS_G = 50
+
+# Water: 30ml per kg (more conservative, matches NHS guidelines better),
+# rounded to the nearest 250ml (1 cup)
+WATER_ML_PER_KG = 30
+WATER_ROUNDING_ML = 250
+
+# Energy in a kilogram of body weight change
+KCAL_PER_KG = 7700
 
 def calculate_bmr(weight_kg, height_cm, age, gender):
     """
@@ -15,17 +55,9 @@ def calculate_bmr(weight_kg, height_cm, age, gender):
     Returns:
         BMR in calories per day
     """
-    if gender == 'male':
-        bmr = (10 * weight_kg) + (6.25 * height_cm) - (5 * age) + 5
-    elif gender == 'female':
-        bmr = (10 * weight_kg) + (6.25 * height_cm) - (5 * age) - 161
-    else:
-        # For 'other', use average of male and female formulas
-        male_bmr = (10 * weight_kg) + (6.25 * height_cm) - (5 * age) + 5
-        female_bmr = (10 * weight_kg) + (6.25 * height_cm) - (5 * age) - 161
-        bmr = (male_bmr + female_bmr) / 2
-
-    return bmr
+    # For 'other', use average of male and female formulas
+    offset = BMR_GENDER_OFFSETS.get(gender, BMR_OTHER_OFFSET)
+    return (10 * weight_kg) + (6.25 * height_cm) - (5 * age) + offset
 
 def calculate_tdee(bmr, activity_level):
     """
@@ -38,15 +70,7 @@ def calculate_tdee(bmr, activity_level):
     Returns:
         TDEE in calories per day
     """
-    activity_multipliers = {
-        'sedentary': 1.2,           # Little or no exercise
-        'lightly_active': 1.375,    # Light exercise 1-3 days/week
-        'moderately_active': 1.55,  # Moderate exercise 3-5 days/week
-        'very_active': 1.725,       # Hard exercise 6-7 days/week
-        'extra_active': 1.9         # Very hard exercise & physical job
-    }
-
-    multiplier = activity_multipliers.get(activity_level, 1.2)
+    multiplier = ACTIVITY_MULTIPLIERS.get(activity_level, ACTIVITY_MULTIPLIERS['sedentary'])
     return bmr * multiplier
 
 def calculate_calorie_goal(tdee, goal):
@@ -60,14 +84,7 @@ def calculate_calorie_goal(tdee, goal):
     Returns:
         Daily calorie goal
     """
-    if goal == 'lose':
-        # 500 calorie deficit for ~1 lb per week loss
-        return tdee - 500
-    elif goal == 'gain':
-        # 500 calorie surplus for ~1 lb per week gain
-        return tdee + 500
-    else:  # maintain
-        return tdee
+    return tdee + GOAL_CALORIE_OFFSETS.get(goal, 0)
 
 def calculate_macro_targets(calorie_goal, weight_kg, goal):
     """
@@ -81,19 +98,10 @@ def calculate_macro_targets(calorie_goal, weight_kg, goal):
     Returns:
         Dictionary with protein_g, carbs_g, fat_g targets
     """
-    # Protein targets based on weight and goal (in g per kg body weight)
-    protein_multipliers = {
-        'lose': 2.0,      # Higher protein to preserve muscle during deficit
-        'maintain': 1.6,  # Moderate protein for maintenance
-        'gain': 1.8       # High protein for muscle building
-    }
-
-    protein_multiplier = protein_multipliers.get(goal, 1.6)
+    protein_multiplier = PROTEIN_MULTIPLIERS.get(goal, PROTEIN_MULTIPLIERS['maintain'])
     protein_g = round(weight_kg * protein_multiplier)
 
-    # Fat: 25-30% of total calories (using 27.5% average)
-    fat_percentage = 0.275
-    fat_g = round((calorie_goal * fat_percentage) / 9)
+    fat_g = round((calorie_goal * FAT_CALORIE_SHARE) / 9)
 
     # Carbs: Fill remaining calories
     # Calculate calories from protein and fat, then convert remainder to carbs
@@ -103,8 +111,8 @@ def calculate_macro_targets(calorie_goal, weight_kg, goal):
     carbs_g = round(remaining_calories / 4)
 
     # Ensure carbs don't go negative
-    if carbs_g < 50:
-        carbs_g = 50
+    if carbs_g < MIN_CARBS_G:
+        carbs_g = MIN_CARBS_G
         # Recalculate fat to fit
         remaining_after_protein_carbs = calorie_goal - (protein_g * 4) - (carbs_g * 4)
         fat_g = round(remaining_after_protein_carbs / 9)
@@ -115,6 +123,16 @@ def calculate_macro_targets(calorie_goal, weight_kg, goal):
         'fat_g': fat_g
     }
 
+# Activity multipliers for additional hydration needs
+# More conservative than before - only add water if actually sweating
+WATER_ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.0,           # No additional
+    'lightly_active': 1.05,     # +5%
+    'moderately_active': 1.1,   # +10%
+    'very_active': 1.15,        # +15%
+    'extra_active': 1.2         # +20%
+}
+
 def calculate_water_target(weight_kg, activity_level):
     """
     Calculate daily water target in ml based on weight and activity level
@@ -130,34 +148,97 @@ def calculate_water_target(weight_kg, activity_level):
     Returns:
         Daily water target in milliliters
     """
-    # Base calculation: 30ml per kg (more conservative, matches NHS guidelines better)
-    base_water = weight_kg * 30
-
-    # Activity multipliers for additional hydration needs
-    # More conservative than before - only add water if actually sweating
-    activity_multipliers = {
-        'sedentary': 1.0,           # No additional
-        'lightly_active': 1.05,     # +5%
-        'moderately_active': 1.1,   # +10%
-        'very_active': 1.15,        # +15%
-        'extra_active': 1.2         # +20%
-    }
+    base_water = weight_kg * WATER_ML_PER_KG
 
-    multiplier = activity_multipliers.get(activity_level, 1.0)
+    multiplier = WATER_ACTIVITY_MULTIPLIERS.get(activity_level, WATER_ACTIVITY_MULTIPLIERS['sedentary'])
 
-    # Round to nearest 250ml (1 cup)
-    water_target = round((base_water * multiplier) / 250) * 250
+    water_target = round((base_water * multiplier) / WATER_ROUNDING_ML) * WATER_ROUNDING_ML
 
     return int(water_target)
 
-def get_rda_targets(age, gender):
+def _lookup(values, table, default):
+    """Map a string or array of strings through table, as floats"""
+    keys, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    mapped = np.array([table.get(key, default) for key in keys], dtype=float)
+    return mapped[inverse].reshape(np.shape(values))
+
+def calculate_bmr_array(weight_kg, height_cm, age, gender):
+    """Array version of calculate_bmr"""
+    offset = _lookup(gender, BMR_GENDER_OFFSETS, BMR_OTHER_OFFSET)
+    weight_kg = np.asarray(weight_kg, dtype=float)
+    height_cm = np.asarray(height_cm, dtype=float)
+    age = np.asarray(age, dtype=float)
+    return (10 * weight_kg) + (6.25 * height_cm) - (5 * age) + offset
+
+def calculate_tdee_array(bmr, activity_level):
+    """Array version of calculate_tdee"""
+    return np.asarray(bmr, dtype=float) * _lookup(activity_level, ACTIVITY_MULTIPLIERS, ACTIVITY_MULTIPLIERS['sedentary'])
+
+def calculate_calorie_goal_array(tdee, goal):
+    """Array version of calculate_calorie_goal"""
+    return np.asarray(tdee, dtype=float) + _lookup(goal, GOAL_CALORIE_OFFSETS, 0)
+
+def calculate_macro_targets_array(calorie_goal, weight_kg, goal):
+    """Array version of calculate_macro_targets (dictionary of arrays)"""
+    calorie_goal = np.asarray(calorie_goal, dtype=float)
+    protein_g = np.round(np.asarray(weight_kg, dtype=float) * _lookup(goal, PROTEIN_MULTIPLIERS, PROTEIN_MULTIPLIERS['maintain']))
+    fat_g = np.round((calorie_goal * FAT_CALORIE_SHARE) / 9)
+    carbs_g = np.round((calorie_goal - protein_g * 4 - fat_g * 9) / 4)
+
+    # Keep carbs at the minimum, recalculating fat to fit
+    low_carb = carbs_g < MIN_CARBS_G
+    carbs_g = np.where(low_carb, float(MIN_CARBS_G), carbs_g)
+    fat_g = np.where(low_carb, np.round((calorie_goal - protein_g * 4 - carbs_g * 4) / 9), fat_g)
+
+    return {
+        'protein_g': protein_g,
+        'carbs_g': carbs_g,
+        'fat_g': fat_g
+    }
+
+def calculate_water_target_array(weight_kg, activity_level):
+    """Array version of calculate_water_target"""
+    multiplier = _lookup(activity_level, WATER_ACTIVITY_MULTIPLIERS, WATER_ACTIVITY_MULTIPLIERS['sedentary'])
+    water = np.asarray(weight_kg, dtype=float) * WATER_ML_PER_KG * multiplier
+    return (np.round(water / WATER_ROUNDING_ML) * WATER_ROUNDING_ML).astype(int)
+
+def project_weight(start_weight_kg, intake, days, height_cm, age, gender, activity_level):
+    """
+    Simulate weight day by day when eating a fixed intake
+
+    Each day's weight changes by (intake - TDEE at that day's weight) / 7700
+    kcal per kg, so TDEE falls as weight is lost. TDEE is linear in weight,
+    which makes the daily recurrence geometric - it is evaluated in closed
+    form for every day and scenario at once instead of stepping through days.
+
+    Args:
+        start_weight_kg: Weight on day 0
+        intake: Daily calories - a scalar or an array of scenarios
+        days: Number of days to project
+        height_cm, age, gender, activity_level: As for calculate_bmr/calculate_tdee
+
+    Returns:
+        Array of weights, shape (scenarios, days + 1) with day 0 first
+    """
+    intake = np.atleast_1d(np.asarray(intake, dtype=float))[:, np.newaxis]
+    # TDEE = base + slope * weight
+    base = calculate_tdee_array(calculate_bmr_array(0, height_cm, age, gender), activity_level)
+    slope = calculate_tdee_array(calculate_bmr_array(1, height_cm, age, gender), activity_level) - base
+
+    # w[t+1] = w[t] + (intake - base - slope * w[t]) / KCAL_PER_KG
+    #        = equilibrium + (w[t] - equilibrium) * ratio
+    ratio = 1 - slope / KCAL_PER_KG
+    equilibrium = (intake - base) / slope
+    return equilibrium + (start_weight_kg - equilibrium) * ratio ** np.arange(days + 1)
+
+def _calculate_rda_targets(age, gender):
     """
     Get Recommended Daily Allowance (RDA) for micronutrients
     Based on USDA guidelines for adults
 
     Args:
         age: Age in years
-        gender: 'male', 'female', or 'other'
+        gender: 'male' or 'female'
 
     Returns:
         Dictionary with micronutrient RDA values
@@ -191,10 +272,58 @@ def get_rda_targets(age, gender):
         rdas['vitamin_d_mcg'] = 20  # 800 IU for 71+
         rdas['calcium_mg'] = 1200  # Both genders
 
-    # Use average for 'other' gender
-    if gender == 'other':
-        male_values = get_rda_targets(age, 'male')
-        female_values = get_rda_targets(age, 'female')
-        rdas = {k: (male_values[k] + female_values[k]) / 2 for k in male_values.keys()}
-
     return rdas
+
+# RDAs only change at these ages, so each band's table is computed once
+RDA_AGE_BANDS = (0, 51, 71)
+
+def _build_rda_table():
+    """RDA tables keyed by (lower age of band, gender)"""
+    table = {}
+    for band in RDA_AGE_BANDS:
+        male = _calculate_rda_targets(band, 'male')
+        female = _calculate_rda_targets(band, 'female')
+        table[(band, 'male')] = male
+        table[(band, 'female')] = female
+        # Use average for 'other' gender
+        table[(band, 'other')] = {k: (male[k] + female[k]) / 2 for k in male}
+    return table
+
+RDA_TABLE = _build_rda_table()
+
+def rda_age_band(age):
+    """Lower age of the RDA band an age falls in"""
+    band = RDA_AGE_BANDS[0]
+    for lower in RDA_AGE_BANDS:
+        if age >= lower:
+            band = lower
+    return band
+
+def get_rda_targets(age, gender):
+    """
+    Get Recommended Daily Allowance (RDA) for micronutrients
+    Based on USDA guidelines for adults
+
+    Args:
+        age: Age in years
+        gender: 'male', 'female', or 'other'
+
+    Returns:
+        Dictionary with micronutrient RDA values
+    """
+    rdas = RDA_TABLE.get((rda_age_band(age), gender))
+    if rdas is None:
+        rdas = _calculate_rda_targets(age, gender)
+    return dict(rdas)
+
+def get_vitamin_target_rows(age, gender):
+    """
+    RDAs as vitamin_targets rows
+
+    Returns:
+        List of (nutrient display name, amount, unit), e.g. ('Vitamin C Mg', 90, 'mg')
+    """
+    return [
+        (nutrient.replace('_', ' ').title(), amount, 'mcg' if '_mcg' in nutrient else 'mg')
+        for nutrient, amount in get_rda_targets(age, gender).items()
+    ]
@@ -0,0 +1,217 @@
+"""
+Exercise-name autocomplete served from memory
+
+Each user's exercise history is summarized once (one row per exercise_key)
+into word-prefix and trigram indexes, so lookups while typing are answered
+from memory instead of searching the history. Indexes are built
+lazily, updated when an exercise is logged and dropped when exercises are
+deleted. Only the most recently used users are kept in memory.
+
+Every gunicorn worker has its own indexes. Triggers bump a per-user row in
+exercise_versions whenever that user's exercises are added, deleted or
+renamed, and each index is checked against it at most once every
+VERSION_CHECK_SECONDS - lookups in between never touch the database.
+"""
+import os
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import date
+from database import get_db
+from services import metrics
+from services.workout_service import normalize_exercise_name
+
+# Users whose indexes are kept in memory (least recently used are evicted)
+MAX_CACHED_USERS = int(os.getenv('EXERCISE_SUGGEST_MAX_USERS', 500))
+
+# Ranking: frequency decayed by time since last use
+RECENCY_HALF_LIFE_DAYS = 30
+
+# How often an index is checked against exercise_versions (changes made
+# through other workers show up within this long)
+VERSION_CHECK_SECONDS = int(os.getenv('EXERCISE_SUGGEST_CHECK_SECONDS', 5))
+
+# Trigram matches need at least this share of the query's trigrams
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+def trigrams(text):
+    """Trigrams of a normalized name, padded so short words still have some"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ExerciseIndex:
+    """Prefix and trigram index over one user's exercises"""
+
+    def __init__(self, version=0):
+        # exercise_versions value the index was built from, and when it was last compared
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.entries = {}
+        self.prefixes = defaultdict(set)
+        self.trigrams = defaultdict(set)
+
+    def add(self, exercise_key, name, category, count=1, last_used=None):
+        """Add an exercise, or count another use of one already indexed"""
+        entry = self.entries.get(exercise_key)
+        if entry:
+            entry['count'] += count
+            entry['exercise_name'] = name
+            entry['exercise_category'] = category
+            entry['last_used'] = max(entry['last_used'] or '', last_used or '') or None
+            return
+
+        self.entries[exercise_key] = {
+            'exercise_key': exercise_key,
+            'exercise_name': name,
+            'exercise_category': category,
+            'count': count,
+            'last_used': last_used
+        }
+        for word in exercise_key.split():
+            for end in range(1, len(word) + 1):
+                self.prefixes[word[:end]].add(exercise_key)
+        for gram in trigrams(exercise_key):
+            self.trigrams[gram].add(exercise_key)
+
+    def score(self, entry, today):
+        """Uses decayed by days since last use"""
+        try:
+            age_days = (today - date.fromisoformat(entry['last_used'][:10])).days
+        except (TypeError, ValueError):
+            age_days = 365
+        return entry['count'] * math.pow(0.5, max(age_days, 0) / RECENCY_HALF_LIFE_DAYS)
+
+    def search(self, query, limit=10):
+        """
+        Exercises matching a query
+
+        Every word of the query must prefix a word of the name ('inc ben'
+        finds 'incline bench press'). If nothing matches, names sharing enough
+        trigrams with the query are returned instead, to tolerate typos.
+        """
+        today = date.today()
+        words = normalize_exercise_name(query).split()
+
+        if not words:
+            matches = self.entries.keys()
+            similarity = {}
+        else:
+            matches = set.intersection(*(self.prefixes.get(word, set()) for word in words))
+            similarity = {}
+            if not matches:
+                query_grams = trigrams(' '.join(words))
+                shared = defaultdict(int)
+                for gram in query_grams:
+                    for exercise_key in self.trigrams.get(gram, ()):
+                        shared[exercise_key] += 1
+                similarity = {
+                    exercise_key: count / len(query_grams)
+                    for exercise_key, count in shared.items()
+                    if count / len(query_grams) >= MIN_TRIGRAM_SIMILARITY
+                }
+                matches = similarity.keys()
+
+        ranked = sorted(
+            (self.entries[exercise_key] for exercise_key in matches),
+            key=lambda entry: (similarity.get(entry['exercise_key'], 1), self.score(entry, today)),
+            reverse=True
+        )
+        return [dict(entry) for entry in ranked[:limit]]
+
+def exercise_version(conn, user_id):
+    """A user's exercise_versions counter (0 if their exercises never changed)"""
+    row = conn.execute('SELECT version FROM exercise_versions WHERE user_id = ?', [user_id]).fetchone()
+    return row[0] if row else 0
+
+def build_index(conn, user_id, version=0):
+    """Build a user's index from their exercise history (one grouped query)"""
+    index = ExerciseIndex(version)
+    # With a single MAX(), SQLite takes the bare columns from that row, so
+    # each exercise shows the name it was last logged under
+    rows = conn.execute(
+        '''SELECT exercise_key, exercise_name, exercise_category, COUNT(*),
+                  MAX(COALESCE(log_date, created_at))
+           FROM workout_exercises
+           WHERE user_id = ? AND exercise_key IS NOT NULL
+           GROUP BY exercise_key''',
+        [user_id]
+    ).fetchall()
+    for exercise_key, name, category, count, last_used in rows:
+        index.add(exercise_key, name, category, count, last_used)
+    return index
+
+def get_index(user_id):
+    """Get a user's index, building it on first use or when the database has changed"""
+    user_id = int(user_id)
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None and time.monotonic() - index.checked_at < VERSION_CHECK_SECONDS:
+            _indexes.move_to_end(user_id)
+            return index
+
+    with get_db() as conn:
+        version = exercise_version(conn, user_id)
+        if index is not None and index.version == version:
+            with _lock:
+                index.checked_at = time.monotonic()
+                if user_id in _indexes:
+                    _indexes.move_to_end(user_id)
+            return index
+
+        # Build outside the lock so other users' lookups aren't blocked
+        metrics.increment('workouts.suggest.index_builds')
+        index = build_index(conn, user_id, version)
+
+    with _lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_CACHED_USERS:
+            _indexes.popitem(last=False)
+            metrics.increment('workouts.suggest.evictions')
+        metrics.set_gauge('workouts.suggest.cached_users', len(_indexes))
+    return index
+
+def suggest(user_id, query, limit=10):
+    """Exercise suggestions for what the user has typed so far"""
+    index = get_index(user_id)
+    with _lock:
+        return index.search(query, limit)
+
+def note_exercise(exercise):
+    """Count a newly logged exercise in its user's index, if it's loaded"""
+    if exercise.get('user_id') is None or not exercise.get('exercise_key'):
+        return
+    user_id = int(exercise['user_id'])
+    with _lock:
+        if user_id not in _indexes:
+            return
+
+    with get_db() as conn:
+        version = exercise_version(conn, user_id)
+
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            index.add(
+                exercise['exercise_key'],
+                exercise['exercise_name'],
+                exercise.get('exercise_category'),
+                last_used=exercise.get('log_date') or exercise.get('created_at')
+            )
+            # Only this add happened since the index was checked - keep it
+            # current. Otherwise another worker changed something too and
+            # the next check rebuilds it.
+            if version == index.version + 1:
+                index.version = version
+
+def invalidate(user_ids):
+    """Drop users' indexes after exercises were deleted or rewritten"""
+    with _lock:
+        for user_id in user_ids:
+            if user_id is not None:
+                _indexes.pop(int(user_id), None)
+        metrics.set_gauge('workouts.suggest.cached_users', len(_indexes))
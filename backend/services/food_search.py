@@ -0,0 +1,77 @@
+"""
+Search the foods a user has logged through the food_search FTS5 index
+
+The index covers user_foods (one row per distinct food, kept up to date from
+food_entries by triggers), so a search only touches matching foods rather
+than every entry they were logged in. Results are ranked by how well they
+match (BM25), how often the food was logged and how recently.
+"""
+import re
+
+MAX_QUERY_TERMS = 8
+
+# A food used this many times gets half the maximum frequency boost
+FREQUENCY_HALF_USES = 3
+# A food last logged this many days ago gets half the recency boost of one logged today
+RECENCY_HALF_DAYS = 30
+
+# Boosts only use arithmetic (math functions aren't in every SQLite build).
+# bm25() is negative, lower is better.
+FOOD_SEARCH_SQL = '''
+    SELECT
+        uf.name,
+        uf.serving_size,
+        uf.calories,
+        uf.protein_g,
+        uf.carbs_g,
+        uf.fat_g,
+        uf.fiber_g,
+        uf.sugar_g,
+        uf.uses,
+        uf.last_used
+    FROM food_search
+    JOIN user_foods uf ON uf.id = food_search.rowid
+    WHERE food_search MATCH ? AND uf.user_id = ?
+    ORDER BY
+        bm25(food_search)
+        * (1 + uf.uses / (uf.uses + ?))
+        * (1 + ? / (? + MAX(julianday('now') - julianday(uf.last_used), 0)))
+    LIMIT ?'''
+
+def build_match_query(text):
+    """
+    Turn what the user typed into an FTS5 query
+
+    Every word becomes a quoted prefix term ("chick bre" -> "chick"* "bre"*),
+    so partial words match while typing and FTS syntax in the input is
+    treated as plain text. Returns None if there is nothing to search for.
+    """
+    terms = re.findall(r'\w+', (text or '').lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search_foods(conn, user_id, text, limit=10):
+    """
+    Foods from a user's history matching a search
+
+    Args:
+        conn: Open database connection
+        user_id: Whose foods to search
+        text: Search text, matched as word prefixes
+        limit: Maximum foods to return
+
+    Returns:
+        List of foods, best match first, with the nutrition they were last
+        logged with, uses (times logged) and last_used
+    """
+    match_query = build_match_query(text)
+    if not match_query:
+        return []
+
+    cur = conn.execute(FOOD_SEARCH_SQL, [
+        match_query, user_id, float(FREQUENCY_HALF_USES),
+        float(RECENCY_HALF_DAYS), float(RECENCY_HALF_DAYS), limit
+    ])
+    columns = [column[0] for column in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
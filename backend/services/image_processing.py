@@ -0,0 +1,216 @@
+"""
+Background image processing - uploads are stored raw and resized/optimized
+on a process pool, then the saved_images row is updated when ready
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from database import query_db, execute_db, get_db
+from services import metrics
+from services.image_service import process_image, delete_image_file, restore_content_file
+
+# Worker processes per app worker (0 processes uploads inside the request)
+IMAGE_PROCESS_WORKERS = int(os.getenv('IMAGE_PROCESS_WORKERS', 2))
+
+_executor = None
+_executor_lock = threading.Lock()
+_queue_depth = 0
+
+def get_executor():
+    """Get the image processing pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: workers don't inherit the app's threads, locks or DB connections
+            _executor = ProcessPoolExecutor(
+                max_workers=IMAGE_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+def reset_executor(broken):
+    """Drop a pool whose worker died so the next upload starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+def update_queue_depth(change):
+    """Track how many images are waiting for or being processed"""
+    global _queue_depth
+    with _executor_lock:
+        _queue_depth += change
+        metrics.set_gauge('images.processing.queue_depth', _queue_depth)
+
+def add_blob_reference(conn, processed):
+    """Count one more saved image pointing at a content-addressed file"""
+    conn.execute(
+        '''INSERT INTO image_blobs (content_hash, path, size_bytes, ref_count)
+           VALUES (?, ?, ?, 1)
+           ON CONFLICT(content_hash) DO UPDATE SET ref_count = ref_count + 1''',
+        [processed['content_hash'], processed['filename'], processed['size_bytes']]
+    )
+
+def release_images(conn, images):
+    """
+    Drop the file references held by saved image rows that are being deleted
+
+    Returns:
+        Filenames that are no longer referenced - delete them after the
+        transaction commits
+    """
+    unreferenced = []
+    for image in images:
+        content_hash = image.get('content_hash')
+        if not content_hash:
+            # Raw upload or stored before content addressing - the file is its own
+            unreferenced.append(image['image_path'])
+            continue
+
+        conn.execute(
+            'UPDATE image_blobs SET ref_count = ref_count - 1 WHERE content_hash = ?',
+            [content_hash]
+        )
+        blob = conn.execute(
+            'SELECT path, ref_count FROM image_blobs WHERE content_hash = ?',
+            [content_hash]
+        ).fetchone()
+        if blob and blob['ref_count'] <= 0:
+            conn.execute('DELETE FROM image_blobs WHERE content_hash = ?', [content_hash])
+            unreferenced.append(blob['path'])
+
+    return unreferenced
+
+def delete_files(filenames, upload_dir):
+    """
+    Delete image files (and their renditions) once the DB no longer references them
+
+    Each file is checked again under the database write lock: an upload of the
+    same content may have been marked ready since the caller committed, and
+    mark_ready holds the same lock while it makes sure the file exists.
+    """
+    for filename in filenames:
+        content_hash = os.path.splitext(os.path.basename(filename))[0]
+        try:
+            with get_db() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                referenced = conn.execute(
+                    'SELECT 1 FROM image_blobs WHERE content_hash = ?', [content_hash]
+                ).fetchone()
+                if not referenced:
+                    delete_image_file(filename, upload_dir)
+        except OSError as e:
+            print(f"Failed to delete image file {filename}: {e}")
+
+def mark_ready(image_id, raw_filename, processed, upload_dir):
+    """Point the image row at the processed, content-addressed file"""
+    with get_db() as conn:
+        cur = conn.execute(
+            """UPDATE saved_images SET image_path = ?, content_hash = ?, processing_status = 'ready'
+               WHERE id = ? AND image_path = ?""",
+            [processed['filename'], processed['content_hash'], image_id, raw_filename]
+        )
+        if cur.rowcount:
+            add_blob_reference(conn, processed)
+            # Still holding the write lock, so delete_files can't remove it after this
+            restore_content_file(processed['filename'], processed['data'], upload_dir)
+            return
+
+        # Image was deleted while processing - drop the file unless another image shares it
+        shared = conn.execute(
+            'SELECT 1 FROM image_blobs WHERE content_hash = ?', [processed['content_hash']]
+        ).fetchone()
+
+    if not shared:
+        delete_files([processed['filename']], upload_dir)
+
+def mark_failed(image_id, raw_filename):
+    """Record that an image couldn't be processed (the raw file is kept)"""
+    execute_db(
+        """UPDATE saved_images SET processing_status = 'failed'
+           WHERE id = ? AND image_path = ? AND processing_status = 'pending'""",
+        [image_id, raw_filename]
+    )
+
+def submit_image(image_id, raw_filename, upload_dir):
+    """Queue a raw upload for processing"""
+    if IMAGE_PROCESS_WORKERS <= 0:
+        try:
+            processed = process_image(raw_filename, upload_dir)
+            metrics.observe('images.processing.latency_ms', processed['elapsed_ms'])
+            mark_ready(image_id, raw_filename, processed, upload_dir)
+        except Exception as e:
+            print(f"Image processing failed for image {image_id}: {e}")
+            metrics.increment('images.processing.failed')
+            mark_failed(image_id, raw_filename)
+        return
+
+    submitted_at = time.perf_counter()
+    update_queue_depth(1)
+    metrics.increment('images.processing.submitted')
+
+    executor = get_executor()
+
+    def on_done(future):
+        update_queue_depth(-1)
+        try:
+            processed = future.result()
+            metrics.observe('images.processing.latency_ms', processed['elapsed_ms'])
+            metrics.observe('images.processing.total_ms', (time.perf_counter() - submitted_at) * 1000)
+            mark_ready(image_id, raw_filename, processed, upload_dir)
+            metrics.increment('images.processing.completed')
+        except Exception as e:
+            print(f"Image processing failed for image {image_id}: {e}")
+            metrics.increment('images.processing.failed')
+            mark_failed(image_id, raw_filename)
+            if isinstance(e, BrokenProcessPool):
+                reset_executor(executor)
+
+    executor.submit(process_image, raw_filename, upload_dir).add_done_callback(on_done)
+
+def start_requeue():
+    """Requeue unfinished uploads once at startup, on a background thread so startup isn't blocked"""
+    def run():
+        try:
+            requeue_pending_images()
+        except Exception as e:
+            print(f"Requeueing pending images failed: {e}")
+
+    threading.Thread(target=run, name='image-requeue', daemon=True).start()
+
+def claim_pending_image(image_id):
+    """
+    Take a stale pending upload for this worker
+
+    Every app worker requeues at startup. Resetting created_at moves the row
+    out of the stale window, so only the worker whose UPDATE matched processes
+    it (and if that worker dies, it's stale again five minutes later).
+    """
+    with get_db() as conn:
+        cur = conn.execute(
+            """UPDATE saved_images SET created_at = CURRENT_TIMESTAMP
+               WHERE id = ? AND processing_status = 'pending' AND created_at < datetime('now', '-5 minutes')""",
+            [image_id]
+        )
+        return cur.rowcount > 0
+
+def requeue_pending_images():
+    """Queue uploads left unprocessed by a previous worker (e.g. after a restart)"""
+    upload_dir = os.getenv('UPLOAD_DIR', './uploads')
+    # Skip fresh uploads - another app worker may still be processing them
+    pending = query_db(
+        """SELECT id, image_path FROM saved_images
+           WHERE processing_status = 'pending' AND created_at < datetime('now', '-5 minutes')"""
+    )
+
+    for image in pending:
+        if not claim_pending_image(image['id']):
+            continue  # Another app worker took it
+        if os.path.exists(os.path.join(upload_dir, image['image_path'])):
+            submit_image(image['id'], image['image_path'], upload_dir)
+        else:
+            mark_failed(image['id'], image['image_path'])
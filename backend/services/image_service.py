@@ -1,16 +1,42 @@
-from PIL import Image
+from PIL import Image, ImageOps, features
+import hashlib
+import io
+import math
 import os
+import time
+import uuid
 from datetime import datetime
 from werkzeug.utils import secure_filename
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
+# Stored images are at most this many px on the longest side
+MAX_IMAGE_SIZE = 1920
+
+# Smaller versions generated for galleries (max px on the longest side)
+RENDITION_SIZES = {
+    'thumb': 320,
+    'medium': 960
+}
+
+# WebP is much smaller for photos - fall back to JPEG if Pillow lacks it
+RENDITION_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+RENDITION_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_uploaded_image(file, upload_dir):
-    """Save and optimize an uploaded image"""
+# Marker in the filename of raw uploads that haven't been processed yet
+RAW_MARKER = '.upload'
+
+def store_upload(file, upload_dir):
+    """
+    Stream an uploaded file to disk as-is so the request can return quickly
+
+    Returns:
+        Filename of the raw upload (pass it to process_image)
+    """
     if not allowed_file(file.filename):
         raise ValueError('Invalid file type')
 
@@ -18,15 +44,73 @@ def save_uploaded_image(file, upload_dir):
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = secure_filename(file.filename)
     name, ext = os.path.splitext(filename)
-    unique_filename = f"{name}_{timestamp}{ext}"
+    raw_filename = f"{name}_{timestamp}_{uuid.uuid4().hex[:8]}{RAW_MARKER}{ext.lower()}"
 
     # Ensure upload directory exists
     os.makedirs(upload_dir, exist_ok=True)
 
-    filepath = os.path.join(upload_dir, unique_filename)
+    file.save(os.path.join(upload_dir, raw_filename))
+
+    return raw_filename
+
+def open_for_resize(path, max_size):
+    """
+    Open and decode an image that's about to be shrunk to max_size
+
+    JPEGs are decoded with DCT scaling (draft mode), so a 48 MP photo is
+    decoded at 1/2, 1/4 or 1/8 scale - never smaller than max_size - instead
+    of at full resolution. Phone photos are rotated upright from their EXIF
+    orientation.
+    """
+    with Image.open(path) as img:
+        if img.format == 'JPEG' and max(img.size) > max_size:
+            # Ask for the target box in the image's own aspect ratio, so the
+            # decoder can scale down as far as possible while staying >= max_size
+            scale = max_size / max(img.size)
+            img.draft('RGB', (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        img.load()
+        ImageOps.exif_transpose(img, in_place=True)
+        return img
+
+def content_path(content_hash, ext):
+    """Sharded relative path of a content-addressed file, e.g. ab/cd/abcd1234....jpg"""
+    return os.path.join(content_hash[:2], content_hash[2:4], f"{content_hash}{ext}")
+
+def find_content_file(content_hash, upload_dir):
+    """Find the stored file for a content hash without a DB lookup"""
+    for ext in ['.jpg', '.png', '.webp', '.gif']:
+        filename = content_path(content_hash, ext)
+        if os.path.exists(os.path.join(upload_dir, filename)):
+            return filename
+    return None
+
+def write_file_atomic(filepath, data):
+    """Write a file via a temp file so readers never see a partial write"""
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    # Unique per write - threads in one process may write the same content at once
+    tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, filepath)
+
+def process_image(raw_filename, upload_dir):
+    """
+    Resize and optimize a raw upload, store it by the SHA-256 of the processed
+    bytes, generate its renditions and remove the raw file. Runs in a worker
+    process, so it only touches files.
+
+    Returns:
+        Dictionary with filename (relative to upload_dir), content_hash,
+        size_bytes, elapsed_ms and data (the processed bytes, so the file can
+        be restored with restore_content_file)
+    """
+    start = time.perf_counter()
+    raw_path = os.path.join(upload_dir, raw_filename)
+    _, ext = os.path.splitext(raw_filename)
+    ext = '.jpg' if ext == '.jpeg' else ext
 
     # Open and optimize image
-    img = Image.open(file)
+    img = open_for_resize(raw_path, MAX_IMAGE_SIZE)
 
     # Convert RGBA to RGB if necessary
     if img.mode == 'RGBA':
@@ -35,17 +119,117 @@ def save_uploaded_image(file, upload_dir):
         img = background
 
     # Resize if too large (max 1920px on longest side)
-    max_size = 1920
-    if max(img.size) > max_size:
-        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    if max(img.size) > MAX_IMAGE_SIZE:
+        img.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.Resampling.LANCZOS)
 
-    # Save with optimization
-    img.save(filepath, quality=85, optimize=True)
+    # Encode with optimization, then address the file by its content
+    buffer = io.BytesIO()
+    img.save(buffer, Image.registered_extensions()[ext], quality=85, optimize=True)
+    data = buffer.getvalue()
+    content_hash = hashlib.sha256(data).hexdigest()
+    stored_filename = content_path(content_hash, ext)
 
-    return unique_filename
+    # An identical image is already stored - reuse it instead of writing a copy
+    filepath = os.path.join(upload_dir, stored_filename)
+    if not os.path.exists(filepath):
+        write_file_atomic(filepath, data)
 
-def delete_image_file(filename, upload_dir):
-    """Delete an image file"""
+    # Pre-generate gallery renditions from the already-decoded image
+    generate_renditions(img, stored_filename, upload_dir)
+
+    os.remove(raw_path)
+
+    return {
+        'filename': stored_filename,
+        'content_hash': content_hash,
+        'size_bytes': len(data),
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+        'data': data
+    }
+
+def restore_content_file(filename, data, upload_dir):
+    """
+    Rewrite a content-addressed file and its renditions if they're missing
+
+    process_image skips writing content that's already stored, but the last
+    other image using it may be deleted (and the file removed) before the
+    new image is marked ready.
+    """
     filepath = os.path.join(upload_dir, filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    if not os.path.exists(filepath):
+        write_file_atomic(filepath, data)
+
+    if any(not os.path.exists(os.path.join(upload_dir, rendition_filename(filename, size)))
+           for size in RENDITION_SIZES):
+        generate_renditions(open_for_resize(filepath, MAX_IMAGE_SIZE), filename, upload_dir)
+
+def is_raw_upload(filename):
+    """Whether a stored filename is a raw upload still waiting to be processed"""
+    return RAW_MARKER in filename
+
+def rendition_filename(filename, size, image_format=RENDITION_FORMAT):
+    """Filename of a rendition, stored alongside the original"""
+    name, _ = os.path.splitext(filename)
+    return f"{name}.{size}.{RENDITION_EXTENSIONS[image_format]}"
+
+def save_rendition(img, filename, upload_dir, size):
+    """Resize an image to a rendition size and save it atomically"""
+    rendition = img.copy()
+    if rendition.mode not in ('RGB', 'L'):
+        rendition = rendition.convert('RGB')
+    max_size = RENDITION_SIZES[size]
+    rendition.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+    filepath = os.path.join(upload_dir, rendition_filename(filename, size))
+    # Write to a temp file first so concurrent requests never see a partial file
+    tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+    rendition.save(tmp_path, RENDITION_FORMAT, quality=80)
+    os.replace(tmp_path, filepath)
+
+    return filepath
+
+def generate_renditions(img, filename, upload_dir):
+    """Generate all gallery renditions for an image that don't exist yet"""
+    for size in RENDITION_SIZES:
+        if not os.path.exists(os.path.join(upload_dir, rendition_filename(filename, size))):
+            save_rendition(img, filename, upload_dir, size)
+
+def get_rendition_path(filename, upload_dir, size):
+    """
+    Get the path of an image rendition, generating it if it's missing
+
+    Args:
+        filename: Stored filename of the original image
+        upload_dir: Upload directory
+        size: 'thumb', 'medium' or 'full' (raw uploads are always served in full)
+
+    Returns:
+        Path to the rendition, or None if the original doesn't exist
+    """
+    original_path = os.path.join(upload_dir, filename)
+    if size == 'full' or size not in RENDITION_SIZES or is_raw_upload(filename):
+        return original_path if os.path.exists(original_path) else None
+
+    # Renditions made before a format change (or without WebP) are still valid
+    for image_format in RENDITION_EXTENSIONS:
+        path = os.path.join(upload_dir, rendition_filename(filename, size, image_format))
+        if os.path.exists(path):
+            return path
+
+    if not os.path.exists(original_path):
+        return None
+
+    # Missing rendition (e.g. uploaded before renditions existed) - create and keep it
+    img = open_for_resize(original_path, RENDITION_SIZES[size])
+    return save_rendition(img, filename, upload_dir, size)
+
+def delete_image_file(filename, upload_dir):
+    """Delete an image file and its renditions"""
+    paths = [os.path.join(upload_dir, filename)]
+    for size in RENDITION_SIZES:
+        for image_format in RENDITION_EXTENSIONS:
+            paths.append(os.path.join(upload_dir, rendition_filename(filename, size, image_format)))
+
+    for filepath in paths:
+        if os.path.exists(filepath):
+            os.remove(filepath)
@@ -0,0 +1,81 @@
+"""
+Lightweight in-process metrics: counters, gauges and latency samples
+
+Metrics live in the memory of each worker process, so with several gunicorn
+workers every worker reports its own numbers.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Number of recent samples kept per timing metric for percentile calculations
+MAX_SAMPLES = 1000
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+_timings = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+def increment(name, amount=1):
+    """Increase a counter"""
+    with _lock:
+        _counters[name] += amount
+
+def set_gauge(name, value):
+    """Set a gauge to its current value"""
+    with _lock:
+        _gauges[name] = value
+
+def observe(name, value_ms):
+    """Record a latency sample in milliseconds"""
+    with _lock:
+        _timings[name].append(value_ms)
+
+@contextmanager
+def timer(name):
+    """Time the wrapped block and record it as a latency sample"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000)
+
+def get_counter(name):
+    """Get the current value of a counter"""
+    with _lock:
+        return _counters.get(name, 0)
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize_timing(samples):
+    """Summarize latency samples as count/p50/p95/max"""
+    samples = list(samples)
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50), 2) if samples else None,
+        'p95_ms': round(percentile(samples, 95), 2) if samples else None,
+        'max_ms': round(max(samples), 2) if samples else None
+    }
+
+def snapshot(prefix=None):
+    """Get all metrics, optionally only those whose name starts with prefix"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        timings = {name: list(samples) for name, samples in _timings.items()}
+
+    def matches(name):
+        return prefix is None or name.startswith(prefix)
+
+    return {
+        'counters': {k: v for k, v in sorted(counters.items()) if matches(k)},
+        'gauges': {k: v for k, v in sorted(gauges.items()) if matches(k)},
+        'timings': {k: summarize_timing(v) for k, v in sorted(timings.items()) if matches(k)}
+    }
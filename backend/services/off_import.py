@@ -0,0 +1,125 @@
+"""
+Streaming importer for OpenFoodFacts data dumps into the local off_products table
+
+Reads the JSONL dump (openfoodfacts-products.jsonl.gz) or the tab-separated
+CSV export (en.openfoodfacts.org.products.csv.gz) one product at a time, keeps
+only the fields the barcode lookup needs, and inserts them in batches so memory
+stays bounded no matter how large the dump is.
+
+Usage (from the backend directory):
+    python -m services.off_import /path/to/openfoodfacts-products.jsonl.gz
+    python -m services.off_import /path/to/en.openfoodfacts.org.products.csv.gz --batch-size 10000
+"""
+import argparse
+import csv
+import gzip
+import json
+import sqlite3
+import sys
+import time
+from database import DATABASE_PATH, apply_schema
+from services.barcode_service import NUTRIENT_FIELDS, extract_product_fields
+
+DEFAULT_BATCH_SIZE = 5000
+
+COLUMNS = ['barcode', 'name', 'brand', 'serving_size', 'image_url'] + list(NUTRIENT_FIELDS.keys())
+
+INSERT_SQL = f'''INSERT OR REPLACE INTO off_products ({', '.join(COLUMNS)})
+                 VALUES ({', '.join('?' * len(COLUMNS))})'''
+
+def open_dump(path):
+    """Open a dump file as text, transparently decompressing .gz files"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+def iter_jsonl_products(f):
+    """Yield (barcode, product) pairs from a JSONL dump"""
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            product = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        yield product.get('code'), product
+
+def iter_csv_products(f):
+    """Yield (barcode, product) pairs from the tab-separated CSV export"""
+    # Some product descriptions are far longer than the csv module's default limit
+    csv.field_size_limit(sys.maxsize)
+    nutriment_keys = [key for key, _ in NUTRIENT_FIELDS.values()]
+
+    for row in csv.DictReader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+        product = {
+            'product_name': row.get('product_name'),
+            'brands': row.get('brands'),
+            'serving_size': row.get('serving_size'),
+            'image_url': row.get('image_url'),
+            'nutriments': {key: row.get(key) for key in nutriment_keys}
+        }
+        yield row.get('code'), product
+
+def iter_product_rows(path):
+    """Yield insert-ready rows for every usable product in a dump"""
+    is_csv = '.csv' in path or '.tsv' in path
+
+    with open_dump(path) as f:
+        products = iter_csv_products(f) if is_csv else iter_jsonl_products(f)
+        for barcode, product in products:
+            barcode = (barcode or '').strip()
+            if not barcode or not product.get('product_name'):
+                continue
+
+            fields = extract_product_fields(product)
+            yield [barcode] + [fields[column] for column in COLUMNS[1:]]
+
+def import_dump(path, batch_size=DEFAULT_BATCH_SIZE, database_path=DATABASE_PATH):
+    """
+    Import an OpenFoodFacts dump into off_products
+
+    Args:
+        path: Path to a .jsonl/.csv dump (optionally gzipped)
+        batch_size: Number of products inserted per transaction
+        database_path: SQLite database to import into
+
+    Returns:
+        Number of products imported
+    """
+    conn = sqlite3.connect(database_path)
+    apply_schema(conn)
+    # Bulk load - a crash mid-import only loses the mirror, which can be re-imported
+    conn.execute('PRAGMA synchronous = OFF')
+
+    imported = 0
+    batch = []
+    start = time.time()
+
+    try:
+        for row in iter_product_rows(path):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                conn.executemany(INSERT_SQL, batch)
+                conn.commit()
+                imported += len(batch)
+                batch = []
+                print(f"Imported {imported} products ({imported / (time.time() - start):.0f}/s)")
+
+        if batch:
+            conn.executemany(INSERT_SQL, batch)
+            conn.commit()
+            imported += len(batch)
+    finally:
+        conn.close()
+
+    print(f"Import complete: {imported} products in {time.time() - start:.1f}s")
+    return imported
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import an OpenFoodFacts dump into the local product mirror')
+    parser.add_argument('path', help='Path to the JSONL or CSV dump (.gz supported)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    import_dump(args.path, args.batch_size)
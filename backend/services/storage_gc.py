@@ -0,0 +1,305 @@
+"""
+Garbage collector for the uploads directory
+
+Walks UPLOAD_DIR in batches and checks each file against the saved_images
+and image_blobs tables. Files nothing references (failed uploads, files left
+behind by crashes, renditions of deleted images) are moved to a quarantine
+directory first and only deleted once they've sat there for
+GC_QUARANTINE_DAYS, so a bad run can be undone by moving files back. Each
+pass also trims the AI analysis cache, which nothing else removes rows from.
+
+Usage (from the backend directory):
+    python -m services.storage_gc --dry-run    # report reclaimable space only
+    python -m services.storage_gc              # quarantine orphans, purge expired quarantine
+"""
+import argparse
+import fcntl
+import os
+import threading
+import time
+from database import get_db
+from services import metrics
+from services.image_service import ALLOWED_EXTENSIONS, RENDITION_SIZES
+
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', './uploads')
+
+# Files younger than this are never touched - they may belong to an upload in progress
+GC_MIN_AGE_HOURS = float(os.getenv('GC_MIN_AGE_HOURS', 24))
+
+# How long orphans stay in quarantine before they're deleted
+GC_QUARANTINE_DAYS = float(os.getenv('GC_QUARANTINE_DAYS', 7))
+
+# How often the background collector runs in each app worker (0 disables it)
+GC_INTERVAL_HOURS = float(os.getenv('GC_INTERVAL_HOURS', 24))
+
+# Delay before the first run after startup, so frequent deploys don't keep
+# pushing the next run back by a whole interval
+GC_STARTUP_DELAY_MINUTES = float(os.getenv('GC_STARTUP_DELAY_MINUTES', 5))
+
+# Files checked against the database per query
+GC_BATCH_SIZE = 500
+
+# Cached AI analyses older than this are dropped, and only the newest
+# AI_CACHE_MAX_ENTRIES are kept
+AI_CACHE_MAX_DAYS = float(os.getenv('AI_CACHE_MAX_DAYS', 90))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 10000))
+
+QUARANTINE_DIR = '.quarantine'
+LOCK_FILE = '.gc.lock'
+
+_scheduler = None
+
+def iter_files(root, skip_dirs=()):
+    """Yield (relative path, size, mtime) for every file under root, one directory at a time"""
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in skip_dirs:
+                        pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and entry.name != LOCK_FILE:
+                    stat = entry.stat(follow_symlinks=False)
+                    relative_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                    yield relative_path, stat.st_size, stat.st_mtime
+
+def iter_batches(items, size):
+    """Group an iterator into lists of at most size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def owner_candidates(relative_path):
+    """
+    Stored filenames that would make a file referenced
+
+    An original is referenced by its own name. A rendition (name.thumb.webp)
+    belongs to name.<ext> for whichever extension the original has.
+    """
+    if relative_path.endswith('.tmp'):
+        # Half-written file from a crashed write - never referenced
+        return []
+
+    stem, _ = os.path.splitext(relative_path)
+    base, size = os.path.splitext(stem)
+    if size[1:] in RENDITION_SIZES:
+        return [f"{base}.{ext}" for ext in ALLOWED_EXTENSIONS]
+
+    return [relative_path]
+
+def find_referenced(conn, filenames):
+    """Which of the given stored filenames the database still points at"""
+    if not filenames:
+        return set()
+
+    placeholders = ','.join('?' * len(filenames))
+    rows = conn.execute(
+        f'''SELECT image_path FROM saved_images WHERE image_path IN ({placeholders})
+            UNION
+            SELECT path FROM image_blobs WHERE path IN ({placeholders})''',
+        filenames + filenames
+    )
+    return {row[0] for row in rows}
+
+def find_orphans(conn, batch):
+    """Files in a batch of (relative path, size, mtime) that nothing references"""
+    candidates = {path: owner_candidates(path) for path, _, _ in batch}
+    referenced = find_referenced(conn, sorted({c for owners in candidates.values() for c in owners}))
+    return [item for item in batch if not referenced.intersection(candidates[item[0]])]
+
+def move_file(src, dst):
+    """Move a file, creating the destination directory and pruning emptied shard directories"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    os.replace(src, dst)
+    try:
+        os.removedirs(os.path.dirname(src))
+    except OSError:
+        pass  # Directory not empty (or it's the root)
+
+def count_missing_files(conn, upload_dir):
+    """Number of image rows whose file is no longer on disk"""
+    missing = 0
+    for row in conn.execute('SELECT image_path FROM saved_images'):
+        if not os.path.exists(os.path.join(upload_dir, row['image_path'])):
+            missing += 1
+    return missing
+
+def collect_orphans(conn, upload_dir, quarantine_dir, report, dry_run):
+    """Quarantine unreferenced files older than GC_MIN_AGE_HOURS"""
+    cutoff = time.time() - GC_MIN_AGE_HOURS * 3600
+    files = iter_files(upload_dir, skip_dirs={QUARANTINE_DIR})
+
+    for batch in iter_batches(files, GC_BATCH_SIZE):
+        report['scanned_files'] += len(batch)
+        report['scanned_bytes'] += sum(size for _, size, _ in batch)
+
+        old_files = [item for item in batch if item[2] < cutoff]
+        for path, size, _ in find_orphans(conn, old_files):
+            report['orphaned_files'] += 1
+            report['orphaned_bytes'] += size
+            if dry_run:
+                continue
+
+            target = os.path.join(quarantine_dir, path)
+            try:
+                move_file(os.path.join(upload_dir, path), target)
+                # Quarantine time starts now, not when the file was written
+                os.utime(target)
+                report['quarantined_files'] += 1
+            except OSError as e:
+                print(f"Failed to quarantine {path}: {e}")
+
+def purge_quarantine(conn, upload_dir, quarantine_dir, report, dry_run):
+    """Delete expired quarantined files, restoring any that became referenced again"""
+    cutoff = time.time() - GC_QUARANTINE_DAYS * 86400
+
+    for batch in iter_batches(iter_files(quarantine_dir), GC_BATCH_SIZE):
+        orphans = {item[0] for item in find_orphans(conn, batch)}
+
+        for path, size, mtime in batch:
+            if path not in orphans:
+                # Referenced again (e.g. the database was restored from a backup)
+                report['restored_files'] += 1
+                if not dry_run:
+                    move_file(os.path.join(quarantine_dir, path), os.path.join(upload_dir, path))
+                continue
+
+            if mtime >= cutoff:
+                report['quarantine_bytes'] += size
+                continue
+
+            report['purged_files'] += 1
+            report['purged_bytes'] += size
+            if not dry_run:
+                try:
+                    os.remove(os.path.join(quarantine_dir, path))
+                except OSError as e:
+                    print(f"Failed to delete {path}: {e}")
+
+def prune_analysis_cache(conn, report, dry_run):
+    """Drop expired AI analysis cache entries and trim the cache to AI_CACHE_MAX_ENTRIES"""
+    expired = f"created_at < datetime('now', '-{AI_CACHE_MAX_DAYS} days')"
+    overflow = '''cache_key NOT IN (
+        SELECT cache_key FROM ai_analysis_cache ORDER BY created_at DESC LIMIT ?
+    )'''
+    if dry_run:
+        report['pruned_cache_entries'] = conn.execute(
+            f'SELECT COUNT(*) FROM ai_analysis_cache WHERE {expired} OR {overflow}',
+            [AI_CACHE_MAX_ENTRIES]
+        ).fetchone()[0]
+    else:
+        report['pruned_cache_entries'] = conn.execute(
+            f'DELETE FROM ai_analysis_cache WHERE {expired} OR {overflow}',
+            [AI_CACHE_MAX_ENTRIES]
+        ).rowcount
+
+def run_gc(upload_dir=UPLOAD_DIR, dry_run=False):
+    """
+    Reconcile the uploads directory against the database
+
+    Args:
+        upload_dir: Directory images are stored in
+        dry_run: Only report what would be quarantined and purged
+
+    Returns:
+        Report dictionary, or None if another process is already collecting
+    """
+    if not os.path.isdir(upload_dir):
+        return None
+
+    # Several app workers each run the scheduler - only one collects at a time
+    lock = open(os.path.join(upload_dir, LOCK_FILE), 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+
+    report = {
+        'dry_run': dry_run,
+        'scanned_files': 0,
+        'scanned_bytes': 0,
+        'orphaned_files': 0,
+        'orphaned_bytes': 0,
+        'quarantined_files': 0,
+        'restored_files': 0,
+        'purged_files': 0,
+        'purged_bytes': 0,
+        'quarantine_bytes': 0,
+        'missing_files': 0,
+        'pruned_cache_entries': 0
+    }
+    start = time.perf_counter()
+    quarantine_dir = os.path.join(upload_dir, QUARANTINE_DIR)
+
+    try:
+        with get_db() as conn:
+            purge_quarantine(conn, upload_dir, quarantine_dir, report, dry_run)
+            collect_orphans(conn, upload_dir, quarantine_dir, report, dry_run)
+            report['missing_files'] = count_missing_files(conn, upload_dir)
+            prune_analysis_cache(conn, report, dry_run)
+    finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+    report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    # Space that's reclaimable now or already waiting in quarantine
+    reclaimable = report['quarantine_bytes'] + report['orphaned_bytes']
+    if dry_run:
+        reclaimable += report['purged_bytes']
+    else:
+        metrics.increment('storage.gc.purged_bytes', report['purged_bytes'])
+        metrics.increment('storage.gc.pruned_cache_entries', report['pruned_cache_entries'])
+    metrics.set_gauge('storage.gc.reclaimable_bytes', reclaimable)
+    metrics.set_gauge('storage.gc.missing_files', report['missing_files'])
+    metrics.observe('storage.gc.latency_ms', report['elapsed_ms'])
+
+    return report
+
+def start_gc_scheduler():
+    """Run the collector shortly after startup, then every GC_INTERVAL_HOURS, on a background thread"""
+    global _scheduler
+    if GC_INTERVAL_HOURS <= 0 or _scheduler is not None:
+        return
+
+    def loop():
+        delay = GC_STARTUP_DELAY_MINUTES * 60
+        while True:
+            time.sleep(delay)
+            delay = GC_INTERVAL_HOURS * 3600
+            try:
+                report = run_gc()
+                if report:
+                    print(f"Storage GC: quarantined {report['quarantined_files']} files "
+                          f"({report['orphaned_bytes']} bytes), purged {report['purged_files']} files "
+                          f"({report['purged_bytes']} bytes), pruned {report['pruned_cache_entries']} cached analyses")
+            except Exception as e:
+                print(f"Storage GC failed: {e}")
+
+    _scheduler = threading.Thread(target=loop, name='storage-gc', daemon=True)
+    _scheduler.start()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Quarantine and delete unreferenced files in the uploads directory')
+    parser.add_argument('--upload-dir', default=UPLOAD_DIR)
+    parser.add_argument('--dry-run', action='store_true', help='Only report reclaimable space')
+    args = parser.parse_args()
+
+    report = run_gc(args.upload_dir, dry_run=args.dry_run)
+    if report is None:
+        print('Another garbage collection is running (or the upload directory does not exist)')
+    else:
+        for key, value in report.items():
+            print(f"{key}: {value}")
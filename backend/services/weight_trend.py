@@ -0,0 +1,164 @@
+"""
+Daily weights and their smoothed trend (exponentially weighted moving
+average, as in The Hacker's Diet) kept in the weight_trend table, and LTTB
+downsampling so charts get a fixed number of points however long the
+history is
+"""
+from datetime import date
+
+# Share of the gap between the trend and each day's weight closed per day
+TREND_SMOOTHING = 0.1
+
+DEFAULT_CHART_POINTS = 200
+MAX_CHART_POINTS = 2000
+
+def day_smoothing(gap_days):
+    """Smoothing for a reading gap_days after the previous one (missing days count as no change)"""
+    return 1 - (1 - TREND_SMOOTHING) ** max(gap_days, 1)
+
+def refresh_trend(conn, user_id, from_date):
+    """
+    Recompute a user's trend from from_date onwards
+
+    The trend continues from the last day before from_date, so logging today
+    only touches today's row; only backdated changes recompute the days after
+    them.
+    """
+    previous = conn.execute(
+        '''SELECT date, trend_kg FROM weight_trend
+           WHERE user_id = ? AND date < ?
+           ORDER BY date DESC LIMIT 1''',
+        [user_id, from_date]
+    ).fetchone()
+    days = conn.execute(
+        '''SELECT date, weight_kg FROM weight_logs
+           WHERE user_id = ? AND date >= ?
+           ORDER BY date''',
+        [user_id, from_date]
+    ).fetchall()
+
+    rows = []
+    last_date, trend = (date.fromisoformat(previous[0]), previous[1]) if previous else (None, None)
+    for day, weight in days:
+        current = date.fromisoformat(day)
+        if trend is None:
+            trend = weight
+        else:
+            trend += day_smoothing((current - last_date).days) * (weight - trend)
+        rows.append((user_id, day, weight, trend))
+        last_date = current
+
+    conn.execute('DELETE FROM weight_trend WHERE user_id = ? AND date >= ?', [user_id, from_date])
+    conn.executemany(
+        'INSERT INTO weight_trend (user_id, date, weight_kg, trend_kg) VALUES (?, ?, ?, ?)',
+        rows
+    )
+
+def record_weight(conn, user_id, day, weight_kg, notes=None, recorded_at=None):
+    """
+    Set a user's weight for a day and update the trend
+
+    weight_logs holds one row per day - logging again the same day updates it.
+    With recorded_at, the weigh-in is also kept in weight_readings.
+
+    Returns:
+        The day's weight log row
+    """
+    if recorded_at:
+        conn.execute(
+            '''INSERT INTO weight_readings (user_id, date, weight_kg, notes, recorded_at)
+               VALUES (?, ?, ?, ?, ?)''',
+            [user_id, day, weight_kg, notes, recorded_at]
+        )
+    conn.execute(
+        '''INSERT INTO weight_logs (user_id, date, weight_kg, notes)
+           VALUES (?, ?, ?, ?)
+           ON CONFLICT (user_id, date) DO UPDATE SET
+               weight_kg = excluded.weight_kg,
+               notes = COALESCE(excluded.notes, notes)''',
+        [user_id, day, weight_kg, notes]
+    )
+    refresh_trend(conn, user_id, day)
+    return conn.execute(
+        'SELECT * FROM weight_logs WHERE user_id = ? AND date = ?',
+        [user_id, day]
+    ).fetchone()
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Keeps the first and last points, and from each bucket in between the
+    point forming the largest triangle with the previously kept point and the
+    average of the next bucket - which preserves the visible shape of a line.
+
+    Args:
+        points: List of (x, y) sorted by x
+        threshold: Number of points to keep
+
+    Returns:
+        Indexes of the kept points
+    """
+    n = len(points)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+
+    kept = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, n)
+        if next_start >= n - 1:
+            avg_x, avg_y = points[n - 1]
+        else:
+            span = points[next_start:next_end]
+            avg_x = sum(x for x, _ in span) / len(span)
+            avg_y = sum(y for _, y in span) / len(span)
+
+        prev_x, prev_y = points[previous]
+        best, best_area = start, -1
+        for i in range(start, end):
+            x, y = points[i]
+            area = abs((prev_x - avg_x) * (y - prev_y) - (prev_x - x) * (avg_y - prev_y))
+            if area > best_area:
+                best, best_area = i, area
+        kept.append(best)
+        previous = best
+
+    kept.append(n - 1)
+    return kept
+
+def get_trend(conn, user_id, start_date=None, end_date=None, max_points=DEFAULT_CHART_POINTS):
+    """
+    Daily weight and trend for a chart, downsampled to at most max_points
+
+    Returns:
+        Dictionary with points (date, weight_kg, trend_kg) and days (number
+        of logged days in the range before downsampling)
+    """
+    rows = conn.execute(
+        '''SELECT date, weight_kg, trend_kg FROM weight_trend
+           WHERE user_id = ? AND date BETWEEN ? AND ?
+           ORDER BY date''',
+        [user_id, start_date or '0000-01-01', end_date or '9999-12-31']
+    ).fetchall()
+
+    # Downsample on the trend line, with x as day numbers so gaps count
+    series = [(date.fromisoformat(row[0]).toordinal(), row[2]) for row in rows]
+    kept = lttb(series, max_points)
+
+    return {
+        'days': len(rows),
+        'points': [
+            {'date': rows[i][0], 'weight_kg': round(rows[i][1], 2), 'trend_kg': round(rows[i][2], 2)}
+            for i in kept
+        ]
+    }
@@ -0,0 +1,231 @@
+"""
+Training-load analytics over a user's workout history
+
+Loads the requested window with one query into NumPy arrays and computes
+weekly volume per category, average intensity, acute:chronic workload ratio
+and e1RM progression without Python loops over the history.
+"""
+from datetime import date, timedelta
+import numpy as np
+
+# Requests slower than this are logged (checked by benchmarks/bench_workout_analytics.py)
+ANALYTICS_LATENCY_BUDGET_MS = 250
+
+# Rolling windows for the acute:chronic workload ratio
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+# e1RM curves returned when no exercises are requested
+DEFAULT_PROGRESSION_EXERCISES = 5
+
+# Best e1RM of an exercise's sets - same formulas as workout_service.estimate_one_rep_max
+# (Brzycki up to 10 reps, Epley above)
+E1RM_SQL = '''MAX(CASE
+    WHEN ws.weight_kg IS NULL OR ws.weight_kg <= 0 OR ws.reps <= 0 THEN NULL
+    WHEN ws.reps = 1 THEN ws.weight_kg
+    WHEN ws.reps <= 10 THEN ws.weight_kg * 36.0 / (37 - ws.reps)
+    ELSE ws.weight_kg * (1 + ws.reps / 30.0)
+END)'''
+
+def load_history(conn, user_id, start_date, end_date):
+    """
+    Load a user's training between two dates as column arrays
+
+    Sets are summed per logged exercise inside SQLite, so the query returns
+    one row per exercise instead of one per set - building Python rows for
+    every set would dominate the run time on large histories.
+
+    Returns:
+        Dictionary of arrays with one entry per logged exercise: day (days
+        since start_date), volume, weighted_reps, rpe_sum, rpe_count,
+        best_e1rm (NaN without weighted sets), plus category and exercise as
+        integer codes with their names in categories/exercises. None if
+        nothing was logged.
+    """
+    rows = conn.execute(
+        f'''SELECT
+               we.log_date,
+               we.exercise_category,
+               we.exercise_key,
+               COUNT(*),
+               COALESCE(SUM(ws.reps * ws.weight_kg), 0),
+               COALESCE(SUM(CASE WHEN ws.weight_kg IS NOT NULL THEN ws.reps END), 0),
+               COALESCE(SUM(ws.rpe), 0),
+               COUNT(ws.rpe),
+               {E1RM_SQL}
+           FROM workout_exercises we
+           JOIN workout_sets ws ON ws.workout_exercise_id = we.id
+           WHERE we.user_id = ? AND we.log_date BETWEEN ? AND ?
+           GROUP BY we.id''',
+        [user_id, start_date.isoformat(), end_date.isoformat()]
+    ).fetchall()
+
+    if not rows:
+        return None
+
+    log_date, category, exercise, set_count, volume, weighted_reps, rpe_sum, rpe_count, best_e1rm = zip(*rows)
+
+    # Names to integer codes (cheaper than np.unique on object arrays)
+    category_codes, exercise_codes = {}, {}
+    category = [category_codes.setdefault(name or 'other', len(category_codes)) for name in category]
+    exercise = [exercise_codes.setdefault(name, len(exercise_codes)) for name in exercise]
+
+    return {
+        # Date parsing in NumPy is much cheaper than julianday() per row
+        'day': (np.array(log_date, dtype='datetime64[D]') - np.datetime64(start_date)).astype(np.int64),
+        'set_count': np.array(set_count, dtype=np.int64),
+        'volume': np.array(volume, dtype=np.float64),
+        'weighted_reps': np.array(weighted_reps, dtype=np.float64),
+        'rpe_sum': np.array(rpe_sum, dtype=np.float64),
+        'rpe_count': np.array(rpe_count, dtype=np.int64),
+        'best_e1rm': np.array(best_e1rm, dtype=np.float64),  # None becomes NaN
+        'category': np.array(category, dtype=np.int64),
+        'categories': list(category_codes),
+        'exercise': np.array(exercise, dtype=np.int64),
+        'exercises': list(exercise_codes)
+    }
+
+def rolling_mean(values, window):
+    """Trailing rolling mean (shorter windows at the start)"""
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+def weekly_volume(history, n_weeks):
+    """Volume per category per week as a (categories x weeks) matrix"""
+    week = history['day'] // 7
+    n_categories = len(history['categories'])
+    flat = np.bincount(
+        history['category'] * n_weeks + week, weights=history['volume'], minlength=n_categories * n_weeks
+    )
+    return flat.reshape(n_categories, n_weeks)
+
+def weekly_intensity(history, n_weeks):
+    """Average load per rep (kg) and average RPE per week"""
+    week = history['day'] // 7
+    volume = np.bincount(week, weights=history['volume'], minlength=n_weeks)
+    reps = np.bincount(week, weights=history['weighted_reps'], minlength=n_weeks)
+    rpe_sum = np.bincount(week, weights=history['rpe_sum'], minlength=n_weeks)
+    rpe_count = np.bincount(week, weights=history['rpe_count'], minlength=n_weeks)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return volume / reps, rpe_sum / rpe_count
+
+def workload_ratio(daily_load):
+    """Acute (7-day) over chronic (28-day) average daily load, NaN without chronic load"""
+    acute = rolling_mean(daily_load, ACUTE_DAYS)
+    chronic = rolling_mean(daily_load, CHRONIC_DAYS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(chronic > 0, acute / chronic, np.nan)
+
+def e1rm_progression(history, exercise_codes, start_date):
+    """
+    Best e1RM per training day and the running best for each exercise
+
+    Logged exercises are sorted by (exercise, day) once, then the per-day
+    best is a maximum.reduceat over the boundaries of each (exercise, day)
+    group.
+    """
+    selected = np.isin(history['exercise'], exercise_codes) & ~np.isnan(history['best_e1rm'])
+    exercise = history['exercise'][selected]
+    day = history['day'][selected]
+    e1rm = history['best_e1rm'][selected]
+
+    if not len(e1rm):
+        return {}
+
+    order = np.lexsort((day, exercise))
+    exercise, day, e1rm = exercise[order], day[order], e1rm[order]
+
+    group_starts = np.flatnonzero(np.r_[True, (exercise[1:] != exercise[:-1]) | (day[1:] != day[:-1])])
+    group_exercise = exercise[group_starts]
+    group_day = day[group_starts]
+    group_best = np.maximum.reduceat(e1rm, group_starts)
+
+    progression = {}
+    for code in np.unique(group_exercise):
+        in_exercise = group_exercise == code
+        days = group_day[in_exercise]
+        best = group_best[in_exercise]
+        progression[history['exercises'][code]] = {
+            'dates': [(start_date + timedelta(days=int(d))).isoformat() for d in days],
+            'e1rm_kg': np.round(best, 1).tolist(),
+            'best_e1rm_kg': np.round(np.maximum.accumulate(best), 1).tolist()
+        }
+    return progression
+
+def to_list(values, decimals=1):
+    """Round an array for JSON, with NaN as None"""
+    rounded = np.round(values, decimals)
+    return [None if np.isnan(v) else float(v) for v in rounded]
+
+def compute_analytics(conn, user_id, days=365, exercise_keys=None, end_date=None):
+    """
+    Training-load analytics for the last `days` days
+
+    Args:
+        conn: Open database connection
+        user_id: User to analyze
+        days: Length of the window, ending at end_date (default today)
+        exercise_keys: Exercises to return e1RM curves for (default: the
+            most trained ones)
+
+    Returns:
+        Dictionary with weeks, weekly_volume (per category), intensity,
+        acwr and e1rm_progression
+    """
+    end_date = end_date or date.today()
+    # Start on a Monday so weeks line up with the calendar
+    start_date = end_date - timedelta(days=days - 1)
+    start_date -= timedelta(days=start_date.weekday())
+    n_days = (end_date - start_date).days + 1
+    n_weeks = (n_days + 6) // 7
+    weeks = [(start_date + timedelta(weeks=w)).isoformat() for w in range(n_weeks)]
+
+    history = load_history(conn, user_id, start_date, end_date)
+    if history is None:
+        return {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'set_count': 0,
+            'weeks': weeks,
+            'weekly_volume': {},
+            'intensity': {'avg_load_kg': [None] * n_weeks, 'avg_rpe': [None] * n_weeks},
+            'acwr': {'current': None, 'weekly': [None] * n_weeks},
+            'e1rm_progression': {}
+        }
+
+    volume_by_category = weekly_volume(history, n_weeks)
+    avg_load, avg_rpe = weekly_intensity(history, n_weeks)
+
+    daily_load = np.bincount(history['day'], weights=history['volume'], minlength=n_days)
+    acwr = workload_ratio(daily_load)
+    # Ratio as of the last day of each week (or today for the current week)
+    week_ends = np.minimum(np.arange(n_weeks) * 7 + 6, n_days - 1)
+
+    if exercise_keys:
+        codes = [history['exercises'].index(key) for key in exercise_keys if key in history['exercises']]
+    else:
+        set_counts = np.bincount(history['exercise'], weights=history['set_count'])
+        codes = np.argsort(set_counts)[::-1][:DEFAULT_PROGRESSION_EXERCISES]
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'set_count': int(history['set_count'].sum()),
+        'weeks': weeks,
+        'weekly_volume': {
+            category: to_list(volume_by_category[i], 0)
+            for i, category in enumerate(history['categories'])
+        },
+        'intensity': {
+            'avg_load_kg': to_list(avg_load),
+            'avg_rpe': to_list(avg_rpe)
+        },
+        'acwr': {
+            'current': to_list(acwr[-1:], 2)[0],
+            'weekly': to_list(acwr[week_ends], 2)
+        },
+        'e1rm_progression': e1rm_progression(history, np.asarray(codes, dtype=np.int64), start_date)
+    }
@@ -0,0 +1,470 @@
+"""
+Workout helpers: canonical exercise names, personal records and loading
+sessions with their exercises and sets
+"""
+import re
+
+def normalize_exercise_name(name):
+    """Normalize an exercise name for matching: 'Pull-Up ' -> 'pull up'"""
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', (name or '').lower()).split())
+
+def resolve_exercise_key(conn, name):
+    """Canonical exercise_key for a name the user typed, following aliases"""
+    normalized = normalize_exercise_name(name)
+    alias = conn.execute(
+        'SELECT exercise_key FROM exercise_aliases WHERE alias = ?', [normalized]
+    ).fetchone()
+    return alias[0] if alias else normalized
+
+def register_exercise(conn, name, category=None):
+    """Resolve an exercise's key, adding it to the catalog if it's new"""
+    exercise_key = resolve_exercise_key(conn, name)
+    conn.execute(
+        'INSERT OR IGNORE INTO exercise_catalog (exercise_key, name, category) VALUES (?, ?, ?)',
+        [exercise_key, name.strip(), category]
+    )
+    return exercise_key
+
+def add_exercise(conn, session_id, data, order_index=None):
+    """
+    Insert an exercise into a session
+
+    User and date are copied from the session's daily log onto the exercise
+    so history lookups don't need joins.
+
+    Returns:
+        ID of the new exercise
+    """
+    exercise_key = register_exercise(conn, data['exercise_name'], data.get('exercise_category'))
+    log = conn.execute(
+        '''SELECT dl.user_id, dl.date FROM workout_sessions ws
+           JOIN daily_logs dl ON ws.daily_log_id = dl.id
+           WHERE ws.id = ?''',
+        [session_id]
+    ).fetchone()
+
+    return conn.execute(
+        '''INSERT INTO workout_exercises
+           (workout_session_id, exercise_name, exercise_category, order_index, notes,
+            exercise_key, user_id, log_date, client_id)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        [
+            session_id,
+            data['exercise_name'],
+            data.get('exercise_category', ''),
+            data.get('order_index', 0) if order_index is None else order_index,
+            data.get('notes', ''),
+            exercise_key,
+            log['user_id'] if log else None,
+            log['date'] if log else None,
+            data.get('client_id')
+        ]
+    ).lastrowid
+
+def replace_exercise_sets(conn, exercise_id, sets):
+    """
+    Make an exercise's sets match a list of sets
+
+    Each set is matched to an existing one by id when it has one, otherwise
+    by set_number. Matched sets are updated in place, new ones inserted and
+    ones missing from the list deleted, so sending the same list again
+    changes nothing. Records aren't updated - call recompute_records
+    afterwards.
+
+    Args:
+        sets: List of dicts with reps and optionally id, set_number (defaults
+            to position + 1), weight_kg, rpe, completed and notes
+    """
+    rows = []
+    for position, data in enumerate(sets):
+        if data.get('reps') is None:
+            raise ValueError('Every set needs reps')
+        rows.append((
+            data.get('id'),
+            data.get('set_number', position + 1),
+            data['reps'],
+            data.get('weight_kg'),
+            data.get('rpe'),
+            data.get('completed', True),
+            data.get('notes', '')
+        ))
+
+    existing = conn.execute(
+        'SELECT id, set_number FROM workout_sets WHERE workout_exercise_id = ? ORDER BY set_number, id',
+        [exercise_id]
+    ).fetchall()
+    unclaimed = {row['id'] for row in existing}
+
+    # Claim sets sent with their id first so set_number fallbacks can't take them
+    matches = [row[0] if row[0] in unclaimed else None for row in rows]
+    unclaimed.difference_update(matches)
+
+    by_number = {}
+    for row in existing:
+        if row['id'] in unclaimed:
+            by_number.setdefault(row['set_number'], []).append(row['id'])
+
+    updates = []
+    inserts = []
+    for set_id, row in zip(matches, rows):
+        if set_id is None and by_number.get(row[1]):
+            set_id = by_number[row[1]].pop(0)
+            unclaimed.discard(set_id)
+        if set_id is None:
+            inserts.append((exercise_id,) + row[1:])
+        else:
+            updates.append(row[1:] + (set_id,))
+
+    conn.executemany(
+        '''UPDATE workout_sets SET set_number = ?, reps = ?, weight_kg = ?, rpe = ?, completed = ?, notes = ?
+           WHERE id = ?''',
+        updates
+    )
+    conn.executemany(
+        '''INSERT INTO workout_sets
+           (workout_exercise_id, set_number, reps, weight_kg, rpe, completed, notes)
+           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+        inserts
+    )
+    conn.executemany('DELETE FROM workout_sets WHERE id = ?', [(set_id,) for set_id in unclaimed])
+
+def get_session_owners(conn, session_id):
+    """(user_id, exercise_key) of every exercise in a session"""
+    return {
+        (row['user_id'], row['exercise_key'])
+        for row in conn.execute(
+            '''SELECT DISTINCT user_id, exercise_key FROM workout_exercises
+               WHERE workout_session_id = ? AND user_id IS NOT NULL AND exercise_key IS NOT NULL''',
+            [session_id]
+        )
+    }
+
+def save_session_document(conn, session_id, document):
+    """
+    Make a session, its exercises and their sets match a full session document
+
+    Exercises are matched by id, then by client_id (a key the client makes
+    up for exercises it hasn't saved yet), so a retried request updates the
+    exercises the first attempt created instead of adding them again.
+    Exercises missing from the document are deleted and the rest are
+    ordered as listed. Records of every exercise touched are recomputed.
+
+    Args:
+        document: Dict with optional name, notes and completed_at, and
+            exercises - each with exercise_name, optional id, client_id,
+            exercise_category, notes and sets (see replace_exercise_sets)
+    """
+    owners = get_session_owners(conn, session_id)
+
+    if any(key in document for key in ('name', 'notes', 'completed_at')):
+        conn.execute(
+            '''UPDATE workout_sessions
+               SET name = COALESCE(?, name), notes = COALESCE(?, notes), completed_at = COALESCE(?, completed_at)
+               WHERE id = ?''',
+            [document.get('name'), document.get('notes'), document.get('completed_at'), session_id]
+        )
+
+    existing = conn.execute(
+        'SELECT id, client_id FROM workout_exercises WHERE workout_session_id = ?', [session_id]
+    ).fetchall()
+    by_id = {row['id'] for row in existing}
+    by_client_id = {row['client_id']: row['id'] for row in existing if row['client_id']}
+
+    kept = set()
+    for order_index, data in enumerate(document.get('exercises', [])):
+        if not data.get('exercise_name'):
+            raise ValueError('Every exercise needs an exercise_name')
+
+        exercise_id = data.get('id') if data.get('id') in by_id else by_client_id.get(data.get('client_id'))
+        if exercise_id:
+            conn.execute(
+                '''UPDATE workout_exercises
+                   SET exercise_name = ?, exercise_category = ?, notes = ?, order_index = ?, exercise_key = ?
+                   WHERE id = ?''',
+                [
+                    data['exercise_name'],
+                    data.get('exercise_category', ''),
+                    data.get('notes', ''),
+                    order_index,
+                    register_exercise(conn, data['exercise_name'], data.get('exercise_category')),
+                    exercise_id
+                ]
+            )
+        else:
+            exercise_id = add_exercise(conn, session_id, data, order_index)
+
+        kept.add(exercise_id)
+        replace_exercise_sets(conn, exercise_id, data.get('sets', []))
+
+    removed = [(row['id'],) for row in existing if row['id'] not in kept]
+    conn.executemany('DELETE FROM workout_sets WHERE workout_exercise_id = ?', removed)
+    conn.executemany('DELETE FROM workout_exercises WHERE id = ?', removed)
+
+    for owner in owners | get_session_owners(conn, session_id):
+        recompute_records(conn, *owner)
+    refresh_session_totals(conn, session_id)
+
+SESSION_TOTALS_SQL = '''
+    INSERT OR REPLACE INTO workout_session_totals (workout_session_id, exercise_count, set_count, volume)
+    SELECT
+        ws.id,
+        (SELECT COUNT(*) FROM workout_exercises WHERE workout_session_id = ws.id),
+        (SELECT COUNT(*) FROM workout_exercises we
+         JOIN workout_sets s ON s.workout_exercise_id = we.id
+         WHERE we.workout_session_id = ws.id),
+        (SELECT COALESCE(SUM(s.reps * s.weight_kg), 0) FROM workout_exercises we
+         JOIN workout_sets s ON s.workout_exercise_id = we.id
+         WHERE we.workout_session_id = ws.id)
+    FROM workout_sessions ws
+    WHERE {where}'''
+
+def refresh_session_totals(conn, session_id):
+    """Recount a session's exercises, sets and volume (call after changing them)"""
+    conn.execute(SESSION_TOTALS_SQL.format(where='ws.id = ?'), [session_id])
+
+def refresh_exercise_session_totals(conn, exercise_id):
+    """Refresh the totals of the session an exercise belongs to"""
+    row = conn.execute(
+        'SELECT workout_session_id FROM workout_exercises WHERE id = ?', [exercise_id]
+    ).fetchone()
+    if row:
+        refresh_session_totals(conn, row[0])
+
+def estimate_one_rep_max(weight_kg, reps):
+    """
+    Estimate a one-rep max from a set
+
+    Uses Brzycki up to 10 reps and Epley above that, where Brzycki
+    overestimates. Returns None for sets without weight or reps.
+    """
+    if not weight_kg or not reps or reps <= 0:
+        return None
+    if reps == 1:
+        return weight_kg
+    if reps <= 10:
+        return weight_kg * 36 / (37 - reps)
+    return weight_kg * (1 + reps / 30)
+
+def set_volume(weight_kg, reps):
+    """Volume of a set (weight x reps), None for bodyweight sets"""
+    return weight_kg * reps if weight_kg is not None and reps is not None else None
+
+def get_exercise_owner(conn, exercise_id):
+    """(user_id, exercise_key) that an exercise's records are kept under, or None"""
+    row = conn.execute(
+        'SELECT user_id, exercise_key FROM workout_exercises WHERE id = ?', [exercise_id]
+    ).fetchone()
+    if not row or row['user_id'] is None or row['exercise_key'] is None:
+        return None
+    return row['user_id'], row['exercise_key']
+
+def count_sets(conn, exercise_id):
+    """Number of sets logged for an exercise"""
+    return conn.execute(
+        'SELECT COUNT(*) FROM workout_sets WHERE workout_exercise_id = ?', [exercise_id]
+    ).fetchone()[0]
+
+def add_set_to_records(conn, exercise_id, weight_kg, reps, new_set=True):
+    """
+    Update records after a set was inserted (call in the same transaction)
+
+    With new_set=False only the bests and volume are updated - for a set
+    whose old values were already removed with remove_set_from_records.
+    """
+    owner = get_exercise_owner(conn, exercise_id)
+    if not owner:
+        return
+
+    volume = set_volume(weight_kg, reps)
+    added_sets = 1 if new_set else 0
+    first_set = 1 if new_set and count_sets(conn, exercise_id) == 1 else 0
+
+    # MAX(a, b) is NULL if either is - fall back to whichever isn't
+    conn.execute(
+        '''INSERT INTO exercise_records
+           (user_id, exercise_key, best_weight_kg, best_reps, best_volume, best_e1rm_kg,
+            total_volume, total_sets, total_sessions)
+           VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, 0), ?, ?)
+           ON CONFLICT(user_id, exercise_key) DO UPDATE SET
+               best_weight_kg = COALESCE(MAX(best_weight_kg, excluded.best_weight_kg), best_weight_kg, excluded.best_weight_kg),
+               best_reps = COALESCE(MAX(best_reps, excluded.best_reps), best_reps, excluded.best_reps),
+               best_volume = COALESCE(MAX(best_volume, excluded.best_volume), best_volume, excluded.best_volume),
+               best_e1rm_kg = COALESCE(MAX(best_e1rm_kg, excluded.best_e1rm_kg), best_e1rm_kg, excluded.best_e1rm_kg),
+               total_volume = total_volume + excluded.total_volume,
+               total_sets = total_sets + excluded.total_sets,
+               total_sessions = total_sessions + excluded.total_sessions,
+               updated_at = CURRENT_TIMESTAMP''',
+        [*owner, weight_kg, reps, volume, estimate_one_rep_max(weight_kg, reps), volume, added_sets, first_set]
+    )
+
+    if reps is not None:
+        conn.execute(
+            '''INSERT INTO exercise_rep_records (user_id, exercise_key, weight_kg, best_reps)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(user_id, exercise_key, weight_kg) DO UPDATE SET
+                   best_reps = MAX(best_reps, excluded.best_reps)''',
+            [*owner, weight_kg or 0, reps]
+        )
+
+def remove_set_from_records(conn, exercise_id, weight_kg, reps, deleted=True):
+    """
+    Update records after a set was deleted or changed (call in the same transaction)
+
+    Totals are adjusted in place. Only if the set's old values held one of the
+    records are that exercise's records recomputed from its sets as they are
+    now.
+
+    Args:
+        weight_kg, reps: The set's values before it was deleted or changed
+        deleted: False when the set was updated rather than deleted
+
+    Returns:
+        True if the records were recomputed (they then already reflect an
+        updated set's new values)
+    """
+    owner = get_exercise_owner(conn, exercise_id)
+    if not owner:
+        return True
+
+    record = conn.execute(
+        'SELECT * FROM exercise_records WHERE user_id = ? AND exercise_key = ?', owner
+    ).fetchone()
+    rep_record = conn.execute(
+        '''SELECT best_reps FROM exercise_rep_records
+           WHERE user_id = ? AND exercise_key = ? AND weight_kg = ?''',
+        [*owner, weight_kg or 0]
+    ).fetchone()
+
+    def held(value, best):
+        return value is not None and best is not None and value >= best
+
+    if (not record or not rep_record
+            or held(weight_kg, record['best_weight_kg'])
+            or held(reps, record['best_reps'])
+            or held(set_volume(weight_kg, reps), record['best_volume'])
+            or held(estimate_one_rep_max(weight_kg, reps), record['best_e1rm_kg'])
+            or held(reps, rep_record['best_reps'])):
+        recompute_records(conn, *owner)
+        return True
+
+    removed_sets = 1 if deleted else 0
+    emptied = 1 if deleted and count_sets(conn, exercise_id) == 0 else 0
+    conn.execute(
+        '''UPDATE exercise_records SET
+               total_volume = total_volume - COALESCE(?, 0),
+               total_sets = total_sets - ?,
+               total_sessions = total_sessions - ?,
+               updated_at = CURRENT_TIMESTAMP
+           WHERE user_id = ? AND exercise_key = ?''',
+        [set_volume(weight_kg, reps), removed_sets, emptied, *owner]
+    )
+    return False
+
+def recompute_records(conn, user_id, exercise_key):
+    """Rebuild one exercise's records from all of its sets"""
+    sets = conn.execute(
+        '''SELECT ws.workout_exercise_id, ws.weight_kg, ws.reps
+           FROM workout_exercises we
+           JOIN workout_sets ws ON ws.workout_exercise_id = we.id
+           WHERE we.user_id = ? AND we.exercise_key = ?''',
+        [user_id, exercise_key]
+    ).fetchall()
+
+    conn.execute(
+        'DELETE FROM exercise_rep_records WHERE user_id = ? AND exercise_key = ?',
+        [user_id, exercise_key]
+    )
+    if not sets:
+        conn.execute(
+            'DELETE FROM exercise_records WHERE user_id = ? AND exercise_key = ?',
+            [user_id, exercise_key]
+        )
+        return
+
+    def best(values):
+        values = [v for v in values if v is not None]
+        return max(values) if values else None
+
+    rep_records = {}
+    for s in sets:
+        if s['reps'] is not None:
+            weight = s['weight_kg'] or 0
+            rep_records[weight] = max(rep_records.get(weight, 0), s['reps'])
+
+    volumes = [set_volume(s['weight_kg'], s['reps']) for s in sets]
+    conn.execute(
+        '''INSERT OR REPLACE INTO exercise_records
+           (user_id, exercise_key, best_weight_kg, best_reps, best_volume, best_e1rm_kg,
+            total_volume, total_sets, total_sessions, updated_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+        [
+            user_id,
+            exercise_key,
+            best(s['weight_kg'] for s in sets),
+            best(s['reps'] for s in sets),
+            best(volumes),
+            best(estimate_one_rep_max(s['weight_kg'], s['reps']) for s in sets),
+            sum(v for v in volumes if v is not None),
+            len(sets),
+            len({s['workout_exercise_id'] for s in sets})
+        ]
+    )
+    conn.executemany(
+        '''INSERT INTO exercise_rep_records (user_id, exercise_key, weight_kg, best_reps)
+           VALUES (?, ?, ?, ?)''',
+        [(user_id, exercise_key, weight, reps) for weight, reps in rep_records.items()]
+    )
+
+def load_sessions(conn, where, args=()):
+    """
+    Load workout sessions with nested exercises and sets in three queries
+
+    Args:
+        conn: Open database connection
+        where: SQL condition on workout_sessions (e.g. 'id = ?')
+        args: Parameters for the condition
+
+    Returns:
+        List of session dicts (newest first), each with an 'exercises' list
+        whose items each have a 'sets' list
+    """
+    sessions = [dict(row) for row in conn.execute(
+        f'''SELECT * FROM workout_sessions
+            WHERE {where}
+            ORDER BY started_at DESC''',
+        args
+    )]
+
+    if not sessions:
+        return sessions
+
+    session_ids = [session['id'] for session in sessions]
+    placeholders = ','.join('?' * len(session_ids))
+
+    exercises_by_session = {session_id: [] for session_id in session_ids}
+    exercises_by_id = {}
+    for row in conn.execute(
+        f'''SELECT * FROM workout_exercises
+            WHERE workout_session_id IN ({placeholders})
+            ORDER BY order_index, created_at''',
+        session_ids
+    ):
+        exercise = dict(row)
+        exercise['sets'] = []
+        exercises_by_session[exercise['workout_session_id']].append(exercise)
+        exercises_by_id[exercise['id']] = exercise
+
+    if exercises_by_id:
+        for row in conn.execute(
+            f'''SELECT s.* FROM workout_sets s
+                JOIN workout_exercises e ON s.workout_exercise_id = e.id
+                WHERE e.workout_session_id IN ({placeholders})
+                ORDER BY s.set_number, s.id''',
+            session_ids
+        ):
+            exercises_by_id[row['workout_exercise_id']]['sets'].append(dict(row))
+
+    for session in sessions:
+        session['exercises'] = exercises_by_session[session['id']]
+
+    return sessions
@@ -39,7 +39,11 @@ export const foodEntries = {
 
 // Barcode API
 export const barcode = {
-    lookup: (code) => request(`/api/barcode/${code}`)
+    lookup: (code) => request(`/api/barcode/${code}`),
+    lookupBatch: (codes) => request('/api/barcode/batch', {
+        method: 'POST',
+        body: JSON.stringify({ barcodes: codes })
+    })
 };
 
 // Images API
@@ -84,8 +88,20 @@ export const images = {
         return response.json();
     },
     getAll: (userId = 1) => request(`/api/images?user_id=${userId}`),
+    // Returns { images, next_cursor } - pass next_cursor back to load the following page
+    getPage: (cursor = null, limit = 24, userId = 1) => {
+        let url = `/api/images?user_id=${userId}&limit=${limit}&compact=1`;
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+        return request(url);
+    },
     delete: (id) => request(`/api/images/${id}`, { method: 'DELETE' }),
-    getImageUrl: (id) => `${API_URL}/api/images/${id}`
+    getImageUrl: (id, size = 'full') => `${API_URL}/api/images/${id}?size=${size}`,
+    // Content-addressed URLs are cached by the browser forever - use them once processed
+    getImageSrc: (image, size = 'full') => image.content_hash
+        ? `${API_URL}/api/images/content/${image.content_hash}?size=${size}`
+        : `${API_URL}/api/images/${image.id}?size=${size}`
 };
 
 // AI API
@@ -127,7 +143,17 @@ export const profile = {
     create: (data) => request('/api/profile', { method: 'POST', body: JSON.stringify(data) }),
     update: (data) => request('/api/profile', { method: 'PUT', body: JSON.stringify(data) }),
     getCalculations: (userId = 1) => request(`/api/profile/calculations?user_id=${userId}`),
-    updateDayTargets: (date, userId = 1) => request(`/api/profile/update-day-targets/${date}?user_id=${userId}`, { method: 'POST' })
+    updateDayTargets: (date, userId = 1) => request(`/api/profile/update-day-targets/${date}?user_id=${userId}`, { method: 'POST' }),
+    applyTargets: (startDate, endDate, userId = 1) =>
+        request(`/api/profile/apply-targets?user_id=${userId}&start=${startDate}&end=${endDate}`, { method: 'POST' }),
+    // Pass several intakes to compare scenarios; without any, the recently logged average is used
+    getProjection: (intakes = [], days = 182, userId = 1) => {
+        let url = `/api/profile/projection?user_id=${userId}&days=${days}`;
+        if (intakes.length) {
+            url += `&intake=${intakes.join(',')}`;
+        }
+        return request(url);
+    }
 };
 
 // Weight Logs API
@@ -139,14 +165,21 @@ export const weightLogs = {
         }
         return request(url);
     },
+    // Most recent entries only, oldest first
+    getRecent: (limit = 5, userId = 1) => request(`/api/weight-logs?user_id=${userId}&limit=${limit}`),
     create: (data) => request('/api/weight-logs', { method: 'POST', body: JSON.stringify(data) }),
     delete: (id) => request(`/api/weight-logs/${id}`, { method: 'DELETE' }),
-    getLatest: (userId = 1) => request(`/api/weight-logs/latest?user_id=${userId}`)
+    getLatest: (userId = 1) => request(`/api/weight-logs/latest?user_id=${userId}`),
+    // Daily weight with its smoothed trend, downsampled to at most `points` points
+    getTrend: (userId = 1, points = 200) => request(`/api/weight-logs/trend?user_id=${userId}&points=${points}`)
 };
 
 // Recently Used Foods API
 export const recentFoods = {
-    get: (userId = 1, limit = 20) => request(`/api/food-entries/recent?user_id=${userId}&limit=${limit}`)
+    get: (userId = 1, limit = 20) => request(`/api/food-entries/recent?user_id=${userId}&limit=${limit}`),
+    // Searches every food ever logged (word prefixes, best match first)
+    search: (query, userId = 1, limit = 20) =>
+        request(`/api/food-entries/search?user_id=${userId}&q=${encodeURIComponent(query)}&limit=${limit}`)
 };
 
 // Exercises API
@@ -182,6 +215,15 @@ export const workouts = {
         method: 'DELETE'
     }),
     getSessionDetails: (sessionId) => request(`/api/workouts/session-details/${sessionId}`),
+    // Saves the whole session in one request - give new exercises a client_id so retries are safe
+    saveSession: (sessionId, document) => request(`/api/workouts/sessions/${sessionId}/document`, {
+        method: 'PUT',
+        body: JSON.stringify(document)
+    }),
+    reorderExercises: (sessionId, exerciseIds) => request(`/api/workouts/sessions/${sessionId}/order`, {
+        method: 'PUT',
+        body: JSON.stringify({ exercise_ids: exerciseIds })
+    }),
 
     // Exercises
     createExercise: (data) => request('/api/workouts/exercises', {
@@ -199,6 +241,10 @@ export const workouts = {
         body: JSON.stringify(data)
     }),
     getSets: (exerciseId) => request(`/api/workouts/sets/${exerciseId}`),
+    saveSets: (exerciseId, sets) => request(`/api/workouts/exercises/${exerciseId}/sets`, {
+        method: 'PUT',
+        body: JSON.stringify({ sets })
+    }),
     updateSet: (setId, data) => request(`/api/workouts/sets/${setId}`, {
         method: 'PUT',
         body: JSON.stringify(data)
@@ -214,8 +260,12 @@ export const workouts = {
         request(`/api/workouts/stats/${encodeURIComponent(exerciseName)}?user_id=${userId}`),
     getRecentExercises: (userId = 1, limit = 15) =>
         request(`/api/workouts/recent-exercises?user_id=${userId}&limit=${limit}`),
+    suggestExercises: (query, userId = 1, limit = 8) =>
+        request(`/api/workouts/exercise-suggest?user_id=${userId}&q=${encodeURIComponent(query)}&limit=${limit}`),
     getDailySummary: (startDate, endDate, userId = 1) =>
         request(`/api/workouts/daily-summary?user_id=${userId}&start_date=${startDate}&end_date=${endDate}`),
     getByDate: (date, userId = 1) =>
-        request(`/api/workouts/by-date/${date}?user_id=${userId}`)
+        request(`/api/workouts/by-date/${date}?user_id=${userId}`),
+    getAnalytics: (days = 365, exercises = [], userId = 1) =>
+        request(`/api/workouts/analytics?user_id=${userId}&days=${days}&exercises=${encodeURIComponent(exercises.join(','))}`)
 };